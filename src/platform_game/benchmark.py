@@ -0,0 +1,421 @@
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import platform
+import tempfile
+import numpy as np
+import pygame
+from game import Game, ASSETS, QUALITY_TIERS
+from scripts.entities import PhysicsEntity, Player
+from scripts.entitymanager import EntityManager
+from scripts.tilemap import Tilemap
+from scripts.mapformat import BINARY_MAP_EXT
+from scripts.streaming import write_world
+from scripts.particle import ParticleSystem
+from scripts.clouds import Clouds
+from scripts.parallax import Parallax
+from scripts.utils import percentile, load_image, load_images, Animation
+from scripts.assets import AssetLoader
+from scripts.presenter import Presenter, DirtyRectPresenter, RendererPresenter
+from pygame._sdl2.video import Window
+
+# Bumped whenever the layout of the results file changes
+RESULTS_VERSION = 1
+DEFAULT_SIZES = (1_000, 10_000, 100_000)
+# Each benchmark runs at least MIN_RUNS times, and keeps going until MIN_SECONDS have passed
+MIN_RUNS = 3
+MIN_SECONDS = 0.5
+MAX_RUNS = 1000
+
+
+def measure(fn, min_runs=MIN_RUNS, min_seconds=MIN_SECONDS, max_runs=MAX_RUNS, setup=None):
+    """
+    Time repeated calls of a function.
+    Args:
+        fn (callable): The function to time. Called with the run index.
+        min_runs (int): Minimum number of calls.
+        min_seconds (float): Keep calling until this much time has passed (up to max_runs).
+        max_runs (int): Maximum number of calls.
+        setup (callable): Called before every call of fn, outside of the timing.
+    Returns:
+        dict: Number of runs and the mean/min/p50/p95/max duration of a call, in milliseconds.
+    """
+    times = []
+    total = 0.0
+    while len(times) < max_runs and (len(times) < min_runs or total < min_seconds):
+        if setup is not None:
+            setup()
+        start = time.perf_counter()
+        fn(len(times))
+        elapsed = time.perf_counter() - start
+        times.append(elapsed * 1000)
+        total += elapsed
+    return {
+        "runs": len(times),
+        "mean_ms": sum(times) / len(times),
+        "min_ms": min(times),
+        "p50_ms": percentile(times, 50),
+        "p95_ms": percentile(times, 95),
+        "max_ms": max(times),
+    }
+
+
+def build_map(game, n_tiles, rng):
+    """
+    Build a synthetic tilemap with n_tiles grid tiles and about 1% as many off-grid decor tiles.
+    Tiles are scattered over a square area twice their number, grass in the top half and stone below.
+    Args:
+        game (Game): Game providing the tile assets.
+        n_tiles (int): Number of grid tiles.
+        rng (random.Random): Random number generator for the layout.
+    Returns:
+        Tilemap: The synthetic map.
+    """
+    tilemap = Tilemap(game, tile_size=16)
+    side = int((n_tiles * 2) ** 0.5) + 1
+    for cell in rng.sample(range(side * side), n_tiles):
+        y, x = divmod(cell, side)
+        tilemap.set_tile((x, y), "grass" if y < side // 2 else "stone", rng.randrange(9))
+    for _ in range(n_tiles // 100):
+        pos = (rng.random() * side * 16, rng.random() * side * 16)
+        tilemap.add_offgrid_tile({"type": "decor", "variant": rng.randrange(4), "pos": pos})
+    return tilemap
+
+
+def bench_tilemap(game, n_tiles, rng):
+    """Benchmark the Tilemap hot paths on a synthetic map of n_tiles tiles."""
+    results = {}
+    start = time.perf_counter()
+    tilemap = build_map(game, n_tiles, rng)
+    results["tilemap.build"] = {"runs": 1, "mean_ms": (time.perf_counter() - start) * 1000}
+    world_px = (int((n_tiles * 2) ** 0.5) + 1) * tilemap.tile_size
+    surf = pygame.Surface((320, 240), pygame.SRCALPHA)
+
+    # Rendering a static view (chunks cached) and a view panning across the map (chunks baked as they appear)
+    tilemap.render(surf, offset=(0, 0))
+    results["tilemap.render_static"] = measure(lambda i: tilemap.render(surf, offset=(0, 0)))
+    results["tilemap.render_scroll"] = measure(
+        lambda i: tilemap.render(surf, offset=((i * 4) % world_px, (i * 3) % world_px))
+    )
+    results["tilemap.render_outlined"] = measure(lambda i: tilemap.render(surf, offset=(0, 0), outline_surf=surf))
+
+    positions = [(rng.random() * world_px, rng.random() * world_px) for _ in range(1000)]
+    results["tilemap.border_tiles_x1000"] = measure(lambda i: [tilemap.border_tiles(pos) for pos in positions])
+    results["tilemap.physics_create_rects_x1000"] = measure(
+        lambda i: [tilemap.physics_create_rects(pos) for pos in positions]
+    )
+    results["tilemap.solid_rects_x1000"] = measure(
+        lambda i: [tilemap.solidity.rects_in_area(int(x), int(y), int(x) + 8, int(y) + 15) for x, y in positions]
+    )
+    results["tilemap.solidity_rebuild"] = measure(lambda i: tilemap.solidity.rebuild(tilemap.grid), min_runs=1)
+    results["tilemap.autotile"] = measure(lambda i: tilemap.autotile(), min_runs=1)
+    results["tilemap.extract"] = measure(lambda i: tilemap.extract([("decor", 0), ("stone", 4)], keep=True), min_runs=1)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "map.json")
+        results["tilemap.save"] = measure(lambda i: tilemap.save(path), min_runs=1)
+        results["tilemap.load"] = measure(lambda i: tilemap.load(path), min_runs=1)
+        path = os.path.join(tmp, "map" + BINARY_MAP_EXT)
+        results["tilemap.save_binary"] = measure(lambda i: tilemap.save(path), min_runs=1)
+        results["tilemap.load_binary"] = measure(lambda i: tilemap.load(path), min_runs=1)
+
+        # Panning across a streamed copy of the map, paging regions in and out
+        world_dir = os.path.join(tmp, "world")
+        write_world(world_dir, tilemap.grid, tilemap.tile_size, tilemap.offgrid_tiles)
+        world = Tilemap(game, tile_size=16)
+        world.load(world_dir)
+
+        def stream_scroll(i):
+            view = pygame.Rect((i * 4) % world_px, (i * 3) % world_px, 320, 240)
+            world.streamer.update([view])
+            world.render(surf, offset=view.topleft)
+
+        results["tilemap.stream_scroll"] = measure(stream_scroll)
+        world.close()
+
+    # The player running and jumping around the middle of the map
+    player = Player(game, (world_px / 2, world_px / 2), (8, 15))
+
+    def update_player(i):
+        if i % 40 == 0:
+            player.jump()
+        player.update(tilemap, (1 if (i // 120) % 2 else -1, 0))
+
+    results["entity.update"] = measure(update_player)
+    player.remove()
+    return results
+
+
+def bench_physics(game, count, rng):
+    """
+    Benchmark count physics bodies dropped over the game's own map: stepping them batched and one
+    by one, and keeping them in an EntityManager.
+    """
+    tilemap = game.tilemap
+    chunk_px = 16 * tilemap.tile_size
+    chunks = list(tilemap.grid.chunks)
+    bodies = []
+    for _ in range(count):
+        cx, cy = rng.choice(chunks)
+        pos = ((cx + rng.random()) * chunk_px, (cy + rng.random()) * chunk_px - chunk_px)
+        body = PhysicsEntity(game, "enemy", pos, (8, 15))
+        body.velocity = (rng.random() * 4 - 2, 0)
+        bodies.append(body)
+    start = [(body.pos.tolist(), body.velocity.tolist()) for body in bodies]
+
+    def reset():
+        for body, (pos, velocity) in zip(bodies, start):
+            body.pos = pos
+            body.velocity = velocity
+
+    def step(i):
+        if i % 120 == 0:  # Drop the bodies again every two seconds of game time
+            reset()
+        game.physics.step(tilemap, bodies)
+
+    def step_each(i):
+        if i % 120 == 0:
+            reset()
+        for body in bodies:
+            game.physics.step(tilemap, [body])
+
+    results = {"physics.step": measure(step), "physics.step_each": measure(step_each)}
+
+    # The same bodies in an entity manager: stepping plus re-indexing, and broadphase queries
+    manager = EntityManager(game)
+    for body in bodies:
+        manager.add(body)
+    reset()
+
+    def update(i):
+        if i % 120 == 0:
+            reset()
+        manager.update(tilemap)
+
+    points = [(body.pos[0] + rng.random() * 64 - 32, body.pos[1] + rng.random() * 64 - 32) for body in bodies[:1000]]
+    results["entities.update"] = measure(update)
+    results["entities.query_radius_x1000"] = measure(lambda i: [manager.query_radius(point, 32) for point in points])
+    results["entities.overlapping_all"] = measure(lambda i: [manager.overlapping(body) for body in bodies])
+    for body in bodies:
+        manager.remove(body)
+    return results
+
+
+def bench_particles(game, count, rng):
+    """Benchmark updating and rendering count live particles."""
+    particles = ParticleSystem(game, ["leaf", "particle"])
+    surf = pygame.Surface((320, 240), pygame.SRCALPHA)
+
+    def refill():
+        missing = count - len(particles)
+        if missing > 0:
+            positions = [(rng.random() * 320, rng.random() * 240) for _ in range(missing)]
+            velocities = [(rng.random() - 0.5, rng.random() - 0.5) for _ in range(missing)]
+            particles.spawn_many("leaf", positions, velocities, [rng.randint(0, 20) for _ in range(missing)])
+
+    def update(i):
+        particles.update()
+
+    def render(i):
+        particles.render(surf, offset=(0, 0))
+
+    def cull(i):
+        particles.cull(pygame.Rect(0, 0, 160, 240))  # Retires about half of them
+
+    # Particles expire as they update, so top them back up before every run
+    return {
+        "particles.update": measure(update, setup=refill),
+        "particles.render": measure(render, setup=refill),
+        "particles.cull": measure(cull, setup=refill),
+    }
+
+
+def bench_clouds(game, count, rng):
+    """Benchmark drawing count clouds one blit each, and baked into the game's parallax layers."""
+    clouds = Clouds(game.assets["clouds"], count=count, rng=rng)
+    surf = pygame.Surface((320, 240))
+    results = {
+        "clouds.render": measure(lambda i: clouds.render(surf, offset=(i * 3, i))),
+        "clouds.bake_layers": measure(lambda i: clouds.bake_layers(surf.get_size()), min_runs=1),
+    }
+    parallax = Parallax(clouds.bake_layers(surf.get_size()))
+    results["parallax.render"] = measure(lambda i: parallax.render(surf, offset=(i * 3, i)))
+    return results
+
+
+def bench_assets():
+    """
+    Benchmark loading the game's assets: one file at a time, through the loader (threaded decoding
+    only, or packed into an atlas), and from the atlas cache.
+    """
+
+    def load_one_by_one(i):
+        for kind, path, kwargs in ASSETS.values():
+            if kind == "image":
+                load_image(path)
+            elif kind == "images":
+                load_images(path)
+            else:
+                Animation(load_images(path), **kwargs)
+
+    results = {
+        "assets.load_sequential": measure(load_one_by_one),
+        "assets.load": measure(lambda i: AssetLoader().load(ASSETS)),
+        "assets.load_atlas": measure(lambda i: AssetLoader(views=True).load(ASSETS)),
+    }
+    with tempfile.TemporaryDirectory() as tmp:
+        cache_path = os.path.join(tmp, "atlas.png")
+        AssetLoader(cache_path=cache_path).load(ASSETS)
+        results["assets.load_atlas_cached"] = measure(lambda i: AssetLoader(cache_path=cache_path).load(ASSETS))
+    return results
+
+
+def bench_game(game):
+    """
+    Benchmark full game frames (one simulation step and one render), rendering alone and leaf
+    spawning on the game's own map, then frames with mask outlines at every quality tier.
+    """
+    game.movement = [False, True]
+
+    def frame(i):
+        if i % 45 == 0:
+            game.player.jump()
+        game.step()
+        game.render()
+
+    results = {
+        "game.frame": measure(frame, min_runs=120),
+        "game.render": measure(lambda i: game.render(), min_runs=120),
+        "game.leaf_spawn": measure(lambda i: game.generate_leaf_particles()),
+    }
+    # Frames at every quality tier, with the more expensive mask outlines
+    game.outline_mode = "mask"
+    for tier in QUALITY_TIERS:
+        game.quality.set_tier(tier["name"])
+        game.apply_quality()
+        results["game.frame_" + tier["name"]] = measure(frame, min_runs=120)
+    game.quality.set_tier(0)
+    game.apply_quality()
+    game.outline_mode = "baked"
+    return results
+
+
+def bench_present(game):
+    """Benchmark showing a full changed frame on a 640x480 window with each presentation backend."""
+    frame = game.display_2
+    screen = pygame.display.get_surface()
+    surface = Presenter(screen)
+    dirty = DirtyRectPresenter(screen)
+    results = {
+        "present.surface": measure(lambda i: surface.present(frame)),
+        "present.dirty_rects": measure(lambda i: dirty.present(frame, full=True)),
+    }
+    window = Window("Benchmark", (640, 480))
+    renderer = RendererPresenter(window)
+    results["present.renderer"] = measure(lambda i: renderer.present(frame))
+    window.destroy()
+    return results
+
+
+def environment():
+    """Describe the machine and library versions the benchmarks ran with."""
+    return {
+        "python": platform.python_version(),
+        "pygame": pygame.version.ver,
+        "sdl": ".".join(str(v) for v in pygame.get_sdl_version()),
+        "numpy": np.__version__,
+        "platform": platform.platform(),
+        "machine": platform.machine(),
+    }
+
+
+def compare(results, baseline):
+    """
+    Print the change in mean time of every benchmark present in both result sets.
+    Args:
+        results (dict): Results of this run.
+        baseline (dict): Results of an earlier run, as written by --out.
+    """
+    old = {(r["name"], r["size"]): r for r in baseline["benchmarks"]}
+    for r in results["benchmarks"]:
+        prev = old.get((r["name"], r["size"]))
+        if prev is not None and prev["mean_ms"]:
+            ratio = r["mean_ms"] / prev["mean_ms"]
+            print(f"{r['name']:<36} {r['size']:>9}  {prev['mean_ms']:>10.3f} -> {r['mean_ms']:>10.3f} ms  x{ratio:.2f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the engine's hot paths headlessly.")
+    parser.add_argument(
+        "--sizes",
+        default=",".join(str(s) for s in DEFAULT_SIZES),
+        help="Comma separated synthetic map sizes in tiles (e.g. 1000,10000,100000,1000000)",
+    )
+    parser.add_argument("--particles", default="1000,10000,50000", help="Comma separated live particle counts")
+    parser.add_argument("--bodies", default="10,100,1000", help="Comma separated physics body counts")
+    parser.add_argument("--clouds", default="12,100,1000", help="Comma separated cloud counts")
+    parser.add_argument("--only", help="Only run benchmarks whose name starts with this prefix")
+    parser.add_argument("--seed", type=int, default=0, help="Seed for the synthetic maps")
+    parser.add_argument("--out", help="Write the results as json to this file (printed to stdout otherwise)")
+    parser.add_argument("--compare", metavar="PATH", help="Compare against an earlier results file")
+    args = parser.parse_args()
+
+    game = Game(headless=True, seed=args.seed)
+    rng = random.Random(args.seed)
+    benchmarks = []
+
+    def wants(*prefixes):
+        # Whether a group of benchmarks, named with these prefixes, can match --only
+        return args.only is None or any(p.startswith(args.only) or args.only.startswith(p) for p in prefixes)
+
+    def add(size, results):
+        for name, stats in results.items():
+            if args.only is None or name.startswith(args.only):
+                benchmarks.append({"name": name, "size": size, **stats})
+                print(f"{name:<36} {size:>9}  {stats['mean_ms']:>10.3f} ms", file=sys.stderr)
+
+    if wants("tilemap.", "entity."):
+        for size in (int(s) for s in args.sizes.split(",") if s):
+            add(size, bench_tilemap(game, size, rng))
+    if wants("particles."):
+        for count in (int(s) for s in args.particles.split(",") if s):
+            add(count, bench_particles(game, count, rng))
+    if wants("physics.", "entities."):
+        for count in (int(s) for s in args.bodies.split(",") if s):
+            add(count, bench_physics(game, count, rng))
+    if wants("clouds.", "parallax."):
+        for count in (int(s) for s in args.clouds.split(",") if s):
+            add(count, bench_clouds(game, count, rng))
+    if wants("assets."):
+        add(len(ASSETS), bench_assets())
+    if wants("game."):
+        add(len(game.tilemap.grid), bench_game(game))
+    if wants("present."):
+        frame = game.display_2
+        add(frame.get_width() * frame.get_height(), bench_present(game))
+
+    results = {
+        "version": RESULTS_VERSION,
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "environment": environment(),
+        "benchmarks": benchmarks,
+    }
+    if args.out:
+        file = open(args.out, "w")
+        json.dump(results, file, indent=2)
+        file.close()
+    else:
+        print(json.dumps(results, indent=2))
+
+    if args.compare:
+        file = open(args.compare, "r")
+        baseline = json.load(file)
+        file.close()
+        compare(results, baseline)
+
+
+if __name__ == "__main__":
+    main()
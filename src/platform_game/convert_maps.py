@@ -0,0 +1,56 @@
+import os
+import glob
+import argparse
+from scripts.tilestore import TileStore
+from scripts.mapformat import BINARY_MAP_EXT, read_map, write_map
+from scripts.streaming import REGION_SIZE, write_world
+
+# Maps converted when no paths are given, relative to the repository root
+DEFAULT_MAPS = ("src/platform_game/data/maps/*.json", "map.json")
+
+
+def convert(src, dst):
+    """
+    Convert a map between the json and binary formats. The formats are picked from the paths.
+    Args:
+        src (str): The map to read, in either format.
+        dst (str): Destination file; binary if it ends in BINARY_MAP_EXT, json otherwise.
+    """
+    grid = TileStore()
+    tile_size, offgrid = read_map(src, grid)
+    write_map(dst, grid, tile_size, offgrid)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Convert maps between the json and binary (.pgmap) formats.")
+    parser.add_argument(
+        "paths",
+        nargs="*",
+        help="Maps to convert. json maps become .pgmap files next to them and .pgmap files become json. "
+        "Defaults to the bundled maps and map.json.",
+    )
+    parser.add_argument("--world", metavar="DIR", help="Instead, split a single map into a streamed world directory")
+    parser.add_argument("--region-size", type=int, default=REGION_SIZE, help="Width of a world region, in chunks")
+    args = parser.parse_args()
+
+    if args.world:
+        if len(args.paths) != 1:
+            parser.error("--world takes exactly one map")
+        grid = TileStore()
+        tile_size, offgrid = read_map(args.paths[0], grid)
+        write_world(args.world, grid, tile_size, offgrid, region_size=args.region_size)
+        print(f"{args.paths[0]} -> {args.world}")
+        return
+
+    paths = args.paths
+    if not paths:
+        paths = [path for pattern in DEFAULT_MAPS for path in sorted(glob.glob(pattern))]
+    for src in paths:
+        root, ext = os.path.splitext(src)
+        dst = root + (".json" if ext == BINARY_MAP_EXT else BINARY_MAP_EXT)
+        convert(src, dst)
+        print(f"{src} ({os.path.getsize(src)} bytes) -> {dst} ({os.path.getsize(dst)} bytes)")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,32 +1,48 @@
 import pygame
 import sys
-from scripts.utils import load_images, Animation
+import time
+import argparse
+from scripts.assets import AssetLoader, images
 from scripts.tilemap import Tilemap
+from scripts.presenter import PRESENTERS, open_presenter
+from scripts.profiler import FrameProfiler
 
 RENDER_SCALE = 2.0
 CAM_SPEED = 3  # Higher = Faster
 
 
 class Editor:
-    def __init__(self):
+    def __init__(self, dirty_rects=True, presenter="surface"):
         """
         Initialize the game, set up the window, load assets, and create game objects.
+        Args:
+            dirty_rects (bool): Whether to only redraw when something changed and only update
+                the changed parts of the window.
+            presenter (str): How frames are shown on the window, one of PRESENTERS.
         """
         # Pygame window setup
         pygame.init()
-        pygame.display.set_caption("Level Editor")
-        self.screen = pygame.display.set_mode((640, 480))  # Game window
+        self.profiler = FrameProfiler()  # F3 toggles the overlay, F4 records a trace
+        self.presenter = open_presenter(
+            presenter, "Level Editor", (640, 480), dirty_rects=dirty_rects, profiler=self.profiler
+        )
         self.clock = pygame.time.Clock()
         self.running = True
         self.display = pygame.Surface((320, 240))  # Display to be upscaled
+        self.dirty_rects = dirty_rects
+        self.redraw = True  # Set when input may have changed what is on screen
+        self.last_view = None  # Camera and cursor state of the last drawn frame
 
         # Load game assets
-        self.assets = {
-            "decor": load_images("tiles/decor"),
-            "grass": load_images("tiles/grass"),
-            "large_decor": load_images("tiles/large_decor"),
-            "stone": load_images("tiles/stone"),
-        }
+        self.assets = AssetLoader().load(
+            {
+                "decor": images("tiles/decor"),
+                "grass": images("tiles/grass"),
+                "large_decor": images("tiles/large_decor"),
+                "stone": images("tiles/stone"),
+                "spawners": images("tiles/spawners"),
+            }
+        )
 
         # Initial editor state
         self.tilemap = Tilemap(self, tile_size=16)
@@ -45,6 +61,7 @@ class Editor:
         self.right_click = False
         self.shift = False
         self.ongrid = True
+        self.autotile_on_edit = True  # Re-autotile the neighborhood of every grid edit
         self.mpos = (0, 0)  # Initialize mouse position
 
     def update_mouse_position(self):
@@ -57,7 +74,9 @@ class Editor:
         Handle input from hardware.
         """
         for event in pygame.event.get():
-            if event.type == pygame.QUIT:  # "X" on Window
+            self.redraw = True
+            # The renderer presenter's window doesn't send QUIT, as the hidden display window stays open
+            if event.type == pygame.QUIT or event.type == pygame.WINDOWCLOSE:  # "X" on Window
                 self.quit()
             elif event.type == pygame.MOUSEBUTTONDOWN:
                 self.handle_mouse_down(event)
@@ -72,6 +91,8 @@ class Editor:
         """
         Quit the game and close the window.
         """
+        if self.profiler.trace_events is not None:
+            self.toggle_trace()
         self.running = False
         pygame.quit()
         sys.exit()
@@ -114,6 +135,21 @@ class Editor:
             self.tilemap.save('map.json')
         elif event.key == pygame.K_t:
             self.tilemap.autotile()
+        elif event.key == pygame.K_y:
+            self.autotile_on_edit = not self.autotile_on_edit
+        elif event.key == pygame.K_F3:
+            self.profiler.toggle_overlay()
+        elif event.key == pygame.K_F4:
+            self.toggle_trace()
+
+    def toggle_trace(self):
+        """Start recording a profiler trace, or stop and write the one being recorded."""
+        if self.profiler.trace_events is None:
+            self.profiler.start_trace()
+        else:
+            path = time.strftime("trace_%Y%m%d_%H%M%S.json")
+            self.profiler.stop_trace(path)
+            print(f"Wrote trace to {path}")
 
     def handle_key_up(self, event):
         """Handle key release events."""
@@ -149,7 +185,7 @@ class Editor:
             "variant": self.tile_variant,
             "pos": (self.mpos[0] + self.cam_pos[0], self.mpos[1] + self.cam_pos[1]),
         }
-        self.tilemap.offgrid_tiles.append(tile_data)
+        self.tilemap.add_offgrid_tile(tile_data)
         print(f"Added off-grid tile at: {tile_data['pos']}")
         print(f"Cam pos: {self.cam_pos}")
 
@@ -176,46 +212,69 @@ class Editor:
     def place_grid_tile(self, tile_pos):
         """Place a tile on the grid."""
         if self.left_click and self.ongrid:  # Place on grid
-            self.tilemap.tilemap[f"{tile_pos[0]};{tile_pos[1]}"] = {
-                "type": self.tile_list[self.tile_group],
-                "variant": self.tile_variant,
-                "pos": tile_pos,
-            }
+            tile_type = self.tile_list[self.tile_group]
+            # Holding the button keeps placing; skip cells that already hold the tile
+            current = self.tilemap.get_tile(tile_pos)
+            if current is not None and current["type"] == tile_type:
+                if self.autotile_on_edit or current["variant"] == self.tile_variant:
+                    return
+            self.tilemap.set_tile(tile_pos, tile_type, self.tile_variant)
+            if self.autotile_on_edit:
+                self.tilemap.autotile_around(tile_pos)
 
     def delete_tile(self, tile_pos):
         """Delete a tile from the grid or off-grid."""
         if self.right_click:  # Delete
             # Delete on-grid tile
-            tile_loc = f"{tile_pos[0]};{tile_pos[1]}"
-            if tile_loc in self.tilemap.tilemap:
-                del self.tilemap.tilemap[tile_loc]
+            if self.tilemap.remove_tile(tile_pos) and self.autotile_on_edit:
+                self.tilemap.autotile_around(tile_pos)
 
             # Delete off-grid tile
-            for tile in self.tilemap.offgrid_tiles.copy():
-                tile_img = self.assets[tile["type"]][tile["variant"]]
-                tile_r = pygame.Rect(
-                    tile["pos"][0] - self.cam_pos[0],
-                    tile["pos"][1] - self.cam_pos[1],
-                    tile_img.get_width(),
-                    tile_img.get_height(),
-                )
-                if tile_r.collidepoint(self.mpos):
-                    self.tilemap.offgrid_tiles.remove(tile)
+            world_pos = (self.mpos[0] + self.cam_pos[0], self.mpos[1] + self.cam_pos[1])
+            for tile in self.tilemap.offgrid_at(world_pos):
+                self.tilemap.remove_offgrid_tile(tile)
+
+    def needs_redraw(self, view):
+        """
+        Check whether the next frame can differ from the last one drawn.
+        Args:
+            view (tuple): Current camera and cursor state.
+        Returns:
+            bool: True if the frame has to be redrawn.
+        """
+        if not self.dirty_rects or self.profiler.show_overlay:
+            return True
+        return self.redraw or self.left_click or self.right_click or view != self.last_view
 
     def run(self):
         """
         Main game loop. Handles events, updates game state, and renders the game.
         """
         while self.running:
-            # Render BG
-            self.display.fill((0, 0, 0))
             self.update_camera_pos()
             render_offset = (int(self.cam_pos[0]), int(self.cam_pos[1]))
-            self.tilemap.render(self.display, offset=render_offset)
 
             # Update mouse position
             self.update_mouse_position()
 
+            # Nothing to do on an idle, static view
+            view = (render_offset, self.mpos)
+            if not self.needs_redraw(view):
+                self.handle_events()
+                with self.profiler.phase("wait"):
+                    self.clock.tick(60)
+                self.profiler.end_frame()
+                continue
+            camera_moved = self.last_view is None or render_offset != self.last_view[0]
+            self.last_view = view
+            self.redraw = False
+
+            # Render BG
+            with self.profiler.phase("clear"):
+                self.display.fill((0, 0, 0))
+            with self.profiler.phase("tilemap_render"):
+                self.profiler.count("blits", self.tilemap.render(self.display, offset=render_offset))
+
             # Fetch current tile to be placed
             curr_tile_group = self.assets[self.tile_list[self.tile_group]]
             curr_tile = curr_tile_group[self.tile_variant].copy()
@@ -231,10 +290,17 @@ class Editor:
             self.render_tile(curr_tile, tile_pos)
             self.place_grid_tile(tile_pos)
             self.delete_tile(tile_pos)
-            self.handle_events()
-            self.screen.blit(pygame.transform.scale(self.display, self.screen.get_size()), (0, 0))
-            pygame.display.update()
-            self.clock.tick(60)
+            with self.profiler.phase("events"):
+                self.handle_events()
+            self.profiler.render_overlay(self.display)
+            self.presenter.present(self.display, full=camera_moved)
+            with self.profiler.phase("wait"):
+                self.clock.tick(60)
+            self.profiler.end_frame()
 
 
-Editor().run()
\ No newline at end of file
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Level Editor")
+    parser.add_argument("--presenter", choices=PRESENTERS, default="surface", help="How frames are shown on the window")
+    args = parser.parse_args()
+    Editor(presenter=args.presenter).run()
@@ -1,74 +1,240 @@
+import os
 import pygame
 import sys
+import time
+import json
 import random
-import math
+import argparse
 from scripts.entities import PhysicsEntity, Player
-from scripts.utils import load_image, load_images, Animation
+from scripts.utils import OUTLINE_COLOR, OUTLINE_OFFSETS, percentile
+from scripts.assets import AssetLoader, image, images, animation
 from scripts.tilemap import Tilemap
+from scripts.physics import PhysicsWorld
+from scripts.entitymanager import EntityManager
 from scripts.clouds import Clouds
-from scripts.particle import Particle
+from scripts.parallax import Parallax, static_layer
+from scripts.particle import ParticleSystem
+from scripts.presenter import PRESENTERS, open_presenter
+from scripts.renderqueue import RenderQueue
+from scripts.replay import InputRecorder, InputReplay
+from scripts.profiler import FrameProfiler
+from scripts.spatial import SpatialGrid
+from scripts.quality import QualityGovernor
+
+
+# Ways of drawing the black outline around tiles and entities:
+# "baked" draws outlines pre-rendered per tile chunk and sprite frame,
+# "mask" builds a silhouette of the whole display every frame.
+OUTLINE_MODES = ("baked", "mask")
+# Simulation steps per second. All physics is expressed per step.
+SIM_RATE = 60
+# Most simulation steps run to catch up in one rendered frame; older time is dropped after a long stall
+MAX_STEPS_PER_FRAME = 5
+# Entities this far (in pixels) outside the view are still drawn
+ENTITY_VIEW_MARGIN = 16
+# Trees this close (in pixels) to the view spawn leaves at the full rate; a leaf falls about 110px in its lifetime
+LEAF_SPAWN_MARGIN = 128
+# Trees past LEAF_SPAWN_MARGIN but within this distance of the view roll for leaves on one step out of
+# LEAF_LOD_INTERVAL, so the area around the view isn't bare when the camera gets there. Farther trees
+# don't spawn at all, and particles that drift past this distance are retired.
+PARTICLE_LOD_MARGIN = 320
+LEAF_LOD_INTERVAL = 4
+# Depth bands the clouds are baked into, each drawn as one parallax layer
+CLOUD_LAYERS = 3
+# Quality tiers the QualityGovernor steps through when frames run over budget, best first:
+# leaf_rate and dash_particles scale how many leaf and dash particles spawn, outline_every
+# rebuilds the mask outline once every that many frames (reusing it in between, 0 skips it)
+# and cloud_layers is how many of the nearest cloud layers are drawn.
+QUALITY_TIERS = (
+    {"name": "high", "leaf_rate": 1.0, "dash_particles": 1.0, "outline_every": 1, "cloud_layers": CLOUD_LAYERS},
+    {"name": "medium", "leaf_rate": 0.5, "dash_particles": 0.5, "outline_every": 2, "cloud_layers": 2},
+    {"name": "low", "leaf_rate": 0.25, "dash_particles": 0.25, "outline_every": 4, "cloud_layers": 1},
+    {"name": "minimal", "leaf_rate": 0.0, "dash_particles": 0.0, "outline_every": 0, "cloud_layers": 0},
+)
+# Game assets, loaded by AssetLoader into Game.assets under the same names
+ASSETS = {
+    "decor": images("tiles/decor"),
+    "large_decor": images("tiles/large_decor"),
+    "grass": images("tiles/grass"),
+    "stone": images("tiles/stone"),
+    "spawners": images("tiles/spawners"),
+    "player": image("entities/player.png"),
+    "background": image("background.png"),
+    "clouds": images("clouds"),
+    "player/idle": animation("entities/player/idle", img_dur=6),
+    "player/run": animation("entities/player/run", img_dur=4),
+    "player/jump": animation("entities/player/jump"),
+    "player/slide": animation("entities/player/slide"),
+    "player/wall_slide": animation("entities/player/wall_slide"),
+    "enemy/idle": animation("entities/enemy/idle", img_dur=6),
+    "enemy/run": animation("entities/enemy/run", img_dur=4),
+    "particle/leaf": animation("particles/leaf", img_dur=20, loop=False),
+    "particle/particle": animation("particles/particle", img_dur=6, loop=False),
+}
 
 
 class Game:
-    def __init__(self):
+    def __init__(
+        self,
+        outline_mode="baked",
+        dirty_rects=False,
+        headless=False,
+        seed=None,
+        map_path="map.json",
+        asset_cache=None,
+        presenter="surface",
+        quality="auto",
+    ):
         """
         Initialize the game, set up the window, load assets, and create game objects.
+        Args:
+            outline_mode (str): How outlines are drawn, one of OUTLINE_MODES. Toggled in game with F2.
+            dirty_rects (bool): Whether to only update the parts of the window that changed
+                while the camera is still.
+            headless (bool): Whether to run without a display, using SDL's dummy video driver.
+            seed (int): Seed for the game's random number generator. Picked at random if None.
+            map_path (str): The map to load.
+            asset_cache (str): Where to cache the packed sprite atlas between runs. None disables the cache.
+            presenter (str): How frames are shown on the window, one of PRESENTERS.
+            quality (str): "auto" to adapt the quality tier to frame times while running, or the name of
+                one of QUALITY_TIERS to keep it fixed.
         """
         # Pygame window setup
+        self.headless = headless
+        if headless:
+            # Must be set before pygame.init; a (dummy) video mode is still needed to convert images
+            os.environ["SDL_VIDEODRIVER"] = "dummy"
+            os.environ["SDL_AUDIODRIVER"] = "dummy"
         pygame.init()
-        pygame.display.set_caption("Platform Game")
-        self.screen = pygame.display.set_mode((640, 480))  # Game window
+        self.profiler = FrameProfiler()  # Per-phase frame timings; F3 toggles the overlay, F4 records a trace
+        # Opens the game window; dirty rects are only used by the surface presenter
+        self.presenter = open_presenter(
+            presenter, "Platform Game", (640, 480), dirty_rects=dirty_rects, profiler=self.profiler
+        )
         self.clock = pygame.time.Clock()
         self.running = True
+        # All gameplay randomness comes from this generator, so a seed and the inputs reproduce a run
+        self.seed = seed if seed is not None else random.randrange(2**32)
+        self.rng = random.Random(self.seed)
+        # Leaf and dash particles draw from their own generator: how many numbers they use depends on the
+        # quality tier, which may change while recording, and that mustn't shift the gameplay sequence
+        self.effects_rng = random.Random(f"{self.seed}:effects")
+        self.map_path = map_path
+        self.tick = 0  # Number of simulation steps run so far
+        self.recorder = None  # InputRecorder logging gameplay inputs, if recording
+        self.record_path = None
+        self.trace_path = None  # Where a trace recorded from the command line is written on quit
+        self.outline_mode = outline_mode
         self.display = pygame.Surface((320, 240), pygame.SRCALPHA)  # Display that most objects are rendered on
         self.display_2 = pygame.Surface((320, 240))  # Render objects that don't get outlined
+        # Blits of a frame, batched per layer; flushed in this order within each target surface
+        self.render_queue = RenderQueue()
+        self.render_queue.add_layer("parallax", self.display_2)  # Background and clouds
+        self.render_queue.add_layer("tiles", self.display)
+        self.render_queue.add_layer("entities", self.display)
+        self.render_queue.add_layer("outlines", self.display_2)  # Baked outlines of tiles and entities
+        self.render_queue.add_layer("particles", self.display)
         # Load game assets
-        self.assets = {
-            "decor": load_images("tiles/decor"),
-            "large_decor": load_images("tiles/large_decor"),
-            "grass": load_images("tiles/grass"),
-            "stone": load_images("tiles/stone"),
-            "player": load_image("entities/player.png"),
-            "background": load_image("background.png"),
-            "clouds": load_images("clouds"),
-            "player/idle": Animation(load_images("entities/player/idle"), img_dur=6),
-            "player/run": Animation(load_images("entities/player/run"), img_dur=4),
-            "player/jump": Animation(load_images("entities/player/jump")),
-            "player/slide": Animation(load_images("entities/player/slide")),
-            "player/wall_slide": Animation(load_images("entities/player/wall_slide")),
-            "particle/leaf": Animation(load_images("particles/leaf"), img_dur=20, loop=False),
-            "particle/particle": Animation(load_images("particles/particle"), img_dur=6, loop=False),
-        }
+        self.asset_loader = AssetLoader(cache_path=asset_cache)
+        self.assets = self.asset_loader.load(ASSETS)
         # Game Environment
         self.tilemap = Tilemap(self, tile_size=16)
-        self.tilemap.load("map.json")
-        self.clouds = Clouds(self.assets["clouds"], count=12)
-        self.leaf_spawners = []
-        for tree in self.tilemap.extract([("large_decor", 2)], keep=True):
-            self.leaf_spawners.append(pygame.Rect(4 + tree["pos"][0], 4 + tree["pos"][1], 23, 13))
-        self.particles = []
+        self.tilemap.load(map_path)
+        self.clouds = Clouds(self.assets["clouds"], count=12, rng=self.rng)
+        # The sky, then the clouds baked into a few layers of similar depth
+        self.sky = static_layer(self.assets["background"])
+        self.cloud_layers = self.clouds.bake_layers(self.display_2.get_size(), count=CLOUD_LAYERS)
+        self.parallax = Parallax([self.sky] + self.cloud_layers)
+        # Lowers the quality tier when frames run over budget, and raises it back with headroom
+        self.quality = QualityGovernor(QUALITY_TIERS, adaptive=quality == "auto")
+        self.outline_silhouette = None  # Last mask outline silhouette, reused by lower quality tiers
+        self.outline_age = 0  # Frames since the silhouette was built
+        if quality != "auto":
+            self.quality.set_tier(quality)
+        self.apply_quality()
+        self.particles = ParticleSystem(self, ["leaf", "particle"])
+        self.physics = PhysicsWorld()  # State of every physics entity, stepped together
+        self.entities = EntityManager(self)  # Steps the physics entities and answers "what is near here" queries
         # Player initialization
         self.player = Player(self, (20, 50), (8, 15))
+        self.entities.add(self.player)
         self.movement = [False, False]  # [Left, Right]
         # Essentially tracks the game world coordinates, top-left corner of screen is cam pos [x, y].
         self.cam_pos = [0, 0]
+        self.prev_cam_pos = [0, 0]  # Camera position before the last simulation step, for interpolation
+        self.last_render_offset = None
+        self.update_streaming()
+        self.find_leaf_spawners()
+
+    def find_leaf_spawners(self):
+        """Find the trees that spawn leaf particles."""
+        trees = self.tilemap.extract([("large_decor", 2)], keep=True)
+        streamer = self.tilemap.streamer
+        if streamer is not None:
+            # Only trees in required regions, so which trees spawn leaves doesn't depend on background load timing
+            trees = [tree for tree in trees if streamer.region_of_pos(tree["pos"]) in streamer.required]
+        self.leaf_spawners = []
+        self.leaf_spawner_index = SpatialGrid(cell_size=256)  # The spawners near the view are looked up in it
+        for tree in trees:
+            rect = pygame.Rect(4 + tree["pos"][0], 4 + tree["pos"][1], 23, 13)
+            self.leaf_spawners.append(rect)
+            self.leaf_spawner_index.insert(rect, rect)
+
+    def apply_quality(self):
+        """Apply the settings of the active quality tier that aren't read as they are needed."""
+        settings = self.quality.active
+        # The nearest layers are kept, as they stand out most
+        # bake_layers drops empty depth bands, so there may be fewer layers than the tier allows
+        kept = self.cloud_layers[max(0, len(self.cloud_layers) - settings["cloud_layers"]) :]
+        self.parallax.layers = [self.sky] + kept
+        self.outline_silhouette = None
+
+    def view_rect(self, margin=0):
+        """
+        Get the area of the world the camera shows.
+        Args:
+            margin (int): Extra pixels around the view.
+        Returns:
+            pygame.Rect: The view, in world pixels.
+        """
+        width, height = self.display.get_size()
+        return pygame.Rect(
+            int(self.cam_pos[0]) - margin, int(self.cam_pos[1]) - margin, width + margin * 2, height + margin * 2
+        )
+
+    def update_streaming(self):
+        """
+        Page map regions in and out around the camera and the player, when streaming a world.
+        Returns:
+            bool: True if the set of required regions changed.
+        """
+        streamer = self.tilemap.streamer
+        if streamer is None:
+            return False
+        return streamer.update([self.view_rect(), self.player.rect()])
 
     def generate_leaf_particles(self):
-        """Generate leaf particles from spawners. Chance based, larger the object higher chance."""
-        for rect in self.leaf_spawners:
-            if random.random() * 50000 < rect.width * rect.height:
-                pos = (rect.x + (random.random() * rect.width), rect.y + (random.random() * rect.height))
-                self.particles.append(Particle(self, "leaf", pos, velocity=[-0.1, 0.3], frame=random.randint(0, 20)))
-
-    def update_particles(self, render_offset):
-        """Update and render particles."""
-        for particle in self.particles.copy():
-            kill = particle.update()
-            particle.render(self.display, offset=render_offset)
-            if particle.type == "leaf":
-                particle.pos[0] += math.sin(particle.animation.frame * 0.035) * 0.3  # Oscillates L/R
-            if kill:
-                self.particles.remove(particle)
+        """
+        Generate leaf particles from the spawners around the view. Chance based, larger the object higher chance.
+        Returns:
+            int: Number of spawners that rolled for a leaf.
+        """
+        rate = self.quality.active["leaf_rate"]
+        if not rate:
+            return 0
+        rng = self.effects_rng
+        near = self.view_rect(LEAF_SPAWN_MARGIN)
+        lod_turn = self.tick % LEAF_LOD_INTERVAL
+        rolled = 0
+        for rect in self.leaf_spawner_index.query_rect(self.view_rect(PARTICLE_LOD_MARGIN)):
+            # Far trees take turns by column, so their rolls are spread over the steps
+            if not near.colliderect(rect) and (rect.x >> 4) % LEAF_LOD_INTERVAL != lod_turn:
+                continue
+            rolled += 1
+            if rng.random() * 50000 < rect.width * rect.height * rate:
+                pos = (rect.x + (rng.random() * rect.width), rect.y + (rng.random() * rect.height))
+                self.particles.spawn("leaf", pos, velocity=(-0.1, 0.3), frame=rng.randint(0, 20))
+        return rolled
 
     def update_cam(self):
         """
@@ -79,83 +245,357 @@ class Game:
         target_cam_y = self.player.rect().centery - self.display.get_height() / 2
         # Update the camera pos to target pos
         cam_speed = 30  # value = how many frames it takes to reach destination
+        self.prev_cam_pos = self.cam_pos.copy()
         self.cam_pos[0] += (target_cam_x - self.cam_pos[0]) / cam_speed
         self.cam_pos[1] += (target_cam_y - self.cam_pos[1]) / cam_speed
 
+    def apply_input(self, action):
+        """
+        Apply a gameplay input. Inputs are recorded here when recording is on.
+        Args:
+            action (str): One of "left_down", "left_up", "right_down", "right_up", "jump" or "dash".
+        """
+        if self.recorder is not None:
+            self.recorder.record(self.tick, action)
+        if action == "left_down":
+            self.movement[0] = True
+        elif action == "left_up":
+            self.movement[0] = False
+        elif action == "right_down":
+            self.movement[1] = True
+        elif action == "right_up":
+            self.movement[1] = False
+        elif action == "jump":
+            self.player.jump()
+        elif action == "dash":
+            self.player.dash()
+
     def handle_events(self):
         """
         Handle input from hardware.
         """
         for event in pygame.event.get():
-            if event.type == pygame.QUIT:  # "X" on Window
+            # The renderer presenter's window doesn't send QUIT, as the hidden display window stays open
+            if event.type == pygame.QUIT or event.type == pygame.WINDOWCLOSE:  # "X" on Window
                 self.quit()
             if event.type == pygame.KEYDOWN:  # Key press
                 if event.key == pygame.K_LEFT:
-                    self.movement[0] = True
+                    self.apply_input("left_down")
                 if event.key == pygame.K_RIGHT:
-                    self.movement[1] = True
+                    self.apply_input("right_down")
                 if event.key == pygame.K_SPACE:
-                    self.player.jump()
+                    self.apply_input("jump")
                 if event.key == pygame.K_LSHIFT:
-                    self.player.dash()
+                    self.apply_input("dash")
+                if event.key == pygame.K_F2:  # Switch outline mode, for comparison
+                    next_mode = (OUTLINE_MODES.index(self.outline_mode) + 1) % len(OUTLINE_MODES)
+                    self.outline_mode = OUTLINE_MODES[next_mode]
+                if event.key == pygame.K_F3:  # Show/hide the performance overlay
+                    self.profiler.toggle_overlay()
+                if event.key == pygame.K_F4:  # Start/stop recording a trace file
+                    self.toggle_trace()
             if event.type == pygame.KEYUP:  # Key release
                 if event.key == pygame.K_LEFT:
-                    self.movement[0] = False
+                    self.apply_input("left_up")
                 if event.key == pygame.K_RIGHT:
-                    self.movement[1] = False
+                    self.apply_input("right_up")
+
+    def toggle_trace(self, path=None):
+        """
+        Start recording a profiler trace, or stop and write the one being recorded.
+        Args:
+            path (str): Where to write the trace. Defaults to a timestamped file in the working directory.
+        """
+        if self.profiler.trace_events is None:
+            self.profiler.start_trace()
+        else:
+            path = path or self.trace_path or time.strftime("trace_%Y%m%d_%H%M%S.json")
+            self.profiler.stop_trace(path)
+            print(f"Wrote trace to {path}")
+
+    def start_recording(self, path):
+        """
+        Record gameplay inputs from now on. The log is written to path when the game quits.
+        Args:
+            path (str): Destination of the replay file.
+        """
+        self.recorder = InputRecorder(self.seed, self.map_path)
+        self.record_path = path
 
     def quit(self):
         """
         Quit the game and close the window.
         """
+        if self.recorder is not None:
+            self.recorder.save(self.record_path, self.tick)
+        if self.profiler.trace_events is not None:
+            self.toggle_trace()
+        self.tilemap.close()
         self.running = False
         pygame.quit()
         sys.exit()
 
-    def run(self):
+    def step(self):
         """
-        Main game loop. Handles events, updates game state, and renders the game.
+        Advance the simulation by one fixed step: camera, particles, parallax layers and player.
         """
-        while self.running:
-            self.display.fill((0, 0, 0, 0))
-            self.display_2.blit(self.assets["background"], (0, 0))
-
-            # Update cam pos
+        profiler = self.profiler
+        with profiler.phase("camera"):
             self.update_cam()
+        with profiler.phase("streaming"):
+            if self.update_streaming():
+                self.find_leaf_spawners()
+        with profiler.phase("leaf_spawn"):
+            profiler.count("leaf_spawners", self.generate_leaf_particles())
+        with profiler.phase("parallax_update"):
+            self.parallax.update()
+        with profiler.phase("entities"):
+            movement = (self.movement[1] - self.movement[0], 0)
+            self.player.begin_update(movement)
+            self.entities.update(self.tilemap)
+        with profiler.phase("particles_update"):
+            self.particles.update()
+            self.particles.cull(self.view_rect(PARTICLE_LOD_MARGIN))
+        profiler.count("steps")
+        profiler.count("collision_rects", self.tilemap.rects_tested)
+        self.tilemap.rects_tested = 0
+        self.tick += 1
 
-            # If player position and camera position are both floats, could cause jitter
-            render_offset = (int(self.cam_pos[0]), int(self.cam_pos[1]))
+    def render(self, alpha=1.0):
+        """
+        Render the game and show it on the screen.
+        Args:
+            alpha (float): How far the current time is between the last two simulation steps (0 to 1).
+                Camera, player and particle positions are interpolated by it.
+        """
+        profiler = self.profiler
+        with profiler.phase("clear"):
+            self.display.fill((0, 0, 0, 0))
+
+        # If player position and camera position are both floats, could cause jitter
+        cam_x = self.prev_cam_pos[0] + (self.cam_pos[0] - self.prev_cam_pos[0]) * alpha
+        cam_y = self.prev_cam_pos[1] + (self.cam_pos[1] - self.prev_cam_pos[1]) * alpha
+        render_offset = (int(cam_x), int(cam_y))
 
-            # Particle generation
-            self.generate_leaf_particles()
+        # Render entities onto the display; baked outlines go straight onto display_2
+        queue = self.render_queue
+        queue.reset()
+        size = self.display.get_size()
+        outline_items = queue.items("outlines") if self.outline_mode == "baked" else None
+        with profiler.phase("parallax_render"):
+            # Covers the whole of display_2, so it doubles as clearing it
+            self.parallax.collect(queue.items("parallax"), self.display_2.get_size(), offset=render_offset)
+            queue.flush("parallax")
+        with profiler.phase("tilemap_render"):
+            self.tilemap.collect(queue.items("tiles"), size, offset=render_offset, outline_items=outline_items)
+            queue.flush("tiles")
+        with profiler.phase("entities_render"):
+            # Only entities near the view; the margin covers sprites drawn past their rect and interpolation
+            entity_items = queue.items("entities")
+            for entity in self.entities.query_view(render_offset, size, margin=ENTITY_VIEW_MARGIN):
+                entity.collect(entity_items, offset=render_offset, outline_items=outline_items, alpha=alpha)
+            queue.flush("entities", "outlines")
 
-            # Render entities onto the display
-            self.clouds.update()
-            self.clouds.render(self.display_2, offset=render_offset)
-            self.tilemap.render(self.display, offset=render_offset)
-            self.player.update(self.tilemap, (self.movement[1] - self.movement[0], 0))
-            self.player.render(self.display, offset=render_offset)
+        # Create black outline around objects in main display
+        if self.outline_mode == "mask":
+            outline_every = self.quality.active["outline_every"]
+            with profiler.phase("outline"):
+                # Lower quality tiers reuse the silhouette for a few frames, or skip outlines altogether
+                if outline_every and (self.outline_silhouette is None or self.outline_age >= outline_every - 1):
+                    display_mask = pygame.mask.from_surface(self.display)
+                    self.outline_silhouette = display_mask.to_surface(setcolor=OUTLINE_COLOR, unsetcolor=(0, 0, 0, 0))
+                    self.outline_age = 0
+                else:
+                    self.outline_age += 1
+                if outline_every:
+                    for offset in OUTLINE_OFFSETS:
+                        self.display_2.blit(self.outline_silhouette, offset)
 
-            # Create black outline around objects in main display
-            display_mask = pygame.mask.from_surface(self.display)
-            display_sillhouette = display_mask.to_surface(setcolor=(0, 0, 0, 180), unsetcolor=(0, 0, 0, 0))
-            for offset in [(-1, 0), (1, 0), (0, -1), (0, 1)]:
-                self.display_2.blit(display_sillhouette, offset)
+        with profiler.phase("particles_render"):
+            self.particles.collect(queue.items("particles"), offset=render_offset, alpha=alpha)
+            queue.flush("particles")
+        profiler.count("particles", len(self.particles))
+        profiler.count("blits", queue.blits)
+        profiler.count("blit_calls", queue.calls)
+        profiler.count("quality_tier", self.quality.tier)
 
-            self.update_particles(render_offset)
+        # Upscale the display and render it on the screen; a moving camera changes the whole frame
+        with profiler.phase("compose"):
+            self.display_2.blit(self.display, (0, 0))
+            profiler.render_overlay(self.display_2)
+        self.presenter.present(self.display_2, full=render_offset != self.last_render_offset)
+        self.last_render_offset = render_offset
 
+    def run(self):
+        """
+        Main game loop. Handles events, runs the simulation at a fixed SIM_RATE, and renders the game.
+        The simulation catches up with several steps when rendering falls behind, so a slow
+        frame doesn't slow down gameplay.
+        """
+        step_time = 1 / SIM_RATE
+        accumulator = 0.0
+        last_time = time.perf_counter()
+        while self.running:
             # Handle input
-            self.handle_events()
+            with self.profiler.phase("events"):
+                self.handle_events()
 
-            # Upscale the display and render it on the screen
-            self.display_2.blit(self.display, (0, 0))
-            self.screen.blit(pygame.transform.scale(self.display_2, self.screen.get_size()), (0, 0))
+            now = time.perf_counter()
+            accumulator += now - last_time
+            last_time = now
+
+            steps = 0
+            while accumulator >= step_time and steps < MAX_STEPS_PER_FRAME:
+                self.step()
+                accumulator -= step_time
+                steps += 1
+            if steps == MAX_STEPS_PER_FRAME:
+                accumulator = min(accumulator, step_time)
 
-            # Display the screen
-            pygame.display.update()
+            self.render(accumulator / step_time)
+
+            # Judge the frame on the work done, not on the wait for the next one
+            if self.quality.record((time.perf_counter() - self.profiler.frame_start) * 1000):
+                self.apply_quality()
 
             # 60 FPS
-            self.clock.tick(60)
+            with self.profiler.phase("wait"):
+                self.clock.tick(60)
+            self.profiler.end_frame()
+
+    def simulate(self, ticks, render=False, controller=None):
+        """
+        Run simulation steps back to back, as fast as possible, without waiting on the clock.
+        Args:
+            ticks (int): Number of simulation steps to run.
+            render (bool): Whether to also render a frame after every step.
+            controller (callable): Optional function called as controller(game, tick) before each
+                step, e.g. a bot setting game.movement or calling game.player.jump().
+        Returns:
+            dict: The number of ticks run, the elapsed wall time in seconds and the ticks per second.
+        """
+        start = time.perf_counter()
+        for tick in range(ticks):
+            if controller is not None:
+                controller(self, tick)
+            self.step()
+            if render:
+                self.render()
+            self.profiler.end_frame()
+        elapsed = time.perf_counter() - start
+        return {"ticks": ticks, "seconds": elapsed, "ticks_per_second": ticks / elapsed if elapsed else float("inf")}
+
+    def replay(self, replay, render=False):
+        """
+        Play back a recorded input log, step by step, as fast as possible.
+        The game must have been created with the replay's seed and map, so the run is identical
+        to the recorded one.
+        Args:
+            replay (InputReplay): The input log to play back.
+            render (bool): Whether to also render a frame after every step.
+        Returns:
+            dict: The player's position after every step ("trajectory") and the time every
+                frame took in milliseconds ("frame_ms"), with mean/p50/p95/p99/max summaries.
+        """
+        trajectory = []
+        frame_ms = []
+        for tick in range(replay.ticks):
+            start = time.perf_counter()
+            for action in replay.actions_at(tick):
+                self.apply_input(action)
+            self.step()
+            if render:
+                self.render()
+            self.profiler.end_frame()
+            frame_ms.append((time.perf_counter() - start) * 1000)
+            trajectory.append(self.player.pos.tolist())
+
+        summary = {
+            "mean": sum(frame_ms) / len(frame_ms) if frame_ms else 0.0,
+            "p50": percentile(frame_ms, 50),
+            "p95": percentile(frame_ms, 95),
+            "p99": percentile(frame_ms, 99),
+            "max": max(frame_ms, default=0.0),
+        }
+        return {"ticks": replay.ticks, "trajectory": trajectory, "frame_ms": frame_ms, "summary_ms": summary}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Platform Game")
+    parser.add_argument("--headless", action="store_true", help="Run without a display and report simulation throughput")
+    parser.add_argument("--ticks", type=int, default=3600, help="Simulation steps to run in headless mode")
+    parser.add_argument("--render", action="store_true", help="Also render every step in headless mode")
+    parser.add_argument("--outline", choices=OUTLINE_MODES, default="baked", help="How outlines are drawn")
+    parser.add_argument("--dirty-rects", action="store_true", help="Only update the changed parts of the window")
+    parser.add_argument("--presenter", choices=PRESENTERS, default="surface", help="How frames are shown on the window")
+    parser.add_argument(
+        "--quality",
+        choices=["auto"] + [tier["name"] for tier in QUALITY_TIERS],
+        default="auto",
+        help="Quality tier, or auto to lower it when frames run over budget",
+    )
+    parser.add_argument("--seed", type=int, help="Seed for the game's random number generator")
+    parser.add_argument("--map", default="map.json", help="Map to play: json, binary (.pgmap) or a streamed world directory")
+    parser.add_argument("--record", metavar="PATH", help="Record gameplay inputs to a replay file")
+    parser.add_argument("--replay", metavar="PATH", help="Play back a replay file and report frame timings")
+    parser.add_argument("--replay-out", metavar="PATH", help="Write the replay's trajectory and frame timings as json")
+    parser.add_argument("--trace", metavar="PATH", help="Record a per-phase profiler trace to this file")
+    parser.add_argument("--asset-cache", metavar="PATH", help="Cache the packed sprite atlas in this .png file")
+    args = parser.parse_args()
+
+    if args.replay:
+        replay = InputReplay.load(args.replay)
+        game = Game(
+            outline_mode=args.outline,
+            headless=args.headless,
+            seed=replay.seed,
+            map_path=replay.map_path,
+            asset_cache=args.asset_cache,
+            presenter=args.presenter,
+            quality=args.quality,
+        )
+        if args.trace:
+            game.profiler.start_trace()
+        results = game.replay(replay, render=args.render or not args.headless)
+        if args.trace:
+            game.profiler.stop_trace(args.trace)
+        summary = results["summary_ms"]
+        print(
+            f"{results['ticks']} ticks, frame ms: mean {summary['mean']:.3f} p50 {summary['p50']:.3f} "
+            f"p95 {summary['p95']:.3f} p99 {summary['p99']:.3f} max {summary['max']:.3f}"
+        )
+        print(f"final player position: {results['trajectory'][-1] if results['trajectory'] else None}")
+        if args.replay_out:
+            file = open(args.replay_out, "w")
+            json.dump(results, file)
+            file.close()
+        return
+
+    game = Game(
+        outline_mode=args.outline,
+        dirty_rects=args.dirty_rects,
+        headless=args.headless,
+        seed=args.seed,
+        map_path=args.map,
+        asset_cache=args.asset_cache,
+        presenter=args.presenter,
+        quality=args.quality,
+    )
+    if args.record:
+        game.start_recording(args.record)
+    if args.trace:
+        game.trace_path = args.trace
+        game.profiler.start_trace()
+    if args.headless:
+        stats = game.simulate(args.ticks, render=args.render)
+        if game.recorder is not None:
+            game.recorder.save(game.record_path, game.tick)
+        if args.trace:
+            game.profiler.stop_trace(args.trace)
+        print(f"{stats['ticks']} ticks in {stats['seconds']:.3f}s ({stats['ticks_per_second']:.1f} ticks/s)")
+    else:
+        game.run()
 
 
-Game().run()
+if __name__ == "__main__":
+    main()
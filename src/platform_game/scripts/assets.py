@@ -0,0 +1,237 @@
+import os
+import json
+import time
+import pygame
+from concurrent.futures import ThreadPoolExecutor
+from scripts.utils import BASE_IMG_PATH, Animation
+
+# Bumped whenever the atlas cache layout changes
+ATLAS_CACHE_VERSION = 1
+# Width of the atlas surface; images wider than this get an atlas as wide as they are
+ATLAS_WIDTH = 512
+# Gap left around every image in the atlas
+ATLAS_PADDING = 1
+# Transparent colour of the images (and of the atlas background)
+COLORKEY = (0, 0, 0)
+
+
+def image(path):
+    """
+    Describe a single image asset for AssetLoader.load.
+    Args:
+        path (str): Path of the image file, relative to BASE_IMG_PATH.
+    Returns:
+        tuple: The asset description.
+    """
+    return ("image", path, None)
+
+
+def images(path):
+    """
+    Describe a list-of-images asset (every image file in a directory, sorted by name) for AssetLoader.load.
+    Args:
+        path (str): Path of the directory, relative to BASE_IMG_PATH.
+    Returns:
+        tuple: The asset description.
+    """
+    return ("images", path, None)
+
+
+def animation(path, **kwargs):
+    """
+    Describe an Animation asset built from every image in a directory, for AssetLoader.load.
+    Args:
+        path (str): Path of the directory, relative to BASE_IMG_PATH.
+        **kwargs: Passed on to Animation, e.g. img_dur or loop.
+    Returns:
+        tuple: The asset description.
+    """
+    return ("animation", path, kwargs)
+
+
+def _decode(full_paths):
+    """Decode a batch of image files. Runs on the loader threads, so it mustn't touch the display."""
+    return [pygame.image.load(full_path) for full_path in full_paths]
+
+
+class AssetLoader:
+    def __init__(self, max_workers=None, cache_path=None, atlas_width=ATLAS_WIDTH, views=False):
+        """
+        Initialize an asset loader that decodes image files in parallel.
+
+        With views or cache_path set, every image (and the mirrored frames of animations) is also
+        blitted into a single atlas surface, and the assets are cut out of it. With cache_path set,
+        the packed atlas is written to disk and reused on the next start as long as no source image
+        changed. Otherwise no atlas is built and the decoded images are used directly.
+        Args:
+            max_workers (int): Number of decoding threads. Defaults to one per CPU, up to 8; with a
+                single one, images are decoded on the calling thread.
+            cache_path (str): Where to cache the packed atlas (a .png, with a .json index next to it). None disables caching.
+            atlas_width (int): Width of the atlas surface.
+            views (bool): Hand out subsurfaces of the atlas instead of standalone copies. Software blits
+                from subsurfaces are slower, so copies are the default; views suit a renderer that
+                draws from the atlas as a single texture.
+        """
+        self.max_workers = max_workers
+        self.cache_path = cache_path
+        self.atlas_width = atlas_width
+        self.views = views
+        self.atlas = None  # The packed atlas surface, if one was built
+        self.rects = {}  # Atlas key ("<path>" or "<path>#flip") -> [x, y, w, h] in the atlas
+        self.stats = {}  # Files, seconds and whether the cache was used, for the last load
+
+    def load(self, specs):
+        """
+        Load a set of assets.
+        Args:
+            specs (dict): Asset name -> description built with image, images or animation.
+        Returns:
+            dict: Asset name -> pygame.Surface, list of Surfaces or Animation, like the hand-built assets dict.
+        """
+        start = time.perf_counter()
+        # Resolve the files behind each asset, in a stable order
+        files = {}  # Asset name -> list of image paths relative to BASE_IMG_PATH
+        flipped = set()  # Paths whose mirrored copy is packed too
+        for name, (kind, path, kwargs) in specs.items():
+            if kind == "image":
+                full_path = os.path.join(BASE_IMG_PATH, path)
+                if not os.path.exists(full_path):
+                    raise FileNotFoundError(f"Image file '{full_path}' not found.")
+                files[name] = [path]
+            else:
+                dir_path = os.path.join(BASE_IMG_PATH, path)
+                if not os.path.isdir(dir_path):
+                    raise FileNotFoundError(f"Directory '{dir_path}' not found.")
+                # Sorted to ensure consistent order across OSes
+                files[name] = [os.path.join(path, img_name) for img_name in sorted(os.listdir(dir_path))]
+                if kind == "animation":
+                    flipped.update(files[name])
+        paths = sorted({path for group in files.values() for path in group})
+
+        from_cache = False
+        if self.views or self.cache_path is not None:
+            signature = self._signature(paths, flipped)
+            from_cache = self._load_cache(signature)
+            if not from_cache:
+                self._pack(paths, flipped)
+                self._save_cache(signature)
+            get = self._view
+        else:
+            # Without views or a cache an atlas only costs time, so the decoded images are used as they are
+            self.atlas = None
+            self.rects = {}
+            loaded = dict(zip(paths, self._decode_all(paths)))
+            for img in loaded.values():
+                img.set_colorkey(COLORKEY)
+            for path in flipped:
+                loaded[path + "#flip"] = pygame.transform.flip(loaded[path], True, False)
+            get = loaded.__getitem__
+
+        assets = {}
+        for name, (kind, path, kwargs) in specs.items():
+            frames = [get(path) for path in files[name]]
+            if kind == "image":
+                assets[name] = frames[0]
+            elif kind == "images":
+                assets[name] = frames
+            else:
+                flipped_frames = [get(path + "#flip") for path in files[name]]
+                assets[name] = Animation(frames, flipped_images=flipped_frames, **kwargs)
+        self.stats = {"files": len(paths), "seconds": time.perf_counter() - start, "from_cache": from_cache}
+        return assets
+
+    def _view(self, key):
+        """Get an image out of the atlas, as a subsurface or a copy."""
+        view = self.atlas.subsurface(self.rects[key])
+        return view if self.views else view.copy()
+
+    def _decode_all(self, paths):
+        """
+        Decode image files on a thread pool and convert them to the display format.
+        Returns:
+            list: The converted surfaces, in the order of paths.
+        """
+        full_paths = [os.path.join(BASE_IMG_PATH, path) for path in paths]
+        workers = self.max_workers or min(8, os.cpu_count() or 1)
+        if workers <= 1:
+            decoded = _decode(full_paths)
+        else:
+            # One batch per thread; the files are small, so a task per file costs more than it saves
+            with ThreadPoolExecutor(max_workers=workers) as pool:
+                batches = pool.map(_decode, [full_paths[i::workers] for i in range(workers)])
+            decoded = [None] * len(full_paths)
+            for i, batch in enumerate(batches):
+                decoded[i::workers] = batch
+        # Drops per-pixel alpha exactly like load_image, so the assets hold the same pixels
+        return [img.convert() for img in decoded]
+
+    def _pack(self, paths, flipped):
+        """Decode the images and pack them, and the mirrored copies asked for, into the atlas."""
+        entries = []  # (key, surface)
+        for path, img in zip(paths, self._decode_all(paths)):
+            entries.append((path, img))
+            if path in flipped:
+                entries.append((path + "#flip", pygame.transform.flip(img, True, False)))
+
+        # Shelf packing: tallest images first, filling rows left to right
+        width = max([self.atlas_width] + [img.get_width() + ATLAS_PADDING * 2 for key, img in entries])
+        entries.sort(key=lambda entry: (-entry[1].get_height(), entry[0]))
+        self.rects = {}
+        x = y = shelf_height = 0
+        for key, img in entries:
+            w = img.get_width() + ATLAS_PADDING * 2
+            h = img.get_height() + ATLAS_PADDING * 2
+            if x + w > width:
+                x = 0
+                y += shelf_height
+                shelf_height = 0
+            self.rects[key] = [x + ATLAS_PADDING, y + ATLAS_PADDING, img.get_width(), img.get_height()]
+            x += w
+            shelf_height = max(shelf_height, h)
+
+        self.atlas = pygame.Surface((width, max(y + shelf_height, 1))).convert()
+        self.atlas.fill(COLORKEY)
+        self.atlas.set_colorkey(COLORKEY)
+        self.atlas.blits([(img, self.rects[key][:2]) for key, img in entries], doreturn=False)
+
+    def _signature(self, paths, flipped):
+        """Describe the source images, so a cached atlas can be checked against them."""
+        sources = []
+        for path in paths:
+            stat = os.stat(os.path.join(BASE_IMG_PATH, path))
+            sources.append([path, stat.st_size, stat.st_mtime_ns, path in flipped])
+        return {"version": ATLAS_CACHE_VERSION, "atlas_width": self.atlas_width, "sources": sources}
+
+    def _index_path(self):
+        """Path of the cached atlas' index file."""
+        return os.path.splitext(self.cache_path)[0] + ".json"
+
+    def _load_cache(self, signature):
+        """
+        Load the cached atlas if it was packed from the same source images.
+        Returns:
+            bool: True if the cache was used.
+        """
+        if self.cache_path is None or not os.path.exists(self.cache_path) or not os.path.exists(self._index_path()):
+            return False
+        file = open(self._index_path(), "r")
+        index = json.load(file)
+        file.close()
+        if index.get("signature") != signature:
+            return False
+        self.atlas = pygame.image.load(self.cache_path).convert()
+        self.atlas.set_colorkey(COLORKEY)
+        self.rects = index["rects"]
+        return True
+
+    def _save_cache(self, signature):
+        """Write the packed atlas and its index to the cache."""
+        if self.cache_path is None:
+            return
+        directory = os.path.dirname(self.cache_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        pygame.image.save(self.atlas, self.cache_path)
+        file = open(self._index_path(), "w")
+        json.dump({"signature": signature, "rects": self.rects}, file)
+        file.close()
@@ -0,0 +1,192 @@
+import pygame
+from collections import OrderedDict
+from scripts.tilestore import CHUNK_SHIFT, CHUNK_MASK, CHUNK_SIZE, EMPTY
+from scripts.utils import outline_image
+
+# Colour used as the transparent colorkey of baked chunk surfaces (matches the tile images)
+COLORKEY = (0, 0, 0)
+
+
+class ChunkCache:
+    def __init__(self, tilemap, max_chunks=64):
+        """
+        Initialize a cache of pre-rendered chunk surfaces.
+
+        Each chunk of the tilemap is baked once into a single surface holding its grid
+        tiles and the parts of any off-grid tiles that overlap it, so rendering a frame
+        costs one blit per visible chunk. Surfaces are rebuilt only after the chunk is
+        invalidated, and the least recently used ones are dropped past max_chunks.
+        Args:
+            tilemap (Tilemap): The tilemap whose chunks are baked.
+            max_chunks (int): Maximum number of baked chunk surfaces kept in memory.
+        """
+        self.tilemap = tilemap
+        self.max_chunks = max_chunks
+        self.surfaces = OrderedDict()  # (cx, cy) -> pygame.Surface, or None for an empty chunk
+        self.outlines = {}  # (cx, cy) -> baked outline of the chunk surface, built on first use
+
+    def chunk_px(self):
+        """
+        Get the size of a chunk in pixels.
+        Returns:
+            int: Width (and height) of a chunk in pixels.
+        """
+        return CHUNK_SIZE * self.tilemap.tile_size
+
+    def invalidate(self, cx, cy):
+        """
+        Drop the baked surface of a chunk so it is rebuilt on its next render.
+        Args:
+            cx (int): Chunk x coordinate.
+            cy (int): Chunk y coordinate.
+        """
+        self.surfaces.pop((cx, cy), None)
+        self.outlines.pop((cx, cy), None)
+
+    def invalidate_rect(self, rect):
+        """
+        Drop the baked surfaces of every chunk overlapping a world-space rect.
+        Args:
+            rect (pygame.Rect): The area that changed, in world pixels.
+        """
+        chunk_px = self.chunk_px()
+        for cx in range(rect.left // chunk_px, (rect.right - 1) // chunk_px + 1):
+            for cy in range(rect.top // chunk_px, (rect.bottom - 1) // chunk_px + 1):
+                self.invalidate(cx, cy)
+
+    def clear(self):
+        """Drop every baked surface."""
+        self.surfaces.clear()
+        self.outlines.clear()
+
+    def get(self, cx, cy):
+        """
+        Get the baked surface of a chunk, baking it if it is not cached.
+        Args:
+            cx (int): Chunk x coordinate.
+            cy (int): Chunk y coordinate.
+        Returns:
+            pygame.Surface: The chunk surface, or None if the chunk has nothing to draw.
+        """
+        key = (cx, cy)
+        if key in self.surfaces:
+            self.surfaces.move_to_end(key)
+            return self.surfaces[key]
+
+        surf = self.bake(cx, cy)
+        self.surfaces[key] = surf
+        if len(self.surfaces) > self.max_chunks:
+            evicted, _ = self.surfaces.popitem(last=False)  # Evict the least recently used chunk
+            self.outlines.pop(evicted, None)
+        return surf
+
+    def get_outline(self, cx, cy):
+        """
+        Get the baked outline of a chunk, baking it if it is not cached.
+        Args:
+            cx (int): Chunk x coordinate.
+            cy (int): Chunk y coordinate.
+        Returns:
+            pygame.Surface: The outline, 2px larger than the chunk, or None if the chunk has nothing to draw.
+        """
+        surf = self.get(cx, cy)
+        if surf is None:
+            return None
+        outline = self.outlines.get((cx, cy))
+        if outline is None:
+            outline = self.outlines[(cx, cy)] = outline_image(surf)
+        return outline
+
+    def bake(self, cx, cy):
+        """
+        Render every tile touching a chunk onto a new surface.
+        Args:
+            cx (int): Chunk x coordinate.
+            cy (int): Chunk y coordinate.
+        Returns:
+            pygame.Surface: The baked chunk, or None if the chunk has nothing to draw.
+        """
+        tilemap = self.tilemap
+        tile_size = tilemap.tile_size
+        assets = tilemap.game.assets
+        chunk_px = self.chunk_px()
+        origin_x = cx * chunk_px
+        origin_y = cy * chunk_px
+
+        # Off-grid tiles go underneath grid tiles, same as an unbaked render
+        offgrid = tilemap.offgrid_in_rect(pygame.Rect(origin_x, origin_y, chunk_px, chunk_px))
+        grid_chunk = tilemap.grid.chunks.get((cx, cy))
+        if not offgrid and grid_chunk is None:
+            return None
+
+        surf = pygame.Surface((chunk_px, chunk_px))
+        surf.fill(COLORKEY)
+        surf.set_colorkey(COLORKEY)
+        # Every tile goes through one batched blit, in drawing order
+        items = [
+            (assets[tile["type"]][tile["variant"]], (tile["pos"][0] - origin_x, tile["pos"][1] - origin_y))
+            for tile in offgrid
+        ]
+        if grid_chunk is not None:
+            grid = tilemap.grid
+            images = {}  # Tile id -> image, so each id is looked up in the assets once
+            for idx, tile_id in enumerate(grid_chunk):
+                if tile_id != EMPTY:
+                    tile_image = images.get(tile_id)
+                    if tile_image is None:
+                        tile_type, variant = grid.lookup(tile_id)
+                        tile_image = images[tile_id] = assets[tile_type][variant]
+                    items.append((tile_image, ((idx & CHUNK_MASK) * tile_size, (idx >> CHUNK_SHIFT) * tile_size)))
+        surf.fblits(items)
+        return surf
+
+    def collect(self, items, size, offset=(0, 0), outline_items=None):
+        """
+        Queue every chunk visible on a surface for a batched blit.
+        Args:
+            items (list): The list of (surface, position) pairs to append the chunks to, e.g. a RenderQueue layer.
+            size (tuple): Size (w, h) of the surface the chunks are drawn on.
+            offset (tuple): Coordinates to offset for center camera.
+            outline_items (list): If given, the chunks' baked outlines are appended to it.
+        Returns:
+            int: Number of blits queued.
+        """
+        chunk_px = self.chunk_px()
+        # Outlines reach 1px past their chunk, so chunks just off screen may still contribute
+        margin = 1 if outline_items is not None else 0
+        start_cx = (offset[0] - margin) // chunk_px
+        end_cx = (offset[0] + size[0] - 1 + margin) // chunk_px + 1
+        start_cy = (offset[1] - margin) // chunk_px
+        end_cy = (offset[1] + size[1] - 1 + margin) // chunk_px + 1
+
+        blits = 0
+        for cx in range(start_cx, end_cx):
+            for cy in range(start_cy, end_cy):
+                chunk_surf = self.get(cx, cy)
+                if chunk_surf is None:
+                    continue
+                chunk_pos = (cx * chunk_px - offset[0], cy * chunk_px - offset[1])
+                items.append((chunk_surf, chunk_pos))
+                blits += 1
+                if outline_items is not None:
+                    outline_items.append((self.get_outline(cx, cy), (chunk_pos[0] - 1, chunk_pos[1] - 1)))
+                    blits += 1
+        return blits
+
+    def render(self, surf, offset=(0, 0), outline_surf=None):
+        """
+        Blit every chunk visible on a surface, one batched blit per target surface.
+        Args:
+            surf (pygame.Surface): The surface to draw on.
+            offset (tuple): Coordinates to offset for center camera.
+            outline_surf (pygame.Surface): If given, the chunks' baked outlines are drawn onto it.
+        Returns:
+            int: Number of blits made.
+        """
+        items = []
+        outline_items = [] if outline_surf is not None else None
+        blits = self.collect(items, surf.get_size(), offset=offset, outline_items=outline_items)
+        surf.fblits(items)
+        if outline_items:
+            outline_surf.fblits(outline_items)
+        return blits
@@ -1,4 +1,5 @@
 import random
+from scripts.parallax import ParallaxLayer, bake_layer
 
 
 class Cloud:
@@ -22,12 +23,14 @@ class Cloud:
         """
         self.pos[0] += self.speed  # Move cloud horizontally
 
-    def render(self, surf, offset=(0, 0)):
+    def dest(self, size, offset=(0, 0)):
         """
-        Render the cloud on the given surface with a parallax effect.
+        Get where the cloud is drawn on a surface, with a parallax effect.
         Args:
-            surf (pygame.Surface): The surface to draw the cloud on.
+            size (tuple): Size (w, h) of the surface the cloud is drawn on.
             offset (tuple): The camera offset
+        Returns:
+            tuple: The (x, y) position of the cloud's top-left corner on the surface.
         """
         # Adjust cloud position based on depth to create parallax effect
         # Closer objects (larger depth) move faster
@@ -36,15 +39,23 @@ class Cloud:
         # Wrap cloud position around to create an infinite scrolling effect
         # add/sub img w/h to avoid img teleporting from end to start upon wrap
         wrapped_x = (
-            rend_pos_x % (surf.get_width() + self.img.get_width())
+            rend_pos_x % (size[0] + self.img.get_width())
             - self.img.get_width()
         )
         wrapped_y = (
-            rend_pos_y % (surf.get_height() + self.img.get_height())
+            rend_pos_y % (size[1] + self.img.get_height())
             - self.img.get_height()
         )
-        # Draw the cloud on the surface
-        surf.blit(self.img, (wrapped_x, wrapped_y))
+        return (wrapped_x, wrapped_y)
+
+    def render(self, surf, offset=(0, 0)):
+        """
+        Render the cloud on the given surface with a parallax effect.
+        Args:
+            surf (pygame.Surface): The surface to draw the cloud on.
+            offset (tuple): The camera offset
+        """
+        surf.blit(self.img, self.dest(surf.get_size(), offset=offset))
 
 
 class Clouds:
@@ -53,22 +64,23 @@ class Clouds:
     MIN_DEPTH = 0.2
     MAX_DEPTH = 0.8
 
-    def __init__(self, cloud_images, count=16):
+    def __init__(self, cloud_images, count=16, rng=random):
         """
         Initialize a collection of clouds.
         Args:
             cloud_images (list): A list of cloud images to choose from.
             count (int): The number of clouds to generate.
+            rng (random.Random): Random number generator to place the clouds with. Defaults to the random module.
         """
         self.clouds = []
 
         for _ in range(count):
             # Generate a cloud with random position, image, speed, and depth
             cloud = Cloud(
-                pos=(random.random() * 99999, random.random() * 99999),
-                img=random.choice(cloud_images),
-                speed=random.uniform(Clouds.MIN_SPEED, Clouds.MAX_SPEED),
-                depth=random.uniform(Clouds.MIN_DEPTH, Clouds.MAX_DEPTH),
+                pos=(rng.random() * 99999, rng.random() * 99999),
+                img=rng.choice(cloud_images),
+                speed=rng.uniform(Clouds.MIN_SPEED, Clouds.MAX_SPEED),
+                depth=rng.uniform(Clouds.MIN_DEPTH, Clouds.MAX_DEPTH),
             )
             self.clouds.append(cloud)
 
@@ -82,12 +94,62 @@ class Clouds:
         for cloud in self.clouds:
             cloud.update()
 
+    def collect(self, items, size, offset=(0, 0)):
+        """
+        Queue every cloud for a batched blit, furthest first.
+        Args:
+            items (list): The list of (surface, position) pairs to append to, e.g. a RenderQueue layer.
+            size (tuple): Size (w, h) of the surface the clouds are drawn on.
+            offset (tuple): The camera offset
+        Returns:
+            int: Number of blits queued.
+        """
+        items.extend([(cloud.img, cloud.dest(size, offset=offset)) for cloud in self.clouds])
+        return len(self.clouds)
+
     def render(self, surface, offset=(0, 0)):
         """
-        Render all clouds on the given surface with a parallax effect.
+        Render all clouds on the given surface with a parallax effect, in one batched blit.
         Args:
             surface (pygame.Surface): The surface to draw the clouds on.
             offset (tuple): The camera offset
+        Returns:
+            int: Number of blits made.
         """
+        items = []
+        self.collect(items, surface.get_size(), offset=offset)
+        surface.fblits(items)
+        return len(items)
+
+    def bake_layers(self, size, count=3):
+        """
+        Bake the clouds into a few parallax layers, each holding the clouds of similar depth.
+        A layer scrolls at the average depth and drifts at the average speed of its clouds, and
+        wraps around like the clouds do, so drawing it costs the same however many clouds it holds.
+        Args:
+            size (tuple): Size (w, h) of the surface the clouds are drawn on.
+            count (int): Number of depth bands the clouds are split into. Empty bands get no layer.
+        Returns:
+            list: The ParallaxLayer objects, furthest first.
+        """
+        if not self.clouds:
+            return []
+        # Clouds wrap once fully off screen, so the tiles are a cloud larger than the surface
+        tile_size = (
+            size[0] + max(cloud.img.get_width() for cloud in self.clouds),
+            size[1] + max(cloud.img.get_height() for cloud in self.clouds),
+        )
+        bands = [[] for _ in range(count)]
         for cloud in self.clouds:
-            cloud.render(surface, offset=offset)
+            band = int((cloud.depth - Clouds.MIN_DEPTH) / (Clouds.MAX_DEPTH - Clouds.MIN_DEPTH) * count)
+            bands[min(max(band, 0), count - 1)].append(cloud)
+
+        layers = []
+        for band in bands:
+            if not band:
+                continue
+            surface = bake_layer([(cloud.img, cloud.pos) for cloud in band], tile_size)
+            depth = sum(cloud.depth for cloud in band) / len(band)
+            speed = sum(cloud.speed for cloud in band) / len(band)
+            layers.append(ParallaxLayer(surface, depth, speed=speed))
+        return layers
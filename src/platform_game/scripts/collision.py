@@ -0,0 +1,254 @@
+import numpy as np
+from scripts.tilestore import CHUNK_SHIFT, CHUNK_SIZE, CHUNK_MASK, CHUNK_AREA
+
+
+def merge_rects(chunk):
+    """
+    Cover the solid cells of a chunk bitmap with few rectangles, by greedy meshing.
+    Each row is split into runs of solid cells, and a run continues the rectangle started
+    above it when that rectangle spans exactly the same columns.
+    Args:
+        chunk (bytearray): CHUNK_AREA cells, row-major, 1 for solid.
+    Returns:
+        list: [x, y, w, h] rectangles in cells, relative to the chunk, ordered by (y, x).
+    """
+    rects = []
+    open_rects = {}  # (start, end) of a run -> the rectangle it extends, for the previous row
+    for y in range(CHUNK_SIZE):
+        row_start = y << CHUNK_SHIFT
+        row_end = row_start + CHUNK_SIZE
+        next_open = {}
+        start = chunk.find(1, row_start, row_end)
+        while start != -1:
+            end = chunk.find(0, start, row_end)
+            if end == -1:
+                end = row_end
+            run = (start - row_start, end - row_start)
+            rect = open_rects.get(run)
+            if rect is None:
+                rect = [run[0], y, run[1] - run[0], 0]
+                rects.append(rect)
+            rect[3] += 1
+            next_open[run] = rect
+            start = chunk.find(1, end, row_end)
+        open_rects = next_open
+    return rects
+
+
+class SolidityGrid:
+    def __init__(self, solid_types, tile_size=16):
+        """
+        Initialize a bitmap of which grid cells hold a solid (physics) tile.
+
+        Cells are kept in the same chunks as the TileStore, one byte per cell (1 = solid), so a
+        collision query is a dict lookup and an index instead of a tile lookup and a type check.
+        Each chunk's solid cells are also merged into a few rectangles (see merge_rects), so an
+        entity on a flat floor tests one or two rects instead of a tile per cell; the chunk key
+        doubles as the spatial index for them.
+        The owner keeps it in sync by calling update_cell / update_chunk on every grid change.
+        Args:
+            solid_types (set): Tile types that are solid, e.g. PHYSICS_TILES.
+            tile_size (int): Size of a tile in pixels, for the merged rects.
+        """
+        self.solid_types = solid_types
+        self.tile_size = tile_size
+        self.chunks = {}  # (cx, cy) -> bytearray(CHUNK_AREA), only for chunks with a solid cell
+        self.rects = {}  # (cx, cy) -> merged (left, top, right, bottom) world-pixel rects, merged on first query
+        self.rect_arrays = {}  # (cx, cy) -> the same rects as an (n, 4) int64 array, for rects_in_areas
+        self.solid_ids = bytearray(1)  # Tile id -> 1 if its type is solid; index 0 is EMPTY
+
+    def _solid_lut(self, grid):
+        """Extend solid_ids to every tile id interned in the grid so far."""
+        solid_ids = self.solid_ids
+        for tile_id in range(len(solid_ids), len(grid.tile_types)):
+            solid_ids.append(grid.tile_types[tile_id][0] in self.solid_types)
+        return solid_ids
+
+    def is_solid(self, x, y):
+        """
+        Check whether a grid cell holds a solid tile.
+        Args:
+            x (int): Grid x coordinate.
+            y (int): Grid y coordinate.
+        Returns:
+            bool: True if the cell is solid.
+        """
+        chunk = self.chunks.get((x >> CHUNK_SHIFT, y >> CHUNK_SHIFT))
+        return chunk is not None and chunk[((y & CHUNK_MASK) << CHUNK_SHIFT) | (x & CHUNK_MASK)] == 1
+
+    def update_cell(self, grid, x, y):
+        """
+        Re-read one cell from the tile store.
+        Args:
+            grid (TileStore): The tile store.
+            x (int): Grid x coordinate.
+            y (int): Grid y coordinate.
+        """
+        solid = self._solid_lut(grid)[grid.get(x, y)]
+        key = (x >> CHUNK_SHIFT, y >> CHUNK_SHIFT)
+        chunk = self.chunks.get(key)
+        if chunk is None:
+            if not solid:
+                return
+            chunk = self.chunks[key] = bytearray(CHUNK_AREA)
+        idx = ((y & CHUNK_MASK) << CHUNK_SHIFT) | (x & CHUNK_MASK)
+        if chunk[idx] == solid:
+            return
+        chunk[idx] = solid
+        self._invalidate(key)
+        if not solid and not any(chunk):
+            del self.chunks[key]
+
+    def update_chunk(self, grid, cx, cy):
+        """
+        Re-read a whole chunk from the tile store, e.g. after it was loaded or bulk edited.
+        Args:
+            grid (TileStore): The tile store.
+            cx (int): Chunk x coordinate.
+            cy (int): Chunk y coordinate.
+        """
+        tiles = grid.chunks.get((cx, cy))
+        self._invalidate((cx, cy))
+        if tiles is None:
+            self.chunks.pop((cx, cy), None)
+            return
+        lut = np.frombuffer(self._solid_lut(grid), dtype=np.uint8)
+        solid = lut[np.frombuffer(tiles, dtype=np.uint16)]
+        if solid.any():
+            self.chunks[(cx, cy)] = bytearray(solid.tobytes())
+        else:
+            self.chunks.pop((cx, cy), None)
+
+    def _invalidate(self, key):
+        """Drop the merged rects of a chunk; they are merged again when next queried."""
+        self.rects.pop(key, None)
+        self.rect_arrays.pop(key, None)
+
+    def chunk_rects(self, key):
+        """
+        Get the merged solid rects of a chunk, merging them first if the chunk changed since.
+        Args:
+            key (tuple): Chunk coordinates (cx, cy).
+        Returns:
+            list: (left, top, right, bottom) rects, in pixels. Empty if nothing in the chunk is solid.
+        """
+        rects = self.rects.get(key)
+        if rects is not None:
+            return rects
+        chunk = self.chunks.get(key)
+        if chunk is None:
+            return ()
+        size = self.tile_size
+        base_x = (key[0] << CHUNK_SHIFT) * size
+        base_y = (key[1] << CHUNK_SHIFT) * size
+        rects = self.rects[key] = [
+            (base_x + x * size, base_y + y * size, base_x + (x + w) * size, base_y + (y + h) * size)
+            for x, y, w, h in merge_rects(chunk)
+        ]
+        return rects
+
+    def rects_in_area(self, left, top, right, bottom):
+        """
+        Get the merged solid rects overlapping a world-space area.
+        Args:
+            left (int): Left edge of the area, in pixels.
+            top (int): Top edge of the area, in pixels.
+            right (int): Right edge of the area (exclusive), in pixels.
+            bottom (int): Bottom edge of the area (exclusive), in pixels.
+        Returns:
+            list: (left, top, right, bottom) rects, in pixels. A solid area crossing chunk
+                borders is split into a rect per chunk.
+        """
+        chunk_px = self.tile_size << CHUNK_SHIFT
+        cx0 = left // chunk_px
+        cx1 = (right - 1) // chunk_px
+        cy0 = top // chunk_px
+        cy1 = (bottom - 1) // chunk_px
+        if cx0 == cx1 and cy0 == cy1:  # The common case for entity-sized areas
+            return [
+                rect
+                for rect in self.chunk_rects((cx0, cy0))
+                if rect[0] < right and rect[2] > left and rect[1] < bottom and rect[3] > top
+            ]
+        found = []
+        for cy in range(cy0, cy1 + 1):
+            for cx in range(cx0, cx1 + 1):
+                for rect in self.chunk_rects((cx, cy)):
+                    if rect[0] < right and rect[2] > left and rect[1] < bottom and rect[3] > top:
+                        found.append(rect)
+        return found
+
+    def rects_in_areas(self, left, top, right, bottom):
+        """
+        Get the merged solid rects overlapping each of many world-space areas at once, e.g. the
+        boxes swept by every body of a PhysicsWorld. Matches calling rects_in_area per area.
+        Args:
+            left (numpy.ndarray): Left edges of the areas, in pixels (int64).
+            top (numpy.ndarray): Top edges of the areas.
+            right (numpy.ndarray): Right edges of the areas (exclusive).
+            bottom (numpy.ndarray): Bottom edges of the areas (exclusive).
+        Returns:
+            tuple: (rects, areas), an (n, 4) int64 array of (left, top, right, bottom) rects and the
+                index of the area each one overlaps. A rect overlapping several areas is listed once per area.
+        """
+        chunk_px = self.tile_size << CHUNK_SHIFT
+        cx0 = left // chunk_px
+        cy0 = top // chunk_px
+        span_x = (right - 1) // chunk_px - cx0 + 1
+        span_y = (bottom - 1) // chunk_px - cy0 + 1
+        # Every (area, chunk) pair the areas touch
+        steps_x = np.arange(span_x.max())
+        steps_y = np.arange(span_y.max())
+        valid = (steps_x[None, :, None] < span_x[:, None, None]) & (steps_y[None, None, :] < span_y[:, None, None])
+        pair_area, step_x, step_y = np.nonzero(valid)
+        pair_cx = cx0[pair_area] + step_x
+        pair_cy = cy0[pair_area] + step_y
+
+        # Gather the rects of every chunk touched, once per chunk
+        # Both coordinates packed into one int64 (cy in the low 32 bits, sign-extended back), so np.unique is 1-D
+        keys, pair_chunk = np.unique((pair_cx << 32) | (pair_cy & 0xFFFFFFFF), return_inverse=True)
+        keys_cy = ((keys & 0xFFFFFFFF) ^ 0x80000000) - 0x80000000
+        arrays = [self.chunk_rect_array(key) for key in zip((keys >> 32).tolist(), keys_cy.tolist())]
+        counts = np.array([len(array) for array in arrays], dtype=np.int64)
+        starts = np.cumsum(counts) - counts
+        rects = np.concatenate(arrays)
+
+        # Expand each (area, chunk) pair into (area, rect) candidates and keep the overlapping ones
+        pair_counts = counts[pair_chunk]
+        total = pair_counts.sum()
+        first = np.cumsum(pair_counts) - pair_counts
+        rect_index = np.repeat(starts[pair_chunk] - first, pair_counts) + np.arange(total)
+        areas = np.repeat(pair_area, pair_counts)
+        rects = rects[rect_index]
+        overlap = (
+            (rects[:, 0] < right[areas])
+            & (rects[:, 2] > left[areas])
+            & (rects[:, 1] < bottom[areas])
+            & (rects[:, 3] > top[areas])
+        )
+        return rects[overlap], areas[overlap]
+
+    def chunk_rect_array(self, key):
+        """
+        Get the merged solid rects of a chunk as an array, see chunk_rects.
+        Args:
+            key (tuple): Chunk coordinates (cx, cy).
+        Returns:
+            numpy.ndarray: (n, 4) int64 (left, top, right, bottom) rects, in pixels.
+        """
+        array = self.rect_arrays.get(key)
+        if array is None:
+            array = self.rect_arrays[key] = np.array(self.chunk_rects(key), dtype=np.int64).reshape(-1, 4)
+        return array
+
+    def rebuild(self, grid):
+        """
+        Rebuild the whole bitmap from the tile store.
+        Args:
+            grid (TileStore): The tile store.
+        """
+        self.chunks = {}
+        self.rects = {}
+        self.rect_arrays = {}
+        for cx, cy in grid.chunks:
+            self.update_chunk(grid, cx, cy)
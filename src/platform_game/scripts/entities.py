@@ -1,13 +1,14 @@
 import pygame
 import math
-import random
-from scripts.particle import Particle
+from scripts.physics import COLLISION_SIDES, UP, DOWN, LEFT, RIGHT
 
 
 class PhysicsEntity:
     def __init__(self, game, ent_type, pos, size):
         """
         Initialize a physics-based entity.
+        Its physics state lives in a row of the game's PhysicsWorld (game.physics), which steps
+        every entity at once; pos, prev_pos, velocity and collisions read and write that row.
         Args:
             game (Game): Reference to the game object.
             ent_type (str): Type of the entity.
@@ -16,10 +17,10 @@ class PhysicsEntity:
         """
         self.game = game
         self.type = ent_type
-        self.pos = list(pos)  # Shallow copy list to ensure each entity has its own pos
         self.size = size
-        self.velocity = [0, 0]  # Initial velocity (x, y)
-        self.collisions = {"up": False, "down": False, "left": False, "right": False}
+        self.world = game.physics
+        self.slot = self.world.add(self, pos, size)  # Row of the entity's state in the world's arrays
+        self.index = None  # SpatialGrid the entity is kept in by its EntityManager, if any
         self.last_movement = [0, 0]
         # Animation attributes
         self.action = None
@@ -36,21 +37,102 @@ class PhysicsEntity:
         """
         return pygame.Rect(self.pos[0], self.pos[1], self.size[0], self.size[1])
 
+    @property
+    def pos(self):
+        """numpy.ndarray: The entity's position (x, y), a view of its row in the physics world."""
+        return self.world.pos[self.slot]
+
+    @pos.setter
+    def pos(self, value):
+        self.world.pos[self.slot] = value
+        if self.index is not None:  # Moves within a physics step are re-indexed by the EntityManager
+            self.index.move(self, self.rect())
+
+    @property
+    def prev_pos(self):
+        """numpy.ndarray: Position before the last update, for render interpolation."""
+        return self.world.prev_pos[self.slot]
+
+    @prev_pos.setter
+    def prev_pos(self, value):
+        self.world.prev_pos[self.slot] = value
+
+    @property
+    def velocity(self):
+        """numpy.ndarray: The entity's velocity (x, y)."""
+        return self.world.velocity[self.slot]
+
+    @velocity.setter
+    def velocity(self, value):
+        self.world.velocity[self.slot] = value
+
+    @property
+    def collisions(self):
+        """dict: Side ("up", "down", "left", "right") -> whether it was hit during the last update."""
+        return dict(zip(COLLISION_SIDES, self.world.collisions[self.slot].tolist()))
+
     def reset_collisions(self):
         """
         Reset the collision states for the entity.
         """
-        self.collisions = {"up": False, "down": False, "left": False, "right": False}
+        self.world.collisions[self.slot] = False
+
+    def remove(self):
+        """Take the entity out of the physics world."""
+        self.world.remove(self)
 
-    def calc_displacement(self, movement):
+    def move_and_collide(self, tilemap, axis, d):
         """
-        Calculate the displacement (per frame) of the entity based on movement and velocity.
+        Move the entity along one axis and resolve collisions with the solid tiles.
+        Collisions are tested against the tilemap's merged solid rects overlapping the whole
+        distance travelled, so a fast mover stops at the first wall in its path even if it
+        moves further than a tile in one update. Coordinates are truncated to ints like
+        pygame.Rect does, so results match resolving against tile Rects with colliderect.
         Args:
-            movement (tuple): The movement input (x, y).
+            tilemap (Tilemap): The tilemap for collision detection.
+            axis (int): 0 to move along X, 1 along Y.
+            d (float): The displacement along the axis.
         Returns:
-            tuple: The calculated displacement (dx, dy).
-        """
-        return (movement[0] + self.velocity[0], movement[1] + self.velocity[1])
+            bool: True if the entity hit a solid rect.
+        """
+        pos = self.pos
+        start = int(pos[axis])
+        pos[axis] += d
+        end = int(pos[axis])
+        size = self.size[axis]
+        # Extent on the other axis, which this move doesn't change
+        other = 1 - axis
+        lo = int(pos[other])
+        hi = lo + self.size[other]
+
+        near = min(start, end)
+        far = max(start, end) + size
+        if axis == 0:
+            rects = tilemap.solidity.rects_in_area(near, lo, far, hi)
+        else:
+            rects = tilemap.solidity.rects_in_area(lo, near, hi, far)
+        tilemap.rects_tested += len(rects)
+
+        hit = False
+        resolved = end
+        for rect in rects:
+            rect_near = rect[axis]
+            rect_far = rect[axis + 2]
+            if d > 0:
+                # Overlapping the destination, or ahead of the start and passed through
+                if rect_far > end or rect_near >= start + size:
+                    resolved = min(resolved, rect_near - size)
+                    hit = True
+            elif d < 0:
+                if rect_near < end + size or rect_far <= start:
+                    resolved = max(resolved, rect_far)
+                    hit = True
+            elif rect_far > end:
+                hit = True
+        if hit:
+            # Resolve char position
+            pos[axis] = resolved
+        return hit
 
     def update_pos_x(self, tilemap, dx):
         """
@@ -59,19 +141,11 @@ class PhysicsEntity:
             tilemap (Tilemap): The tilemap for collision detection.
             dx (float): The displacement in the X direction.
         """
-        self.pos[0] += dx
-        # Check for collisions
-        entity_rect = self.rect()
-        for rect in tilemap.physics_create_rects(self.pos):
-            if entity_rect.colliderect(rect):
-                if dx > 0:  # Moving Right
-                    entity_rect.right = rect.left
-                    self.collisions["right"] = True
-                if dx < 0:  # Moving Left
-                    entity_rect.left = rect.right
-                    self.collisions["left"] = True
-                # Resolve char position
-                self.pos[0] = entity_rect.x
+        if self.move_and_collide(tilemap, 0, dx):
+            if dx > 0:  # Moving Right
+                self.world.collisions[self.slot, RIGHT] = True
+            if dx < 0:  # Moving Left
+                self.world.collisions[self.slot, LEFT] = True
 
     def update_pos_y(self, tilemap, dy):
         """
@@ -80,19 +154,11 @@ class PhysicsEntity:
             tilemap (Tilemap): The tilemap for collision detection.
             dy (float): The displacement in the Y direction.
         """
-        self.pos[1] += dy
-        # Check for collisions
-        entity_rect = self.rect()
-        for rect in tilemap.physics_create_rects(self.pos):
-            if entity_rect.colliderect(rect):
-                if dy > 0:  # Falling
-                    entity_rect.bottom = rect.top
-                    self.collisions["down"] = True
-                if dy < 0:  # Jumping
-                    entity_rect.top = rect.bottom
-                    self.collisions["up"] = True
-                # Resolve char position
-                self.pos[1] = entity_rect.y
+        if self.move_and_collide(tilemap, 1, dy):
+            if dy > 0:  # Falling
+                self.world.collisions[self.slot, DOWN] = True
+            if dy < 0:  # Jumping
+                self.world.collisions[self.slot, UP] = True
 
     def update_direction(self, movement_x):
         """
@@ -105,90 +171,82 @@ class PhysicsEntity:
         if movement_x < 0:
             self.flip = True
 
-    def update_vy(self):
+    def update_velocity(self):
         """
-        Update the y-axis velocity.
+        Adjust the velocity during a physics step, after gravity and before friction.
+        Does nothing by default; the world applies gravity and friction to every entity.
         """
-        # Apply gravity, ensuring terminal velocity (5) is not exceeded
-        self.velocity[1] = min(self.velocity[1] + 0.1, 5)
-
-        # Reset velocity if a surface is met
-        if self.collisions["down"] or self.collisions["up"]:
-            self.velocity[1] = 0
 
-    def handle_dashing(self):
-        """Handle the dashing logic, updating dashing state, velocity, and particles"""
-        if abs(self.dashing) in {60, 50}:
-            for i in range(20):
-                angle = random.random() * (math.pi * 2)  # Random angle in radians from a circle
-                speed = random.random() * 0.5 + 0.5
-                pvelocity = [math.cos(angle) * speed, math.sin(angle) * speed]
-                self.game.particles.append(
-                    Particle(self.game, "particle", self.rect().center, velocity=pvelocity, frame=random.randint(0, 7))
-                )
-        if self.dashing > 0:
-            self.dashing = max(0, self.dashing - 1)
-        elif self.dashing < 0:
-            self.dashing = min(self.dashing + 1, 0)
-        # Apply high speed during the dash
-        if abs(self.dashing) > 50:
-            self.velocity[0] = abs(self.dashing) / self.dashing * 8
-            # Apply a sudden deceleration after the initial burst
-            if abs(self.dashing) == 51:
-                self.velocity[0] *= 0.1
-            pvelocity = [abs(self.dashing) / self.dashing * random.random() * 3, 0]
-            self.game.particles.append(
-                Particle(self.game, "particle", self.rect().center, velocity=pvelocity, frame=random.randint(0, 7))
-            )
-
-    def update_vx(self):
-        """ "Update the x-axis velocity, handling dashing and regular movement."""
-        # Dashing logic
-        self.handle_dashing()
+    def begin_update(self, movement=(0, 0)):
+        """
+        Prepare the entity for the next physics step.
+        Args:
+            movement (tuple): The movement input (x, y).
+        """
+        self.last_movement = movement  # Updates to movement input not movement executed
+        self.world.movement[self.slot] = movement
 
-        # Apply gradual deceleration to the velocity
-        if self.velocity[0] > 0:
-            self.velocity[0] = max(0, self.velocity[0] - 0.1)
-        else:
-            self.velocity[0] = min(self.velocity[0] + 0.1, 0)
+    def end_update(self, movement=(0, 0)):
+        """
+        Update the entity after a physics step moved it.
+        Args:
+            movement (tuple): The movement input (x, y).
+        """
+        self.update_direction(movement[0])
+        self.animation.update()
 
     def update(self, tilemap, movement=(0, 0)):
         """
         Update the entity's position based on movement and velocity.
+        Steps this entity alone; see PhysicsWorld.step for stepping every entity at once.
         Args:
             tilemap (Tilemap): The tilemap for collision detection.
             movement (tuple): The movement input (x, y).
         """
-        self.last_movement = movement  # Updates to movement input not movement executed
-        self.reset_collisions()
-        d_xy = self.calc_displacement(movement)
-        self.update_pos_x(tilemap, d_xy[0])
-        self.update_pos_y(tilemap, d_xy[1])
-        self.update_direction(movement[0])
-        self.update_vy()
-        self.update_vx()
-        self.animation.update()
+        self.begin_update(movement)
+        self.world.step(tilemap, [self])
+        self.end_update(movement)
 
-    def render(self, surface, offset=(0, 0)):
+    def collect(self, items, offset=(0, 0), outline_items=None, alpha=1.0):
         """
-        Draw the entity on the given surface at its current position.
+        Queue the entity for a batched blit at its current position.
         Args:
-            surface (pygame.Surface): The surface to draw the entity on.
+            items (list): The list of (surface, position) pairs to append the frame to, e.g. a RenderQueue layer.
             offset (tuple): Coordinates to offset for the camera position.
+            outline_items (list): If given, the entity's baked outline is appended to it.
+            alpha (float): Interpolation factor between the previous (0) and current (1) position.
+        Returns:
+            int: Number of blits queued.
         """
-        # Calculate the render position
-        render_pos_x = self.pos[0] - offset[0] + self.anim_offset[0]
-        render_pos_y = self.pos[1] - offset[1] + self.anim_offset[1]
-        render_pos = (render_pos_x, render_pos_y)
-
-        # Get the current frame of the animation
-        current_frame = self.animation.img()
+        # Calculate the render position, interpolated between the last two updates
+        pos_x = self.prev_pos[0] + (self.pos[0] - self.prev_pos[0]) * alpha
+        pos_y = self.prev_pos[1] + (self.pos[1] - self.prev_pos[1]) * alpha
+        render_pos_x = pos_x - offset[0] + self.anim_offset[0]
+        render_pos_y = pos_y - offset[1] + self.anim_offset[1]
 
-        # Flip the image if necessary
-        flipped_frame = pygame.transform.flip(current_frame, self.flip, False)
+        # Get the current frame of the animation, pre-flipped if necessary
+        items.append((self.animation.img(self.flip), (render_pos_x, render_pos_y)))
+        if outline_items is None:
+            return 1
+        # Blits truncate float positions, so truncate before shifting to stay aligned with the frame
+        outline_items.append((self.animation.outline(self.flip), (int(render_pos_x) - 1, int(render_pos_y) - 1)))
+        return 2
 
-        # Blit the image onto the surface
-        surface.blit(flipped_frame, render_pos)
+    def render(self, surface, offset=(0, 0), outline_surf=None, alpha=1.0):
+        """
+        Draw the entity on the given surface at its current position.
+        Args:
+            surface (pygame.Surface): The surface to draw the entity on.
+            offset (tuple): Coordinates to offset for the camera position.
+            outline_surf (pygame.Surface): If given, the entity's baked outline is drawn onto it.
+            alpha (float): Interpolation factor between the previous (0) and current (1) position.
+        """
+        items = []
+        outline_items = [] if outline_surf is not None else None
+        self.collect(items, offset=offset, outline_items=outline_items, alpha=alpha)
+        surface.fblits(items)
+        if outline_items:
+            outline_surf.fblits(outline_items)
 
     def set_action(self, action):
         """
@@ -298,21 +356,60 @@ class Player(PhysicsEntity):
         self.air_time = 0 
         self.set_action("idle") 
 
-    def update(self, tilemap, movement=(0, 0)):
+    def begin_update(self, movement=(0, 0)):
         """
-        Update the player's state, including position, collisions, airtime, and actions.
+        Prepare the player for the next physics step, respawning it if it has been falling for too long.
         Args:
-            tilemap (Tilemap): The tilemap for collision detection.
             movement (tuple): The movement input (x, y).
         """
         # Check if respawn is needed 
         if self.air_time > 180:
             self.respawn()
+        super().begin_update(movement)
 
-        super().update(tilemap, movement=movement)
+    def end_update(self, movement=(0, 0)):
+        """
+        Update the player's airtime and action after a physics step.
+        Args:
+            movement (tuple): The movement input (x, y).
+        """
+        super().end_update(movement)
         self.update_aerial()
         self.update_action(movement)
 
-    def render(self, surf, offset=(0, 0)):
-        if abs(self.dashing) <= 50:
-            super().render(surf, offset=offset)
+    def update_velocity(self):
+        """Apply dashing to the velocity, before friction."""
+        self.handle_dashing()
+
+    def handle_dashing(self):
+        """Handle the dashing logic, updating dashing state, velocity, and particles"""
+        rng = self.game.effects_rng  # Cosmetic only, see Game.effects_rng
+        rate = self.game.quality.active["dash_particles"]  # Lower quality tiers thin out the bursts and trail
+        if abs(self.dashing) in {60, 50} and rate:
+            pvelocities = []
+            pframes = []
+            for i in range(int(20 * rate)):
+                angle = rng.random() * (math.pi * 2)  # Random angle in radians from a circle
+                speed = rng.random() * 0.5 + 0.5
+                pvelocities.append((math.cos(angle) * speed, math.sin(angle) * speed))
+                pframes.append(rng.randint(0, 7))
+            self.game.particles.spawn_many("particle", self.rect().center, pvelocities, pframes)
+        if self.dashing > 0:
+            self.dashing = max(0, self.dashing - 1)
+        elif self.dashing < 0:
+            self.dashing = min(self.dashing + 1, 0)
+        # Apply high speed during the dash
+        if abs(self.dashing) > 50:
+            self.velocity[0] = abs(self.dashing) / self.dashing * 8
+            # Apply a sudden deceleration after the initial burst
+            if abs(self.dashing) == 51:
+                self.velocity[0] *= 0.1
+            if rate >= 1 or rng.random() < rate:
+                pvelocity = (abs(self.dashing) / self.dashing * rng.random() * 3, 0)
+                self.game.particles.spawn("particle", self.rect().center, velocity=pvelocity, frame=rng.randint(0, 7))
+
+    def collect(self, items, offset=(0, 0), outline_items=None, alpha=1.0):
+        # Hidden during the fast part of a dash
+        if abs(self.dashing) > 50:
+            return 0
+        return super().collect(items, offset=offset, outline_items=outline_items, alpha=alpha)
@@ -0,0 +1,123 @@
+import numpy as np
+import pygame
+from scripts.spatial import SpatialGrid
+
+
+class EntityManager:
+    def __init__(self, game, cell_size=64):
+        """
+        Initialize the manager of the game's physics entities.
+
+        It steps them together through the game's PhysicsWorld and keeps them in a spatial hash
+        (a SpatialGrid keyed by their rects), so "what is near here" queries only look at the
+        entities in the cells around the query instead of at every entity.
+        Args:
+            game (Game): Reference to the game object.
+            cell_size (int): Width and height of a spatial hash cell in world pixels.
+        """
+        self.game = game
+        self.world = game.physics
+        self.entities = []  # Managed entities, in the order they were added
+        self.index = SpatialGrid(cell_size=cell_size)  # Entities indexed by their rect
+
+    def __len__(self):
+        return len(self.entities)
+
+    def __iter__(self):
+        return iter(self.entities)
+
+    def add(self, entity):
+        """
+        Manage an entity.
+        Args:
+            entity (PhysicsEntity): The entity, already registered in the game's PhysicsWorld.
+        """
+        self.entities.append(entity)
+        self.index.insert(entity, entity.rect())
+        entity.index = self.index
+
+    def remove(self, entity):
+        """
+        Stop managing an entity and take it out of the physics world.
+        Args:
+            entity (PhysicsEntity): The entity to remove.
+        """
+        self.entities.remove(entity)
+        self.index.remove(entity)
+        entity.index = None
+        entity.remove()
+
+    def update(self, tilemap):
+        """
+        Step every entity through the physics world, then finish their updates and re-index the ones that moved.
+        Entities take their movement input from their last begin_update.
+        Args:
+            tilemap (Tilemap): The tilemap for collision detection.
+        """
+        world = self.world
+        world.step(tilemap, self.entities)
+        slots = np.array([entity.slot for entity in self.entities], dtype=np.int64)
+        moved = np.flatnonzero((world.pos[slots] != world.prev_pos[slots]).any(axis=1))
+        # New rects of the entities that moved, truncated like PhysicsEntity.rect
+        moved_slots = slots[moved]
+        rects = np.concatenate((np.trunc(world.pos[moved_slots]).astype(np.int64), world.size[moved_slots]), axis=1)
+        index = self.index
+        entities = self.entities
+        for i, rect in zip(moved.tolist(), rects.tolist()):
+            index.move(entities[i], rect)
+        for entity in self.entities:
+            entity.end_update(entity.last_movement)
+
+    def query_rect(self, rect):
+        """
+        Find the entities overlapping a rect.
+        Args:
+            rect (pygame.Rect): The area, in world pixels.
+        Returns:
+            list: The entities, in the order they were added.
+        """
+        return self.index.query_rect(rect)
+
+    def query_point(self, point):
+        """
+        Find the entities under a point.
+        Args:
+            point (tuple): The (x, y) position, in world pixels.
+        Returns:
+            list: The entities, in the order they were added.
+        """
+        return self.index.query_point(point)
+
+    def query_radius(self, center, radius):
+        """
+        Find the entities within a distance of a point.
+        Args:
+            center (tuple): The (x, y) position, in world pixels.
+            radius (float): The distance, in pixels, to the closest point of an entity's rect.
+        Returns:
+            list: The entities, in the order they were added.
+        """
+        return self.index.query_radius(center, radius)
+
+    def query_view(self, cam_pos, size, margin=0):
+        """
+        Find the entities visible from the camera.
+        Args:
+            cam_pos (tuple): Top-left corner of the view, in world pixels.
+            size (tuple): Size of the view (w, h) in pixels.
+            margin (int): Extra pixels around the view, e.g. for sprites drawn past their entity's rect.
+        Returns:
+            list: The entities, in the order they were added.
+        """
+        view = pygame.Rect(int(cam_pos[0]) - margin, int(cam_pos[1]) - margin, size[0] + margin * 2, size[1] + margin * 2)
+        return self.index.query_rect(view)
+
+    def overlapping(self, entity):
+        """
+        Find the other entities overlapping an entity.
+        Args:
+            entity (PhysicsEntity): A managed entity.
+        Returns:
+            list: The overlapping entities, in the order they were added.
+        """
+        return [other for other in self.index.query_rect(entity.rect()) if other is not entity]
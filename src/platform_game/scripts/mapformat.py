@@ -0,0 +1,324 @@
+import json
+import mmap
+import struct
+from array import array
+import numpy as np
+from scripts.tilestore import CHUNK_SIZE, CHUNK_AREA, EMPTY
+
+# Binary map files start with this magic, followed by the format version
+MAP_MAGIC = b"PGMAP\0"
+MAP_FORMAT_VERSION = 1
+BINARY_MAP_EXT = ".pgmap"
+
+# All values are little-endian.
+# Header: magic, version, tile size, chunk size, string count, tile id count, chunk count, off-grid tile count
+HEADER = struct.Struct("<6sHHHIIII")
+# String table entry: byte length, followed by that many UTF-8 bytes
+STRING_LEN = struct.Struct("<H")
+# Tile id table entry, for file ids 1..count: string index of the type, variant
+TILE_ID = struct.Struct("<HH")
+# Chunk record: cx, cy, encoding, payload length in bytes, followed by the payload
+CHUNK = struct.Struct("<iiBI")
+# Off-grid tile record: string index of the type, variant, whether pos is integral, x, y, draw order
+OFFGRID = struct.Struct("<HHBddI")
+
+# Chunk payload encodings
+ENCODING_DENSE = 0  # CHUNK_AREA uint16 tile ids, row-major
+ENCODING_RLE = 1  # (run length, tile id) uint16 pairs, row-major
+
+
+def is_binary_map(path):
+    """
+    Check whether a file is a binary map, by its magic.
+    Args:
+        path (str): The map file.
+    Returns:
+        bool: True for a binary map, False otherwise (e.g. a json map).
+    """
+    file = open(path, "rb")
+    magic = file.read(len(MAP_MAGIC))
+    file.close()
+    return magic == MAP_MAGIC
+
+
+def encode_chunk(cells):
+    """
+    Encode a chunk's tile ids, run-length encoded if that is smaller.
+    Args:
+        cells (numpy.ndarray): CHUNK_AREA uint16 file tile ids, row-major.
+    Returns:
+        tuple: (encoding, payload bytes).
+    """
+    starts = np.flatnonzero(np.diff(cells.astype(np.int32), prepend=-1))
+    if len(starts) * TILE_ID.size < cells.nbytes:
+        runs = np.empty((len(starts), 2), dtype="<u2")
+        runs[:, 0] = np.diff(starts, append=len(cells))
+        runs[:, 1] = cells[starts]
+        return ENCODING_RLE, runs.tobytes()
+    return ENCODING_DENSE, cells.astype("<u2").tobytes()
+
+
+def decode_chunk(buffer, offset, encoding, length):
+    """
+    Decode a chunk payload.
+    Args:
+        buffer (buffer): The map file contents.
+        offset (int): Offset of the payload.
+        encoding (int): ENCODING_DENSE or ENCODING_RLE.
+        length (int): Payload length in bytes.
+    Returns:
+        numpy.ndarray: CHUNK_AREA file tile ids, row-major.
+    Raises:
+        ValueError: If the payload is malformed.
+    """
+    if encoding == ENCODING_DENSE:
+        if length != CHUNK_AREA * 2:
+            raise ValueError("Dense chunk payload has the wrong size.")
+        return np.frombuffer(buffer, dtype="<u2", count=CHUNK_AREA, offset=offset).copy()
+    if encoding == ENCODING_RLE:
+        runs = np.frombuffer(buffer, dtype="<u2", count=length // 2, offset=offset).reshape(-1, 2)
+        cells = np.repeat(runs[:, 1], runs[:, 0])
+        if len(cells) != CHUNK_AREA:
+            raise ValueError("Run-length encoded chunk does not cover the chunk.")
+        return cells
+    raise ValueError(f"Unknown chunk encoding {encoding}.")
+
+
+def write_binary_map(path, grid, tile_size, offgrid, chunk_keys=None, offgrid_order=None):
+    """
+    Write a map in the binary format.
+    Args:
+        path (str): Destination file.
+        grid (TileStore): The grid tiles.
+        tile_size (int): Size of a tile in pixels.
+        offgrid (list): Off-grid tile dicts ("type", "variant", "pos").
+        chunk_keys (iterable): (cx, cy) of the chunks to write, e.g. one region of a world. Defaults to all of them.
+        offgrid_order (list): Draw order of each off-grid tile, for tiles taken out of a larger map.
+            Defaults to their position in offgrid.
+    """
+    chunks = grid.chunks
+    if chunk_keys is not None:
+        chunks = {key: chunks[key] for key in chunk_keys if key in chunks}
+    strings = {}  # Tile type -> string index
+
+    def string_index(name):
+        if name not in strings:
+            strings[name] = len(strings)
+        return strings[name]
+
+    # Number the tile ids actually used, so the file doesn't depend on the interning order
+    used = set()
+    for chunk in chunks.values():
+        used.update(chunk)
+    used.discard(EMPTY)
+    file_ids = np.zeros(len(grid.tile_types), dtype=np.uint16)  # Store id -> file id
+    tile_id_table = []
+    for file_id, tile_id in enumerate(sorted(used, key=grid.lookup), start=1):
+        file_ids[tile_id] = file_id
+        tile_type, variant = grid.lookup(tile_id)
+        tile_id_table.append(TILE_ID.pack(string_index(tile_type), variant))
+
+    chunk_records = []
+    for (cx, cy), chunk in sorted(chunks.items()):
+        encoding, payload = encode_chunk(file_ids[np.frombuffer(chunk, dtype=np.uint16)])
+        chunk_records.append(CHUNK.pack(cx, cy, encoding, len(payload)) + payload)
+
+    if offgrid_order is None:
+        offgrid_order = range(len(offgrid))
+    offgrid_records = []
+    for tile, order in zip(offgrid, offgrid_order):
+        x, y = tile["pos"]
+        integral = isinstance(x, int) and isinstance(y, int)
+        offgrid_records.append(OFFGRID.pack(string_index(tile["type"]), tile["variant"], integral, x, y, order))
+
+    string_table = []
+    for name in strings:
+        encoded = name.encode("utf-8")
+        string_table.append(STRING_LEN.pack(len(encoded)) + encoded)
+
+    file = open(path, "wb")
+    file.write(
+        HEADER.pack(
+            MAP_MAGIC,
+            MAP_FORMAT_VERSION,
+            tile_size,
+            CHUNK_SIZE,
+            len(strings),
+            len(tile_id_table),
+            len(chunk_records),
+            len(offgrid_records),
+        )
+    )
+    for part in (string_table, tile_id_table, chunk_records, offgrid_records):
+        file.write(b"".join(part))
+    file.close()
+
+
+def decode_binary_map(path):
+    """
+    Decode a binary map without touching any TileStore, so it can run on a loader thread.
+    The file is memory-mapped and chunks are decoded straight from the mapping.
+    Args:
+        path (str): The map file.
+    Returns:
+        tuple: (tile_size, tile_types, chunks, offgrid, offgrid_order), where tile_types lists the
+            (type, variant) pair of each file tile id (index 0 is None, for EMPTY), chunks is a list of
+            (cx, cy, numpy.ndarray of CHUNK_AREA file tile ids) and offgrid_order holds the draw order
+            of each off-grid tile.
+    Raises:
+        ValueError: If the file isn't a binary map, was written by an incompatible version or is corrupt.
+    """
+    file = open(path, "rb")
+    try:
+        buffer = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+    finally:
+        file.close()
+    try:
+        magic, version, tile_size, chunk_size, n_strings, n_tile_ids, n_chunks, n_offgrid = HEADER.unpack_from(buffer)
+        if magic != MAP_MAGIC:
+            raise ValueError(f"'{path}' is not a binary map.")
+        if version != MAP_FORMAT_VERSION:
+            raise ValueError(f"Unsupported map format version {version} in '{path}'.")
+        if chunk_size != CHUNK_SIZE:
+            raise ValueError(f"'{path}' uses {chunk_size}-tile chunks, expected {CHUNK_SIZE}.")
+        offset = HEADER.size
+
+        strings = []
+        for _ in range(n_strings):
+            (length,) = STRING_LEN.unpack_from(buffer, offset)
+            offset += STRING_LEN.size
+            strings.append(buffer[offset : offset + length].decode("utf-8"))
+            offset += length
+
+        tile_types = [None]
+        for _ in range(n_tile_ids):
+            string, variant = TILE_ID.unpack_from(buffer, offset)
+            offset += TILE_ID.size
+            if string >= n_strings:
+                raise ValueError(f"'{path}' is corrupt: a tile id names string {string}, but there are only {n_strings}.")
+            tile_types.append((strings[string], variant))
+
+        chunks = []
+        for _ in range(n_chunks):
+            cx, cy, encoding, length = CHUNK.unpack_from(buffer, offset)
+            offset += CHUNK.size
+            cells = decode_chunk(buffer, offset, encoding, length)
+            if int(cells.max()) > n_tile_ids:
+                raise ValueError(f"'{path}' is corrupt: a chunk uses tile id {int(cells.max())}, but there are only {n_tile_ids}.")
+            chunks.append((cx, cy, cells))
+            offset += length
+
+        offgrid = []
+        offgrid_order = []
+        for _ in range(n_offgrid):
+            string, variant, integral, x, y, order = OFFGRID.unpack_from(buffer, offset)
+            offset += OFFGRID.size
+            if string >= n_strings:
+                raise ValueError(f"'{path}' is corrupt: an off-grid tile names string {string}, but there are only {n_strings}.")
+            pos = [int(x), int(y)] if integral else [x, y]
+            offgrid.append({"type": strings[string], "variant": variant, "pos": pos})
+            offgrid_order.append(order)
+    except struct.error:
+        raise ValueError(f"'{path}' is truncated.")
+    finally:
+        buffer.close()
+    return tile_size, tile_types, chunks, offgrid, offgrid_order
+
+
+def store_chunks(grid, tile_types, chunks):
+    """
+    Put decoded chunks into a TileStore, translating file tile ids into the store's ids.
+    Args:
+        grid (TileStore): The store. Chunks already at the same coordinates are replaced.
+        tile_types (list): (type, variant) of each file tile id, as returned by decode_binary_map.
+        chunks (list): (cx, cy, file tile ids) entries, as returned by decode_binary_map.
+    """
+    store_ids = np.zeros(len(tile_types), dtype=np.uint16)
+    for file_id in range(1, len(tile_types)):
+        store_ids[file_id] = grid.intern(*tile_types[file_id])
+    for cx, cy, cells in chunks:
+        grid.set_chunk(cx, cy, array("H", store_ids[cells].tobytes()))
+
+
+def read_binary_map(path, grid):
+    """
+    Read a binary map.
+    Args:
+        path (str): The map file.
+        grid (TileStore): Store to load the grid tiles into. It is cleared first.
+    Returns:
+        tuple: (tile_size, offgrid tile list).
+    Raises:
+        ValueError: If the file isn't a binary map or was written by an incompatible version.
+    """
+    tile_size, tile_types, chunks, offgrid, offgrid_order = decode_binary_map(path)
+    grid.clear()
+    store_chunks(grid, tile_types, chunks)
+    return tile_size, offgrid
+
+
+def write_json_map(path, grid, tile_size, offgrid):
+    """
+    Write a map in the json format.
+    Args:
+        path (str): Destination file.
+        grid (TileStore): The grid tiles.
+        tile_size (int): Size of a tile in pixels.
+        offgrid (list): Off-grid tile dicts.
+    """
+    tilemap = {}
+    for x, y, tile_id in grid.items():
+        tile_type, variant = grid.lookup(tile_id)
+        tilemap[f"{x};{y}"] = {"type": tile_type, "variant": variant, "pos": [x, y]}
+
+    file = open(path, "w")
+    json.dump({"tilemap": tilemap, "tile_size": tile_size, "offgrid": offgrid}, file)
+    file.close()
+
+
+def read_json_map(path, grid):
+    """
+    Read a json map.
+    Args:
+        path (str): The map file.
+        grid (TileStore): Store to load the grid tiles into. It is cleared first.
+    Returns:
+        tuple: (tile_size, offgrid tile list).
+    """
+    file = open(path, "r")
+    map_data = json.load(file)
+    file.close()
+
+    grid.clear()
+    for tile in map_data["tilemap"].values():
+        grid.set(tile["pos"][0], tile["pos"][1], grid.intern(tile["type"], tile["variant"]))
+    return map_data["tile_size"], map_data["offgrid"]
+
+
+def read_map(path, grid):
+    """
+    Read a map in either format, detected from the file's contents.
+    Args:
+        path (str): The map file.
+        grid (TileStore): Store to load the grid tiles into. It is cleared first.
+    Returns:
+        tuple: (tile_size, offgrid tile list).
+    """
+    if is_binary_map(path):
+        return read_binary_map(path, grid)
+    return read_json_map(path, grid)
+
+
+def write_map(path, grid, tile_size, offgrid):
+    """
+    Write a map, in the binary format if the path ends in BINARY_MAP_EXT and as json otherwise.
+    Args:
+        path (str): Destination file.
+        grid (TileStore): The grid tiles.
+        tile_size (int): Size of a tile in pixels.
+        offgrid (list): Off-grid tile dicts.
+    """
+    if path.endswith(BINARY_MAP_EXT):
+        write_binary_map(path, grid, tile_size, offgrid)
+    else:
+        write_json_map(path, grid, tile_size, offgrid)
@@ -0,0 +1,123 @@
+import pygame
+
+
+class ParallaxLayer:
+    def __init__(self, surface, depth, speed=0.0):
+        """
+        Initialize a layer that repeats one pre-rendered tile across the view and scrolls it with the camera.
+        Args:
+            surface (pygame.Surface): The tile, seamless when repeated in both directions. Usually
+                covers the view, so drawing the layer takes at most 4 blits.
+            depth (float): How far the layer moves with the camera: 0 stays put, 1 moves with the world.
+            speed (float): Horizontal drift of the layer, in pixels per step.
+        """
+        self.surface = surface
+        self.depth = depth
+        self.speed = speed
+        self.scroll = 0.0  # Horizontal drift so far
+
+    def update(self):
+        """Drift the layer by one step."""
+        self.scroll += self.speed
+
+    def collect(self, items, size, offset=(0, 0)):
+        """
+        Queue the copies of the tile covering a surface for a batched blit.
+        Args:
+            items (list): The list of (surface, position) pairs to append to, e.g. a RenderQueue layer.
+            size (tuple): Size (w, h) of the surface the layer is drawn on.
+            offset (tuple): The camera offset
+        Returns:
+            int: Number of blits queued.
+        """
+        tile_w, tile_h = self.surface.get_size()
+        # Top-left corner of the first tile, at or left of / above the surface's origin
+        start_x = -int((offset[0] * self.depth - self.scroll) % tile_w)
+        start_y = -int((offset[1] * self.depth) % tile_h)
+        blits = 0
+        for y in range(start_y, size[1], tile_h):
+            for x in range(start_x, size[0], tile_w):
+                items.append((self.surface, (x, y)))
+                blits += 1
+        return blits
+
+
+class Parallax:
+    def __init__(self, layers):
+        """
+        Initialize a stack of parallax layers, drawn in order (furthest first).
+        Args:
+            layers (list): The ParallaxLayer objects.
+        """
+        self.layers = layers
+
+    def update(self):
+        """Drift every layer by one step."""
+        for layer in self.layers:
+            layer.update()
+
+    def collect(self, items, size, offset=(0, 0)):
+        """
+        Queue every layer for a batched blit, furthest first.
+        Args:
+            items (list): The list of (surface, position) pairs to append to, e.g. a RenderQueue layer.
+            size (tuple): Size (w, h) of the surface the layers are drawn on.
+            offset (tuple): The camera offset
+        Returns:
+            int: Number of blits queued.
+        """
+        blits = 0
+        for layer in self.layers:
+            blits += layer.collect(items, size, offset=offset)
+        return blits
+
+    def render(self, surface, offset=(0, 0)):
+        """
+        Draw every layer on a surface in one batched blit.
+        Args:
+            surface (pygame.Surface): The surface to draw on.
+            offset (tuple): The camera offset
+        Returns:
+            int: Number of blits made.
+        """
+        items = []
+        self.collect(items, surface.get_size(), offset=offset)
+        surface.fblits(items)
+        return len(items)
+
+
+def static_layer(image):
+    """
+    Make a layer that doesn't move with the camera, e.g. the sky behind everything.
+    Args:
+        image (pygame.Surface): The image, as large as the view.
+    Returns:
+        ParallaxLayer: The layer. The image is drawn opaque, without its colorkey, which is a plain copy.
+    """
+    surface = image.copy()
+    surface.set_colorkey(None)
+    return ParallaxLayer(surface, 0.0)
+
+
+def bake_layer(images, size, colorkey=(0, 0, 0)):
+    """
+    Pre-render images into one tile that repeats seamlessly in both directions.
+    Args:
+        images (list): (image, (x, y)) pairs. Positions are wrapped into the tile.
+        size (tuple): Size (w, h) of the tile.
+        colorkey (tuple): Transparent colour of the tile.
+    Returns:
+        pygame.Surface: The tile. It is run-length encoded, so blitting its mostly empty area is cheap.
+    """
+    tile_w, tile_h = size
+    surface = pygame.Surface(size).convert()
+    surface.fill(colorkey)
+    for image, pos in images:
+        x = pos[0] % tile_w
+        y = pos[1] % tile_h
+        # Images crossing the right or bottom edge are also drawn wrapped around to the other side
+        for dx in (0, -tile_w) if x + image.get_width() > tile_w else (0,):
+            for dy in (0, -tile_h) if y + image.get_height() > tile_h else (0,):
+                surface.blit(image, (x + dx, y + dy))
+    surface.set_colorkey(colorkey, pygame.RLEACCEL)
+    return surface
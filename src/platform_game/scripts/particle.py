@@ -1,50 +1,208 @@
-class Particle:
-    def __init__(self, game, p_type, pos, velocity=[0, 0], frame=0):
+import numpy as np
+
+# Sideways drift applied to leaves: pos.x += sin(frame * LEAF_SWAY_FREQ) * LEAF_SWAY_AMP
+LEAF_SWAY_FREQ = 0.035
+LEAF_SWAY_AMP = 0.3
+
+
+class ParticleSystem:
+    def __init__(self, game, p_types, capacity=1024):
         """
-        Initialize a particle object.
+        Initialize a particle system that stores every live particle in flat NumPy arrays.
 
         Args:
             game (Game): Reference to the main game object.
+            p_types (list): Particle types to support. Each one uses the "particle/<type>" animation asset.
+            capacity (int, optional): Initial number of particle slots. Grows as needed. Defaults to 1024.
+        """
+        self.game = game
+        self.type_ids = {}  # Particle type name -> type id
+        self.frames = []  # Animation frames of every type, flattened
+        half_sizes = []  # (w // 2, h // 2) of each flattened frame, to center particles
+        frame_offsets, img_durs, total_frames, loops = [], [], [], []
+        for type_id, p_type in enumerate(p_types):
+            animation = game.assets["particle/" + p_type]
+            self.type_ids[p_type] = type_id
+            frame_offsets.append(len(self.frames))
+            img_durs.append(animation.img_dur)
+            total_frames.append(animation.img_dur * len(animation.images))
+            loops.append(animation.loop)
+            for img in animation.images:
+                self.frames.append(img)
+                half_sizes.append((img.get_width() // 2, img.get_height() // 2))
+        self.half_sizes = np.array(half_sizes, dtype=np.float64)
+        self.frame_offsets = np.array(frame_offsets, dtype=np.int32)
+        self.img_durs = np.array(img_durs, dtype=np.int32)
+        self.total_frames = np.array(total_frames, dtype=np.int32)
+        self.loops = np.array(loops, dtype=bool)
+        self.leaf_id = self.type_ids.get("leaf", -1)
+
+        # Particle state, one row per particle; only the first `count` rows are live
+        self.count = 0
+        self.pos = np.zeros((capacity, 2), dtype=np.float64)
+        self.prev_pos = np.zeros((capacity, 2), dtype=np.float64)  # Position before the last update
+        self.velocity = np.zeros((capacity, 2), dtype=np.float64)
+        self.frame = np.zeros(capacity, dtype=np.int32)
+        self.type = np.zeros(capacity, dtype=np.int8)
+        self.done = np.zeros(capacity, dtype=bool)  # Animation finished
+        self.dead = np.zeros(capacity, dtype=bool)  # Finished before the last update; removed on the next one
+
+    def __len__(self):
+        return self.count
+
+    def _reserve(self, extra):
+        """Grow the state arrays so that `extra` more particles fit."""
+        needed = self.count + extra
+        capacity = len(self.frame)
+        if needed <= capacity:
+            return
+        while capacity < needed:
+            capacity *= 2
+        for name in ("pos", "prev_pos", "velocity", "frame", "type", "done", "dead"):
+            old = getattr(self, name)
+            new = np.zeros((capacity,) + old.shape[1:], dtype=old.dtype)
+            new[: self.count] = old[: self.count]
+            setattr(self, name, new)
+
+    def spawn(self, p_type, pos, velocity=(0, 0), frame=0):
+        """
+        Add a single particle.
+        Args:
             p_type (str): Type of particle (used to fetch the correct animation).
             pos (tuple): Initial position of the particle (x, y).
-            velocity (list, optional): Velocity of the particle (x, y). Defaults to [0, 0].
+            velocity (tuple, optional): Velocity of the particle (x, y). Defaults to (0, 0).
             frame (int, optional): Initial frame of the animation. Defaults to 0.
         """
-        self.game = game
-        self.type = p_type
-        self.pos = list(pos)  # Convert position tuple to a list to allow modification.
-        self.velocity = list(velocity)  # Convert velocity to a list to ensure it's mutable.
-        self.animation = self.game.assets["particle/" + p_type].copy()  # Copy so it is unique to this particle
-        self.animation.frame = frame  # Set the animation to start at the specified frame.
+        self._reserve(1)
+        i = self.count
+        self.pos[i] = pos
+        self.prev_pos[i] = pos
+        self.velocity[i] = velocity
+        self.frame[i] = frame
+        self.type[i] = self.type_ids[p_type]
+        self.done[i] = False
+        self.dead[i] = False
+        self.count += 1
+
+    def spawn_many(self, p_type, positions, velocities, frames):
+        """
+        Add a batch of particles of the same type.
+        Args:
+            p_type (str): Type of particle.
+            positions (array-like): Initial positions, shape (n, 2) or a single (x, y) shared by all.
+            velocities (array-like): Velocities, shape (n, 2).
+            frames (array-like): Initial animation frames, shape (n,).
+        """
+        velocities = np.asarray(velocities, dtype=np.float64).reshape(-1, 2)
+        n = len(velocities)
+        self._reserve(n)
+        live = slice(self.count, self.count + n)
+        self.pos[live] = positions
+        self.prev_pos[live] = positions
+        self.velocity[live] = velocities
+        self.frame[live] = frames
+        self.type[live] = self.type_ids[p_type]
+        self.done[live] = False
+        self.dead[live] = False
+        self.count += n
+
+    def _compact(self, keep):
+        """Drop every live particle whose `keep` entry is False, preserving order."""
+        n = int(np.count_nonzero(keep))
+        if n == self.count:
+            return
+        for name in ("pos", "prev_pos", "velocity", "frame", "type", "done", "dead"):
+            arr = getattr(self, name)
+            arr[:n] = arr[: self.count][keep]
+        self.count = n
 
     def update(self):
         """
-        Update the particle's state.
-        Returns:
-            bool: True if the particle's animation is complete and it should be removed, False otherwise.
+        Advance every particle by one frame: position, animation and leaf sway.
+        Particles whose animation had already finished are drawn one last time and
+        removed on the following update.
         """
-        kill = False
-        if self.animation.done:
-            kill = True  # Mark the particle for removal if the animation is complete.
+        if self.dead[: self.count].any():
+            self._compact(~self.dead[: self.count])
+        n = self.count
+        if not n:
+            return
+        ptype = self.type[:n]
+        self.dead[:n] = self.done[:n]
+
+        # Update the particles' positions based on their velocity.
+        self.prev_pos[:n] = self.pos[:n]
+        self.pos[:n] += self.velocity[:n]
 
-        # Update the particle's position based on its velocity.
-        self.pos[0] += self.velocity[0]
-        self.pos[1] += self.velocity[1]
+        # Update the animation frames, clamping non-looping animations at their last frame
+        frame = self.frame[:n]
+        frame += 1
+        total = self.total_frames[ptype]
+        loops = self.loops[ptype]
+        np.remainder(frame, total, out=frame, where=loops)
+        finished = ~loops & (frame >= total - 1)  # -1 to account for frames starting at 0
+        frame[finished] = total[finished] - 1
+        self.done[:n] |= finished
 
-        # Update the animation frame.
-        self.animation.update()
+        # Leaves oscillate L/R
+        leaves = ptype == self.leaf_id
+        if leaves.any():
+            self.pos[:n, 0][leaves] += np.sin(frame[leaves] * LEAF_SWAY_FREQ) * LEAF_SWAY_AMP
+
+    def cull(self, rect):
+        """
+        Retire every particle outside an area, e.g. the camera view plus a margin, without
+        waiting for its animation to finish.
+        Args:
+            rect (pygame.Rect): The area particles are kept in, in world pixels.
+        """
+        n = self.count
+        if not n:
+            return
+        pos = self.pos[:n]
+        keep = (pos[:, 0] >= rect.left) & (pos[:, 0] < rect.right) & (pos[:, 1] >= rect.top) & (pos[:, 1] < rect.bottom)
+        if not keep.all():
+            self._compact(keep)
 
-        return kill
+    def collect(self, items, offset=(0, 0), alpha=1.0):
+        """
+        Queue every particle for a batched blit.
+        Args:
+            items (list): The list of (surface, position) pairs to append to, e.g. a RenderQueue layer.
+            offset (tuple, optional): Offset for camera position. Defaults to (0, 0).
+            alpha (float, optional): Interpolation factor between the previous (0) and current (1)
+                positions. Defaults to 1.0.
+        Returns:
+            int: Number of particles queued.
+        """
+        n = self.count
+        if not n:
+            return 0
+        ptype = self.type[:n]
+        frame_idx = self.frame_offsets[ptype] + self.frame[:n] // self.img_durs[ptype]
+        # Draw each particle centered at its position minus the camera offset.
+        pos = self.pos[:n]
+        if alpha != 1.0:
+            prev_pos = self.prev_pos[:n]
+            pos = prev_pos + (pos - prev_pos) * alpha
+        dest = pos - offset - self.half_sizes[frame_idx]
+        frames = self.frames
+        items.extend(zip([frames[i] for i in frame_idx.tolist()], dest.tolist()))
+        return n
 
-    def render(self, surf, offset=(0, 0)):
+    def render(self, surf, offset=(0, 0), alpha=1.0):
         """
-        Render the particle on the given surface.
+        Render every particle with a single batched blit call.
         Args:
-            surf (pygame.Surface): The surface to draw the particle on.
+            surf (pygame.Surface): The surface to draw the particles on.
             offset (tuple, optional): Offset for camera position. Defaults to (0, 0).
+            alpha (float, optional): Interpolation factor between the previous (0) and current (1)
+                positions. Defaults to 1.0.
+        Returns:
+            int: Number of particles drawn.
         """
-        img = self.animation.img()  # Get the current frame of the animation.
-        # Draw the particle on the surface, centered at its position minus the camera offset.
-        surf.blit(
-            img, (self.pos[0] - offset[0] - img.get_width() // 2, self.pos[1] - offset[1] - img.get_height() // 2)
-        )
\ No newline at end of file
+        items = []
+        n = self.collect(items, offset=offset, alpha=alpha)
+        if n:
+            surf.fblits(items)
+        return n
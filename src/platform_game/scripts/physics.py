@@ -0,0 +1,194 @@
+import numpy as np
+
+# Added to the vertical velocity every step, up to TERMINAL_VELOCITY
+GRAVITY = 0.1
+TERMINAL_VELOCITY = 5
+# Taken off the horizontal velocity every step, down to 0
+FRICTION = 0.1
+# Column of each side in PhysicsWorld.collisions
+COLLISION_SIDES = ("up", "down", "left", "right")
+UP, DOWN, LEFT, RIGHT = range(4)
+# Batches smaller than this move body by body through PhysicsEntity.move_and_collide; the array
+# version only pays off past its fixed per-step cost. Both resolve collisions identically.
+BATCH_MIN_BODIES = 32
+
+
+class PhysicsWorld:
+    def __init__(self, capacity=64):
+        """
+        Initialize a physics world that keeps the state of every body in flat NumPy arrays.
+
+        A PhysicsEntity registers itself as a body; its pos, velocity and collisions are views of
+        its row. step applies movement, tile collisions, gravity and friction to all bodies at once.
+        Args:
+            capacity (int, optional): Initial number of body slots. Grows as needed. Defaults to 64.
+        """
+        self.count = 0
+        self.entities = []  # Slot -> the PhysicsEntity owning that row
+        self.pos = np.zeros((capacity, 2), dtype=np.float64)
+        self.prev_pos = np.zeros((capacity, 2), dtype=np.float64)  # Position before the last step
+        self.velocity = np.zeros((capacity, 2), dtype=np.float64)
+        self.movement = np.zeros((capacity, 2), dtype=np.float64)  # Movement input for the next step
+        self.size = np.zeros((capacity, 2), dtype=np.int64)
+        self.collisions = np.zeros((capacity, 4), dtype=bool)  # Sides hit during the last step, see COLLISION_SIDES
+
+    def __len__(self):
+        return self.count
+
+    def _reserve(self, extra):
+        """Grow the state arrays so that `extra` more bodies fit."""
+        needed = self.count + extra
+        capacity = len(self.pos)
+        if needed <= capacity:
+            return
+        while capacity < needed:
+            capacity *= 2
+        for name in ("pos", "prev_pos", "velocity", "movement", "size", "collisions"):
+            old = getattr(self, name)
+            new = np.zeros((capacity,) + old.shape[1:], dtype=old.dtype)
+            new[: self.count] = old[: self.count]
+            setattr(self, name, new)
+
+    def add(self, entity, pos, size):
+        """
+        Add a body.
+        Args:
+            entity (PhysicsEntity): The entity owning the body.
+            pos (tuple): Initial position (x, y).
+            size (tuple): Size (w, h) in pixels.
+        Returns:
+            int: The body's slot. It changes when other bodies are removed; entity.slot is kept up to date.
+        """
+        self._reserve(1)
+        slot = self.count
+        self.pos[slot] = pos
+        self.prev_pos[slot] = pos
+        self.velocity[slot] = 0
+        self.movement[slot] = 0
+        self.size[slot] = size
+        self.collisions[slot] = False
+        self.entities.append(entity)
+        self.count += 1
+        return slot
+
+    def remove(self, entity):
+        """
+        Remove a body, moving the last body into its slot.
+        Args:
+            entity (PhysicsEntity): The entity owning the body.
+        """
+        slot = entity.slot
+        last = self.count - 1
+        if slot != last:
+            for name in ("pos", "prev_pos", "velocity", "movement", "size", "collisions"):
+                array = getattr(self, name)
+                array[slot] = array[last]
+            moved = self.entities[last]
+            self.entities[slot] = moved
+            moved.slot = slot
+        self.entities.pop()
+        self.count -= 1
+        entity.slot = None
+
+    def step(self, tilemap, entities=None):
+        """
+        Advance bodies by one fixed step: move them by their movement input plus velocity,
+        resolve tile collisions one axis at a time, then apply gravity and friction.
+        Args:
+            tilemap (Tilemap): The tilemap for collision detection.
+            entities (list): Entities to step. Defaults to every body.
+        """
+        if entities is None:
+            entities = self.entities[: self.count]
+        if len(entities) < BATCH_MIN_BODIES:
+            for entity in entities:
+                self._step_body(tilemap, entity)
+            return
+        slots = np.array([entity.slot for entity in entities], dtype=np.int64)
+        self.prev_pos[slots] = self.pos[slots]
+        self.collisions[slots] = False
+        displacement = self.movement[slots] + self.velocity[slots]
+        self._move(tilemap, slots, 0, displacement[:, 0])
+        self._move(tilemap, slots, 1, displacement[:, 1])
+
+        # Gravity, capped at terminal velocity; hitting a floor or ceiling stops vertical motion
+        collisions = self.collisions[slots]
+        vy = np.minimum(self.velocity[slots, 1] + GRAVITY, TERMINAL_VELOCITY)
+        vy[collisions[:, UP] | collisions[:, DOWN]] = 0
+        self.velocity[slots, 1] = vy
+
+        # Entities adjust their velocity between gravity and friction, e.g. the player's dash
+        for entity in entities:
+            entity.update_velocity()
+
+        # Gradual deceleration towards 0
+        vx = self.velocity[slots, 0]
+        self.velocity[slots, 0] = np.where(vx > 0, np.maximum(0, vx - FRICTION), np.minimum(vx + FRICTION, 0))
+
+    def _step_body(self, tilemap, entity):
+        """Step a single body with scalar math, the same way step does for a batch."""
+        slot = entity.slot
+        self.prev_pos[slot] = self.pos[slot]
+        self.collisions[slot] = False
+        dx, dy = (self.movement[slot] + self.velocity[slot]).tolist()
+        entity.update_pos_x(tilemap, dx)
+        entity.update_pos_y(tilemap, dy)
+
+        velocity = self.velocity[slot]
+        if self.collisions[slot, UP] or self.collisions[slot, DOWN]:
+            velocity[1] = 0
+        else:
+            velocity[1] = min(velocity[1] + GRAVITY, TERMINAL_VELOCITY)
+        entity.update_velocity()
+        vx = float(velocity[0])
+        velocity[0] = max(0, vx - FRICTION) if vx > 0 else min(vx + FRICTION, 0)
+
+    def _move(self, tilemap, slots, axis, d):
+        """
+        Move bodies along one axis and resolve their collisions with the solid tiles, in bulk.
+        Same rules as PhysicsEntity.move_and_collide, applied to every body at once.
+        Args:
+            tilemap (Tilemap): The tilemap for collision detection.
+            slots (numpy.ndarray): Slots of the bodies to move.
+            axis (int): 0 to move along X, 1 along Y.
+            d (numpy.ndarray): The displacement of each body along the axis.
+        """
+        other = 1 - axis
+        pos = self.pos[slots]
+        size = self.size[slots, axis]
+        # Coordinates are truncated to ints like pygame.Rect does
+        start = np.trunc(pos[:, axis]).astype(np.int64)
+        pos[:, axis] += d
+        end = np.trunc(pos[:, axis]).astype(np.int64)
+        lo = np.trunc(pos[:, other]).astype(np.int64)
+        hi = lo + self.size[slots, other]
+        near = np.minimum(start, end)
+        far = np.maximum(start, end) + size
+
+        if axis == 0:
+            rects, body = tilemap.solidity.rects_in_areas(near, lo, far, hi)
+        else:
+            rects, body = tilemap.solidity.rects_in_areas(lo, near, hi, far)
+        tilemap.rects_tested += len(rects)
+
+        rect_near = rects[:, axis]
+        rect_far = rects[:, axis + 2]
+        body_d = d[body]
+        body_start = start[body]
+        body_end = end[body]
+        body_size = size[body]
+        # Overlapping the destination, or ahead of the start and passed through
+        forward = (body_d > 0) & ((rect_far > body_end) | (rect_near >= body_start + body_size))
+        backward = (body_d < 0) & ((rect_near < body_end + body_size) | (rect_far <= body_start))
+        hit = np.zeros(len(slots), dtype=bool)
+        hit[body[forward | backward | (body_d == 0)]] = True
+
+        resolved = end.astype(np.float64)
+        np.minimum.at(resolved, body[forward], rect_near[forward] - body_size[forward])
+        np.maximum.at(resolved, body[backward], rect_far[backward])
+        # Resolve positions
+        pos[hit, axis] = resolved[hit]
+        self.pos[slots] = pos
+        sides = (LEFT, RIGHT) if axis == 0 else (UP, DOWN)
+        self.collisions[slots[hit & (d < 0)], sides[0]] = True
+        self.collisions[slots[hit & (d > 0)], sides[1]] = True
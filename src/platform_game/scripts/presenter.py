@@ -0,0 +1,211 @@
+import pygame
+import numpy as np
+from contextlib import nullcontext
+from pygame._sdl2.video import Window, Renderer, Texture
+
+# Presentation backends that open_presenter can set up
+PRESENTERS = ("surface", "renderer")
+
+
+def open_presenter(backend, title, size, dirty_rects=False, profiler=None):
+    """
+    Open the game window along with a presenter for it.
+    Args:
+        backend (str): One of PRESENTERS. "surface" upscales onto the display surface with pygame.transform,
+            "renderer" presents through an SDL2 software Renderer.
+        title (str): The window title.
+        size (tuple): Size (w, h) of the window in pixels.
+        dirty_rects (bool): With the "surface" backend, only update the parts of the window that changed.
+        profiler (FrameProfiler): Passed on to the presenter.
+    Returns:
+        Presenter: The presenter.
+    Raises:
+        ValueError: If the backend is unknown.
+    """
+    if backend == "renderer":
+        # Images are still converted to the display's pixel format, which needs a video mode; a hidden one will do
+        pygame.display.set_mode((1, 1), pygame.HIDDEN)
+        return RendererPresenter(Window(title, size), profiler=profiler)
+    if backend != "surface":
+        raise ValueError(f"Unknown presenter '{backend}', expected one of {PRESENTERS}.")
+    pygame.display.set_caption(title)
+    screen = pygame.display.set_mode(size)
+    presenter_cls = DirtyRectPresenter if dirty_rects else Presenter
+    return presenter_cls(screen, profiler=profiler)
+
+
+class Presenter:
+    def __init__(self, screen, profiler=None):
+        """
+        Initialize a presenter that shows the low-res display on the window.
+        Args:
+            screen (pygame.Surface): The window surface returned by pygame.display.set_mode.
+            profiler (FrameProfiler): If given, upscaling and display updates are timed as the
+                "upscale" and "display_update" phases.
+        """
+        self.screen = screen
+        self.profiler = profiler
+
+    def phase(self, name):
+        """Time a phase with the profiler, if there is one."""
+        return self.profiler.phase(name) if self.profiler is not None else nullcontext()
+
+    def present(self, surf, full=False):
+        """
+        Upscale a frame onto the window and display it.
+        Args:
+            surf (pygame.Surface): The low-res frame.
+            full (bool): Whether the whole frame is known to have changed. Ignored here, every frame is shown in full.
+        """
+        with self.phase("upscale"):
+            self.screen.blit(pygame.transform.scale(surf, self.screen.get_size()), (0, 0))
+        with self.phase("display_update"):
+            pygame.display.update()
+
+
+class DirtyRectPresenter(Presenter):
+    def __init__(self, screen, block_size=16, profiler=None):
+        """
+        Initialize a presenter that only upscales and updates the parts of the frame that changed.
+
+        Each frame is compared with the previous one in blocks of block_size pixels. Only the
+        changed blocks are scaled onto the window and passed to pygame.display.update, and
+        nothing is updated at all if the frame is unchanged.
+        Args:
+            screen (pygame.Surface): The window surface returned by pygame.display.set_mode.
+            block_size (int): Size of the square blocks frames are compared in, in display pixels.
+            profiler (FrameProfiler): If given, the frame comparison, upscaling and display updates are timed.
+        """
+        super().__init__(screen, profiler=profiler)
+        self.block_size = block_size
+        self.prev = None  # Pixels of the last presented frame
+
+    def present(self, surf, full=False):
+        """
+        Upscale the changed parts of a frame onto the window and display them.
+        Args:
+            surf (pygame.Surface): The low-res frame. Must be an 8, 16 or 32-bit surface.
+            full (bool): Whether the whole frame is known to have changed (e.g. the camera moved),
+                which skips the comparison.
+        """
+        screen_w, screen_h = self.screen.get_size()
+        scale_x = screen_w // surf.get_width()
+        scale_y = screen_h // surf.get_height()
+        if scale_x * surf.get_width() != screen_w or scale_y * surf.get_height() != screen_h:
+            full = True  # Partial updates need an integer scale to line up with the full-frame scale
+
+        pixels = pygame.surfarray.pixels2d(surf)
+        if full or self.prev is None or self.prev.shape != pixels.shape:
+            self.prev = pixels.copy()
+            del pixels  # Unlock the surface
+            super().present(surf)
+            return
+
+        with self.phase("frame_diff"):
+            dirty = self.dirty_rects(pixels != self.prev)
+            self.prev[...] = pixels
+        del pixels  # Unlock the surface
+        if not dirty:
+            return
+
+        updated = []
+        with self.phase("upscale"):
+            for rect in dirty:
+                scaled = pygame.Rect(rect.x * scale_x, rect.y * scale_y, rect.w * scale_x, rect.h * scale_y)
+                self.screen.blit(pygame.transform.scale(surf.subsurface(rect), scaled.size), scaled)
+                updated.append(scaled)
+        with self.phase("display_update"):
+            pygame.display.update(updated)
+
+    def dirty_rects(self, changed):
+        """
+        Group changed pixels into rects made of whole blocks.
+        Args:
+            changed (numpy.ndarray): Boolean (width, height) array of pixels that differ from the last frame.
+        Returns:
+            list: pygame.Rect areas covering every changed pixel, in display coordinates.
+        """
+        width, height = changed.shape
+        size = self.block_size
+        blocks_x = -(-width // size)
+        blocks_y = -(-height // size)
+        padded = np.zeros((blocks_x * size, blocks_y * size), dtype=bool)
+        padded[:width, :height] = changed
+        blocks = padded.reshape(blocks_x, size, blocks_y, size).any(axis=(1, 3))
+
+        # Merge dirty blocks into horizontal runs per block row, then stack identical runs of consecutive rows
+        rects = []
+        open_runs = {}  # (first block x, last block x) -> rect still growing downwards
+        for by in range(blocks_y):
+            row = blocks[:, by]
+            runs = {}
+            bx = 0
+            while bx < blocks_x:
+                if row[bx]:
+                    start = bx
+                    while bx < blocks_x and row[bx]:
+                        bx += 1
+                    run = (start, bx)
+                    rect = open_runs.get(run)
+                    if rect is not None:
+                        rect.h += size
+                    else:
+                        rect = pygame.Rect(start * size, by * size, (bx - start) * size, size)
+                        rects.append(rect)
+                    runs[run] = rect
+                bx += 1
+            open_runs = runs
+
+        bounds = pygame.Rect(0, 0, width, height)
+        return [rect.clip(bounds) for rect in rects]
+
+
+class RendererPresenter(Presenter):
+    def __init__(self, window, profiler=None):
+        """
+        Initialize a presenter that shows the low-res display through an SDL2 Renderer.
+
+        Each frame is uploaded into a streaming texture of the display's size, and the renderer
+        stretches it onto the window by the largest integer factor that fits, centered. This
+        skips allocating and blitting an upscaled copy of the frame on the CPU side. The software
+        renderer is used, so it works without a GPU.
+        Args:
+            window (pygame._sdl2.video.Window): The window to present on. Must not have a display surface.
+            profiler (FrameProfiler): If given, texture uploads and presentation are timed as the
+                "upscale" and "display_update" phases.
+        """
+        super().__init__(None, profiler=profiler)
+        self.window = window
+        self.renderer = Renderer(window, accelerated=0)
+        self.texture = None  # Streaming texture the frames are uploaded to, sized to the last frame
+
+    def dest_rect(self, size):
+        """
+        Get where a frame is drawn on the window.
+        Args:
+            size (tuple): Size (w, h) of the frame.
+        Returns:
+            pygame.Rect: The frame scaled by the largest integer factor that fits the window, centered.
+        """
+        window_w, window_h = self.window.size
+        scale = max(1, min(window_w // size[0], window_h // size[1]))
+        rect = pygame.Rect(0, 0, size[0] * scale, size[1] * scale)
+        rect.center = (window_w // 2, window_h // 2)
+        return rect
+
+    def present(self, surf, full=False):
+        """
+        Upload a frame to the texture and present it on the window.
+        Args:
+            surf (pygame.Surface): The low-res frame.
+            full (bool): Whether the whole frame is known to have changed. Ignored here, every frame is shown in full.
+        """
+        size = surf.get_size()
+        with self.phase("upscale"):
+            if self.texture is None or (self.texture.width, self.texture.height) != size:
+                self.texture = Texture(self.renderer, size, streaming=True)
+            self.texture.update(surf)
+            self.renderer.clear()  # Clears the letterbox bars around integer-scaled frames
+            self.texture.draw(dstrect=self.dest_rect(size))
+        with self.phase("display_update"):
+            self.renderer.present()
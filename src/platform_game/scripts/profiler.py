@@ -0,0 +1,199 @@
+import os
+import json
+import time
+import pygame
+from collections import deque
+from scripts.utils import percentile
+
+# Frames between refreshes of the overlay text; percentiles don't need recomputing every frame
+OVERLAY_REFRESH = 15
+
+
+class _Phase:
+    """Context manager timing one phase of a frame for a FrameProfiler."""
+
+    __slots__ = ("profiler", "name", "start")
+
+    def __init__(self, profiler, name):
+        self.profiler = profiler
+        self.name = name
+        self.start = 0.0
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.profiler.add_time(self.name, self.start, time.perf_counter())
+        return False
+
+
+class FrameProfiler:
+    def __init__(self, window=240):
+        """
+        Initialize a profiler that records how long each phase of a frame takes, plus per-frame counters.
+        Args:
+            window (int): Number of recent frames kept for the rolling percentiles.
+        """
+        self.window = window
+        self.phase_history = {}  # Phase name -> deque of per-frame durations (ms)
+        self.count_history = {}  # Counter name -> deque of per-frame values
+        self.phase_times = {}  # Phase name -> duration so far this frame (ms)
+        self.counts = {}  # Counter name -> value so far this frame
+        self.frame_start = time.perf_counter()
+        self.frames = 0
+        self.show_overlay = False
+        self.overlay = None  # Cached overlay surface
+        self.font = None
+        self.trace_events = None  # Chrome trace events, while a trace is being recorded
+        self.trace_origin = 0.0
+
+    def phase(self, name):
+        """
+        Time a phase of the current frame. Use as `with profiler.phase("tilemap"): ...`.
+        A phase entered several times in one frame adds up.
+        Args:
+            name (str): Name of the phase.
+        Returns:
+            _Phase: The context manager.
+        """
+        return _Phase(self, name)
+
+    def add_time(self, name, start, end):
+        """
+        Record time spent in a phase during the current frame.
+        Args:
+            name (str): Name of the phase.
+            start (float): time.perf_counter() at the start of the phase.
+            end (float): time.perf_counter() at the end of the phase.
+        """
+        self.phase_times[name] = self.phase_times.get(name, 0.0) + (end - start) * 1000
+        if self.trace_events is not None:
+            self.trace_events.append(
+                {
+                    "name": name,
+                    "ph": "X",
+                    "ts": (start - self.trace_origin) * 1e6,
+                    "dur": (end - start) * 1e6,
+                    "pid": os.getpid(),
+                    "tid": 0,
+                }
+            )
+
+    def count(self, name, n=1):
+        """
+        Add to a counter of the current frame.
+        Args:
+            name (str): Name of the counter, e.g. "blits".
+            n (int): Amount to add.
+        """
+        self.counts[name] = self.counts.get(name, 0) + n
+
+    def end_frame(self):
+        """
+        Close the current frame: store its phase times and counters in the rolling history and start a new one.
+        The frame's total duration is recorded as the "frame" phase.
+        """
+        now = time.perf_counter()
+        self.phase_times["frame"] = (now - self.frame_start) * 1000
+        for name, value in self.phase_times.items():
+            history = self.phase_history.get(name)
+            if history is None:
+                history = self.phase_history[name] = deque(maxlen=self.window)
+            history.append(value)
+        for name, value in self.counts.items():
+            history = self.count_history.get(name)
+            if history is None:
+                history = self.count_history[name] = deque(maxlen=self.window)
+            history.append(value)
+        if self.trace_events is not None:
+            self.trace_events.append(
+                {"name": "frame", "ph": "i", "s": "p", "ts": (now - self.trace_origin) * 1e6, "pid": os.getpid(), "tid": 0}
+            )
+            for name, value in self.counts.items():
+                self.trace_events.append(
+                    {"name": name, "ph": "C", "ts": (now - self.trace_origin) * 1e6, "pid": os.getpid(), "args": {name: value}}
+                )
+        self.phase_times = {}
+        self.counts = {}
+        self.frame_start = now
+        self.frames += 1
+
+    def stats(self):
+        """
+        Summarize the rolling history.
+        Returns:
+            dict: {"phases": {name: {"p50", "p95", "p99", "max"}}, "counts": {name: {"p50", "max", "last"}}},
+                with phase values in milliseconds.
+        """
+        phases = {}
+        for name, history in self.phase_history.items():
+            values = list(history)
+            phases[name] = {
+                "p50": percentile(values, 50),
+                "p95": percentile(values, 95),
+                "p99": percentile(values, 99),
+                "max": max(values),
+            }
+        counts = {}
+        for name, history in self.count_history.items():
+            values = list(history)
+            counts[name] = {"p50": percentile(values, 50), "max": max(values), "last": values[-1]}
+        return {"phases": phases, "counts": counts}
+
+    def toggle_overlay(self):
+        """Show or hide the on-screen overlay."""
+        self.show_overlay = not self.show_overlay
+        self.overlay = None
+
+    def render_overlay(self, surf):
+        """
+        Draw the rolling phase percentiles and counters in the top-left corner of a surface, if the overlay is shown.
+        Args:
+            surf (pygame.Surface): The surface to draw on.
+        """
+        if not self.show_overlay:
+            return
+        if self.overlay is None or self.frames % OVERLAY_REFRESH == 0:
+            self.overlay = self._build_overlay()
+        surf.blit(self.overlay, (2, 2))
+
+    def _build_overlay(self):
+        """Render the overlay text onto a new translucent surface."""
+        if self.font is None:
+            pygame.font.init()
+            self.font = pygame.font.Font(None, 12)
+        stats = self.stats()
+        lines = ["phase       p50    p95    p99 ms"]
+        for name, s in sorted(stats["phases"].items(), key=lambda item: (item[0] != "frame", -item[1]["p50"])):
+            lines.append(f"{name[:10]:<10} {s['p50']:6.2f} {s['p95']:6.2f} {s['p99']:6.2f}")
+        for name, s in sorted(stats["counts"].items()):
+            lines.append(f"{name[:14]:<14} {s['last']:>7} (max {s['max']})")
+
+        line_height = self.font.get_linesize()
+        rendered = [self.font.render(line, False, (255, 255, 255)) for line in lines]
+        overlay = pygame.Surface(
+            (max(text.get_width() for text in rendered) + 4, line_height * len(rendered) + 4), pygame.SRCALPHA
+        )
+        overlay.fill((0, 0, 0, 160))
+        for i, text in enumerate(rendered):
+            overlay.blit(text, (2, 2 + i * line_height))
+        return overlay
+
+    def start_trace(self):
+        """Start recording every phase as a trace event."""
+        self.trace_events = []
+        self.trace_origin = time.perf_counter()
+
+    def stop_trace(self, path):
+        """
+        Stop recording and write the trace in Chrome's trace event format (viewable in chrome://tracing or Perfetto).
+        Args:
+            path (str): Destination file.
+        """
+        if self.trace_events is None:
+            return
+        file = open(path, "w")
+        json.dump({"traceEvents": self.trace_events, "displayTimeUnit": "ms"}, file)
+        file.close()
+        self.trace_events = None
@@ -0,0 +1,87 @@
+from collections import deque
+from scripts.utils import percentile
+
+# Time a frame may take at 60 FPS, in milliseconds
+FRAME_BUDGET_MS = 1000 / 60
+# Frames whose percentile decides a step down; quality drops once this percentile is over budget
+DEGRADE_WINDOW = 60
+DEGRADE_PERCENTILE = 95
+# Frames whose percentile must stay under RECOVER_RATIO of the budget before quality steps back up.
+# Longer and stricter than degrading, so a tier that only just fits isn't left and re-entered over and over.
+RECOVER_WINDOW = 180
+RECOVER_RATIO = 0.5
+
+
+class QualityGovernor:
+    def __init__(self, tiers, budget_ms=FRAME_BUDGET_MS, adaptive=True):
+        """
+        Initialize a governor that picks a quality tier from recent frame times.
+
+        Frame times are fed in with record. When the DEGRADE_PERCENTILE of the last DEGRADE_WINDOW
+        frames is over budget, it steps down to the next tier; when the same percentile of the last
+        RECOVER_WINDOW frames has stayed under RECOVER_RATIO of the budget, it steps back up. The
+        history is cleared after every change, so each tier is judged on its own frames.
+        Args:
+            tiers (list): Tier settings dicts, best first. Each needs a "name".
+            budget_ms (float): Time a frame may take, in milliseconds.
+            adaptive (bool): Whether record changes the tier. If False, the tier only changes through set_tier.
+        """
+        self.tiers = tiers
+        self.budget_ms = budget_ms
+        self.adaptive = adaptive
+        self.tier = 0  # Index of the active tier in tiers
+        self.frame_ms = deque(maxlen=RECOVER_WINDOW)  # Recent frame times since the last change
+        self.changes = 0
+
+    @property
+    def active(self):
+        """dict: Settings of the active tier."""
+        return self.tiers[self.tier]
+
+    @property
+    def name(self):
+        """str: Name of the active tier."""
+        return self.tiers[self.tier]["name"]
+
+    def set_tier(self, tier):
+        """
+        Switch to a tier.
+        Args:
+            tier (int or str): Index or name of the tier.
+        Returns:
+            bool: True if the tier changed.
+        Raises:
+            ValueError: If there is no tier with that name.
+        """
+        if isinstance(tier, str):
+            names = [settings["name"] for settings in self.tiers]
+            if tier not in names:
+                raise ValueError(f"Unknown quality tier '{tier}', expected one of {names}.")
+            tier = names.index(tier)
+        self.frame_ms.clear()
+        if tier == self.tier:
+            return False
+        self.tier = tier
+        self.changes += 1
+        return True
+
+    def record(self, frame_ms):
+        """
+        Add the time a frame took, stepping the tier down or up if needed.
+        Args:
+            frame_ms (float): Time spent on the frame, excluding any wait for the next one, in milliseconds.
+        Returns:
+            bool: True if the tier changed.
+        """
+        if not self.adaptive:
+            return False
+        history = self.frame_ms
+        history.append(frame_ms)
+        if len(history) >= DEGRADE_WINDOW and self.tier < len(self.tiers) - 1:
+            recent = list(history)[-DEGRADE_WINDOW:]
+            if percentile(recent, DEGRADE_PERCENTILE) > self.budget_ms:
+                return self.set_tier(self.tier + 1)
+        if len(history) >= RECOVER_WINDOW and self.tier > 0:
+            if percentile(list(history), DEGRADE_PERCENTILE) < self.budget_ms * RECOVER_RATIO:
+                return self.set_tier(self.tier - 1)
+        return False
@@ -0,0 +1,59 @@
+class RenderQueue:
+    def __init__(self):
+        """
+        Initialize a queue that batches the blits of a frame into layers.
+
+        Drawables append (surface, position) pairs to a layer's list instead of blitting them one by
+        one, and flush hands each layer to its target surface in a single Surface.fblits call.
+        Layers keep their items in the order they were added and are flushed in the order they were
+        declared, so the result is the same as blitting each item as it came.
+        """
+        self.layers = {}  # Layer name -> (target surface, list of (surface, position) pairs)
+        self.blits = 0  # Items submitted since the last reset
+        self.calls = 0  # Batched blit calls made since the last reset
+
+    def add_layer(self, name, target):
+        """
+        Declare a layer.
+        Args:
+            name (str): Name of the layer.
+            target (pygame.Surface): The surface the layer is drawn onto.
+        """
+        self.layers[name] = (target, [])
+
+    def items(self, name):
+        """
+        Get the list a layer collects its (surface, position) pairs in.
+        Args:
+            name (str): Name of the layer.
+        Returns:
+            list: The pending pairs; append or extend it to queue blits.
+        """
+        return self.layers[name][1]
+
+    def flush(self, *names):
+        """
+        Draw and empty layers, one batched call per layer.
+        Args:
+            *names (str): Layers to flush, in order. Defaults to every layer, in the order they were declared.
+        Returns:
+            int: Number of blits made.
+        """
+        blits = 0
+        for name in names or self.layers:
+            target, items = self.layers[name]
+            if not items:
+                continue
+            target.fblits(items)
+            blits += len(items)
+            self.calls += 1
+            items.clear()
+        self.blits += blits
+        return blits
+
+    def reset(self):
+        """Drop every pending item and zero the counters, e.g. at the start of a frame."""
+        for target, items in self.layers.values():
+            items.clear()
+        self.blits = 0
+        self.calls = 0
@@ -0,0 +1,92 @@
+import json
+
+# Bumped whenever the replay file layout changes
+REPLAY_VERSION = 1
+# Gameplay inputs that are recorded, as applied by Game.apply_input
+ACTIONS = {"left_down", "left_up", "right_down", "right_up", "jump", "dash"}
+
+
+class InputRecorder:
+    def __init__(self, seed, map_path):
+        """
+        Initialize an input log for one play session.
+        Args:
+            seed (int): Seed of the game's random number generator.
+            map_path (str): Path of the map the session is played on.
+        """
+        self.seed = seed
+        self.map_path = map_path
+        self.inputs = []  # [tick, action] pairs, in the order they were applied
+
+    def record(self, tick, action):
+        """
+        Log an input.
+        Args:
+            tick (int): The simulation step the input applies to (it takes effect before that step runs).
+            action (str): One of ACTIONS.
+        """
+        self.inputs.append([tick, action])
+
+    def save(self, path, ticks):
+        """
+        Write the input log to a json file.
+        Args:
+            path (str): Destination file.
+            ticks (int): Total number of simulation steps the session ran for.
+        """
+        file = open(path, "w")
+        json.dump(
+            {"version": REPLAY_VERSION, "seed": self.seed, "map": self.map_path, "ticks": ticks, "inputs": self.inputs},
+            file,
+        )
+        file.close()
+
+
+class InputReplay:
+    def __init__(self, seed, map_path, ticks, inputs):
+        """
+        Initialize a replay of a recorded input log.
+        Args:
+            seed (int): Seed the recorded game was started with.
+            map_path (str): Map the session was played on.
+            ticks (int): Number of simulation steps to replay.
+            inputs (list): [tick, action] pairs, sorted by tick.
+        """
+        self.seed = seed
+        self.map_path = map_path
+        self.ticks = ticks
+        self.inputs = inputs
+        self.next_input = 0  # Index of the first input not handed out yet
+
+    @classmethod
+    def load(cls, path):
+        """
+        Read an input log written by InputRecorder.save.
+        Args:
+            path (str): The replay file.
+        Returns:
+            InputReplay: The replay, positioned at tick 0.
+        Raises:
+            ValueError: If the file was written by an incompatible version.
+        """
+        file = open(path, "r")
+        data = json.load(file)
+        file.close()
+
+        if data.get("version") != REPLAY_VERSION:
+            raise ValueError(f"Unsupported replay version {data.get('version')!r} in '{path}'.")
+        return cls(data["seed"], data["map"], data["ticks"], data["inputs"])
+
+    def actions_at(self, tick):
+        """
+        Get the inputs to apply before a simulation step. Ticks must be asked for in increasing order.
+        Args:
+            tick (int): The simulation step about to run.
+        Returns:
+            list: The actions recorded for that step.
+        """
+        actions = []
+        while self.next_input < len(self.inputs) and self.inputs[self.next_input][0] <= tick:
+            actions.append(self.inputs[self.next_input][1])
+            self.next_input += 1
+        return actions
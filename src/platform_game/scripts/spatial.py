@@ -0,0 +1,188 @@
+import math
+import pygame
+
+
+class SpatialGrid:
+    def __init__(self, cell_size=64):
+        """
+        Initialize a uniform-grid spatial index.
+
+        Every item is registered in each cell its bounding rect overlaps, so a query
+        only looks at the items stored in the cells it touches rather than at every item.
+        Args:
+            cell_size (int): Width and height of a grid cell in world pixels.
+        """
+        self.cell_size = cell_size
+        self.cells = {}  # (gx, gy) -> {item key: item}
+        self.entries = {}  # item key -> [item, rect, cell range, insertion order]
+        self.next_order = 0
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __contains__(self, item):
+        return id(item) in self.entries
+
+    def _cell_range(self, rect):
+        """
+        Get the range of cells a rect overlaps.
+        Args:
+            rect (pygame.Rect): The rect, in world pixels.
+        Returns:
+            tuple: (first gx, last gx, first gy, last gy), inclusive.
+        """
+        size = self.cell_size
+        return (
+            rect.left // size,
+            (rect.right - 1) // size if rect.width > 0 else rect.left // size,
+            rect.top // size,
+            (rect.bottom - 1) // size if rect.height > 0 else rect.top // size,
+        )
+
+    def _link(self, key, item, cell_range):
+        x0, x1, y0, y1 = cell_range
+        for gx in range(x0, x1 + 1):
+            for gy in range(y0, y1 + 1):
+                cell = self.cells.get((gx, gy))
+                if cell is None:
+                    cell = self.cells[(gx, gy)] = {}
+                cell[key] = item
+
+    def _unlink(self, key, cell_range):
+        x0, x1, y0, y1 = cell_range
+        for gx in range(x0, x1 + 1):
+            for gy in range(y0, y1 + 1):
+                cell = self.cells[(gx, gy)]
+                del cell[key]
+                if not cell:
+                    del self.cells[(gx, gy)]
+
+    def _gather(self, rect):
+        """Collect the keys of every item registered in a cell the rect overlaps."""
+        x0, x1, y0, y1 = self._cell_range(rect)
+        found = {}
+        for gx in range(x0, x1 + 1):
+            for gy in range(y0, y1 + 1):
+                cell = self.cells.get((gx, gy))
+                if cell:
+                    found.update(cell)
+        return found
+
+    def insert(self, item, rect, order=None):
+        """
+        Add an item to the index.
+        Args:
+            item: The object to index. Items are tracked by identity, so dicts are fine.
+            rect (pygame.Rect): The item's bounds, in world pixels.
+            order (int): Position of the item in query results, e.g. to restore a saved drawing order.
+                Defaults to after every item inserted so far.
+        """
+        key = id(item)
+        if key in self.entries:
+            self.move(item, rect)
+            return
+        rect = pygame.Rect(rect)
+        cell_range = self._cell_range(rect)
+        if order is None:
+            order = self.next_order
+        self.entries[key] = [item, rect, cell_range, order]
+        self.next_order = max(self.next_order, order + 1)
+        self._link(key, item, cell_range)
+
+    def remove(self, item):
+        """
+        Remove an item from the index. Unknown items are ignored.
+        Args:
+            item: The object to remove.
+        """
+        entry = self.entries.pop(id(item), None)
+        if entry is not None:
+            self._unlink(id(item), entry[2])
+
+    def move(self, item, rect):
+        """
+        Update the bounds of an indexed item. Cells are only touched if the item crossed a cell border.
+        Args:
+            item: The object that moved.
+            rect (pygame.Rect): The item's new bounds, in world pixels.
+        """
+        key = id(item)
+        entry = self.entries[key]
+        entry[1].update(rect)
+        cell_range = self._cell_range(entry[1])
+        if cell_range != entry[2]:
+            self._unlink(key, entry[2])
+            self._link(key, item, cell_range)
+            entry[2] = cell_range
+
+    def rect_of(self, item):
+        """
+        Get the bounds an item was indexed with.
+        Args:
+            item: An indexed object.
+        Returns:
+            pygame.Rect: The item's bounds.
+        """
+        return self.entries[id(item)][1]
+
+    def clear(self):
+        """Remove every item."""
+        self.cells.clear()
+        self.entries.clear()
+
+    def query_rect(self, rect):
+        """
+        Find the items whose bounds overlap a rect.
+        Args:
+            rect (pygame.Rect): The area to query, in world pixels.
+        Returns:
+            list: The overlapping items, in insertion order.
+        """
+        rect = pygame.Rect(rect)
+        entries = self.entries
+        hits = [entries[key] for key in self._gather(rect) if rect.colliderect(entries[key][1])]
+        hits.sort(key=lambda entry: entry[3])
+        return [entry[0] for entry in hits]
+
+    def query_radius(self, center, radius):
+        """
+        Find the items whose bounds come within a distance of a point.
+        Args:
+            center (tuple): The (x, y) position, in world pixels.
+            radius (float): The distance, in pixels, to the closest point of an item's bounds.
+        Returns:
+            list: The items in range, in insertion order.
+        """
+        x, y = center
+        left = math.floor(x - radius)
+        top = math.floor(y - radius)
+        area = pygame.Rect(left, top, math.ceil(x + radius) - left + 1, math.ceil(y + radius) - top + 1)
+        limit = radius * radius
+        entries = self.entries
+        hits = []
+        for key in self._gather(area):
+            entry = entries[key]
+            bounds = entry[1]
+            # Distance from the point to the closest point of the bounds
+            dx = max(bounds.left - x, x - bounds.right, 0)
+            dy = max(bounds.top - y, y - bounds.bottom, 0)
+            if dx * dx + dy * dy <= limit:
+                hits.append(entry)
+        hits.sort(key=lambda entry: entry[3])
+        return [entry[0] for entry in hits]
+
+    def query_point(self, point):
+        """
+        Find the items whose bounds contain a point.
+        Args:
+            point (tuple): The (x, y) position, in world pixels.
+        Returns:
+            list: The items under the point, in insertion order.
+        """
+        cell = self.cells.get((int(point[0] // self.cell_size), int(point[1] // self.cell_size)))
+        if not cell:
+            return []
+        entries = self.entries
+        hits = [entries[key] for key in cell if entries[key][1].collidepoint(point)]
+        hits.sort(key=lambda entry: entry[3])
+        return [entry[0] for entry in hits]
@@ -0,0 +1,252 @@
+import os
+import json
+import queue
+import threading
+from scripts.tilestore import CHUNK_SIZE
+from scripts.mapformat import BINARY_MAP_EXT, decode_binary_map, store_chunks, write_binary_map
+
+# Bumped whenever the world manifest layout changes
+WORLD_VERSION = 1
+WORLD_MANIFEST = "world.json"
+# Width (and height) of a region, in chunks
+REGION_SIZE = 4
+# Regions this far (in pixels) beyond the camera view are loaded in the background before they come into view
+PREFETCH_MARGIN = 512
+# Most regions kept loaded; the farthest ones not needed right now are evicted past it
+MAX_RESIDENT_REGIONS = 16
+
+
+def region_path(world_dir, region):
+    """
+    Get the file a region of a world is stored in.
+    Args:
+        world_dir (str): The world directory.
+        region (tuple): Region coordinates (rx, ry).
+    Returns:
+        str: Path of the region file.
+    """
+    return os.path.join(world_dir, f"r.{region[0]}.{region[1]}{BINARY_MAP_EXT}")
+
+
+def write_world(world_dir, grid, tile_size, offgrid, region_size=REGION_SIZE):
+    """
+    Split a map into region files that a WorldStreamer can page in and out.
+    Each region is a binary map holding region_size x region_size chunks and the off-grid
+    tiles positioned inside it. A world.json manifest lists the regions.
+    Args:
+        world_dir (str): Destination directory. Created if needed.
+        grid (TileStore): The grid tiles.
+        tile_size (int): Size of a tile in pixels.
+        offgrid (list): Off-grid tile dicts.
+        region_size (int): Width (and height) of a region, in chunks.
+    """
+    os.makedirs(world_dir, exist_ok=True)
+    region_px = region_size * CHUNK_SIZE * tile_size
+    regions = {}  # (rx, ry) -> [chunk keys, off-grid tiles, their drawing order in the whole map]
+    for cx, cy in grid.chunks:
+        regions.setdefault((cx // region_size, cy // region_size), [[], [], []])[0].append((cx, cy))
+    for order, tile in enumerate(offgrid):
+        region = (int(tile["pos"][0] // region_px), int(tile["pos"][1] // region_px))
+        entry = regions.setdefault(region, [[], [], []])
+        entry[1].append(tile)
+        entry[2].append(order)
+
+    for region, (chunk_keys, tiles, orders) in regions.items():
+        write_binary_map(
+            region_path(world_dir, region), grid, tile_size, tiles, chunk_keys=chunk_keys, offgrid_order=orders
+        )
+    file = open(os.path.join(world_dir, WORLD_MANIFEST), "w")
+    json.dump(
+        {
+            "version": WORLD_VERSION,
+            "tile_size": tile_size,
+            "region_size": region_size,
+            "regions": sorted(list(region) for region in regions),
+        },
+        file,
+    )
+    file.close()
+
+
+def is_world(path):
+    """
+    Check whether a path is a world directory written by write_world.
+    Args:
+        path (str): The map path.
+    Returns:
+        bool: True if the path is a world directory.
+    """
+    return os.path.isfile(os.path.join(path, WORLD_MANIFEST))
+
+
+class WorldStreamer:
+    def __init__(self, tilemap, world_dir, prefetch_margin=PREFETCH_MARGIN, max_resident=MAX_RESIDENT_REGIONS):
+        """
+        Initialize a streamer that pages the regions of a world in and out of a tilemap.
+
+        Regions overlapping the areas passed to update are required: they are loaded before update
+        returns, so physics and rendering never see missing tiles. Regions within prefetch_margin of
+        those areas are decoded ahead of time on a background thread, and the farthest regions that
+        aren't required are evicted once more than max_resident are loaded.
+        Args:
+            tilemap (Tilemap): The tilemap the regions are loaded into.
+            world_dir (str): The world directory.
+            prefetch_margin (int): How far around the required areas regions are prefetched, in pixels.
+            max_resident (int): Most regions kept loaded. Required regions are never evicted.
+        Raises:
+            ValueError: If the manifest was written by an incompatible version.
+        """
+        file = open(os.path.join(world_dir, WORLD_MANIFEST), "r")
+        manifest = json.load(file)
+        file.close()
+        if manifest.get("version") != WORLD_VERSION:
+            raise ValueError(f"Unsupported world version {manifest.get('version')!r} in '{world_dir}'.")
+
+        self.tilemap = tilemap
+        self.world_dir = world_dir
+        self.tile_size = manifest["tile_size"]
+        self.region_px = manifest["region_size"] * CHUNK_SIZE * self.tile_size
+        self.regions = {tuple(region) for region in manifest["regions"]}  # Regions that exist on disk
+        self.prefetch_margin = prefetch_margin
+        self.max_resident = max_resident
+        self.resident = {}  # (rx, ry) -> (chunk keys, off-grid tiles) of each loaded region
+        self.pending = set()  # Regions queued on the loader thread
+        self.required = set()  # Regions overlapping the areas of the last update
+        self.loads = 0
+        self.evictions = 0
+
+        # The loader thread only decodes files; results are put into the tilemap on the main thread
+        self.requests = queue.Queue()
+        self.results = queue.Queue()
+        self.thread = threading.Thread(target=self._loader, name="world-loader", daemon=True)
+        self.thread.start()
+
+    def _loader(self):
+        """Decode requested region files until a None request arrives."""
+        while True:
+            region = self.requests.get()
+            if region is None:
+                return
+            try:
+                result = decode_binary_map(region_path(self.world_dir, region))
+            except Exception as error:  # Handed to the main thread, which raises it
+                result = error
+            self.results.put((region, result))
+
+    def close(self):
+        """Stop the loader thread."""
+        if self.thread.is_alive():
+            self.requests.put(None)
+            self.thread.join()
+
+    def region_of_pos(self, pos):
+        """
+        Get the region a world-space position falls in.
+        Args:
+            pos (tuple): The (x, y) position, in world pixels.
+        Returns:
+            tuple: Region coordinates (rx, ry).
+        """
+        return (int(pos[0] // self.region_px), int(pos[1] // self.region_px))
+
+    def regions_in_rect(self, rect):
+        """
+        Get the existing regions overlapping a world-space rect.
+        Args:
+            rect (pygame.Rect): The area, in world pixels.
+        Returns:
+            set: Region coordinates (rx, ry).
+        """
+        size = self.region_px
+        return {
+            (rx, ry)
+            for rx in range(rect.left // size, (rect.right - 1) // size + 1)
+            for ry in range(rect.top // size, (rect.bottom - 1) // size + 1)
+            if (rx, ry) in self.regions
+        }
+
+    def update(self, areas):
+        """
+        Page regions in and out around the given areas, e.g. the camera view and the player.
+        Args:
+            areas (list): pygame.Rect areas, in world pixels, whose tiles must be loaded.
+        Returns:
+            bool: True if the set of required regions changed.
+        """
+        # Take in whatever the loader thread finished
+        while True:
+            try:
+                region, result = self.results.get_nowait()
+            except queue.Empty:
+                break
+            self._integrate(region, result)
+
+        # Anything touching the areas is needed now, with a chunk of slack for objects reaching past them
+        slack = CHUNK_SIZE * self.tile_size
+        required = set()
+        wanted = set()
+        for area in areas:
+            required |= self.regions_in_rect(area.inflate(slack * 2, slack * 2))
+            wanted |= self.regions_in_rect(area.inflate(self.prefetch_margin * 2, self.prefetch_margin * 2))
+
+        for region in required:
+            if region in self.resident:
+                continue
+            if region in self.pending:
+                self._wait_for(region)
+            else:
+                self._integrate(region, decode_binary_map(region_path(self.world_dir, region)))
+        for region in wanted:
+            if region not in self.resident and region not in self.pending:
+                self.pending.add(region)
+                self.requests.put(region)
+
+        # Evict the farthest regions that aren't needed right now
+        if len(self.resident) > self.max_resident:
+            centers = [area.center for area in areas]
+
+            def distance(region):
+                x = (region[0] + 0.5) * self.region_px
+                y = (region[1] + 0.5) * self.region_px
+                return min((x - cx) ** 2 + (y - cy) ** 2 for cx, cy in centers)
+
+            evictable = sorted((r for r in self.resident if r not in required), key=distance, reverse=True)
+            for region in evictable[: len(self.resident) - self.max_resident]:
+                self._evict(region)
+
+        changed = required != self.required
+        self.required = required
+        return changed
+
+    def _wait_for(self, region):
+        """Block until a region queued on the loader thread is loaded."""
+        while region not in self.resident:
+            loaded, result = self.results.get()
+            self._integrate(loaded, result)
+
+    def _integrate(self, region, result):
+        """Put a decoded region into the tilemap."""
+        self.pending.discard(region)
+        if isinstance(result, Exception):
+            raise result
+        if region in self.resident:
+            return
+        tile_size, tile_types, chunks, offgrid, offgrid_order = result
+        tilemap = self.tilemap
+        store_chunks(tilemap.grid, tile_types, chunks)
+        for cx, cy, cells in chunks:
+            tilemap._chunk_changed(cx, cy)
+        for tile, order in zip(offgrid, offgrid_order):
+            tilemap.add_offgrid_tile(tile, order=order)
+        self.resident[region] = ([(cx, cy) for cx, cy, cells in chunks], offgrid)
+        self.loads += 1
+
+    def _evict(self, region):
+        """Remove a region's tiles from the tilemap."""
+        chunk_keys, offgrid = self.resident.pop(region)
+        tilemap = self.tilemap
+        for cx, cy in chunk_keys:
+            tilemap.grid.remove_chunk(cx, cy)
+            tilemap._chunk_changed(cx, cy)
+        tilemap.remove_offgrid_tiles(offgrid)
+        self.evictions += 1
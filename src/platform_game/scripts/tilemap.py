@@ -1,6 +1,11 @@
 import pygame
-import json
-import copy
+import numpy as np
+from scripts.tilestore import TileStore, EMPTY, CHUNK_SHIFT, CHUNK_SIZE
+from scripts.chunkcache import ChunkCache
+from scripts.spatial import SpatialGrid
+from scripts.collision import SolidityGrid
+from scripts.mapformat import read_map, write_map
+from scripts.streaming import WorldStreamer, is_world
 
 # Offsets used to calculate neighboring tiles around a given tile position
 BORDERING_TILE_OFFSETS = [
@@ -30,21 +35,151 @@ AUTOTILE_MAP = {
 }
 # Variants to support autotiling
 AUTOTILE_TYPES = {"grass", "stone"}
+# Bit set in a tile's neighbor mask for each direction holding a tile of the same type
+AUTOTILE_BITS = {(1, 0): 1, (-1, 0): 2, (0, -1): 4, (0, 1): 8}
+# AUTOTILE_MAP indexed by neighbor mask; -1 where the pattern has no variant and the tile is left alone
+AUTOTILE_VARIANTS = np.full(16, -1, dtype=np.int16)
+for _neighbors, _variant in AUTOTILE_MAP.items():
+    AUTOTILE_VARIANTS[sum(AUTOTILE_BITS[shift] for shift in _neighbors)] = _variant
+# The whole-map autotile pass works on a dense copy of the map's bounding box unless that box
+# has more than this many chunks per stored chunk (and more than AUTOTILE_DENSE_MIN_CHUNKS in total)
+AUTOTILE_MAX_SPARSITY = 4
+AUTOTILE_DENSE_MIN_CHUNKS = 256
 
 
 class Tilemap:
-    def __init__(self, game, tile_size=16):
+    def __init__(self, game, tile_size=16, max_cached_chunks=64):
         """
         Initialize the tilemap.
 
         Args:
             game (Game): Reference to the game object.
             tile_size (int): Size of each tile in pixels.
+            max_cached_chunks (int): Maximum number of pre-rendered chunk surfaces kept in memory.
         """
         self.game = game
         self.tile_size = tile_size
-        self.tilemap = {}  # Grid tiles; keys represent location in world
+        self.grid = TileStore()  # Grid tiles, stored in chunks of interned tile ids
         self.offgrid_tiles = []  # Non-interactable tiles
+        self.offgrid_index = SpatialGrid(cell_size=64)  # Off-grid tiles indexed by image bounds
+        self.chunk_cache = ChunkCache(self, max_chunks=max_cached_chunks)
+        self.solidity = SolidityGrid(PHYSICS_TILES, tile_size)  # Which grid cells collide, kept in sync with the grid
+        self.rects_tested = 0  # Solid rects tested for collision since the counter was last reset, for profiling
+        self.streamer = None  # WorldStreamer paging regions in and out, when a world directory is loaded
+
+    def _tile_changed(self, x, y):
+        """Invalidate anything derived from the grid cell at (x, y)."""
+        self.chunk_cache.invalidate(x >> CHUNK_SHIFT, y >> CHUNK_SHIFT)
+        self.solidity.update_cell(self.grid, x, y)
+
+    def _chunk_changed(self, cx, cy):
+        """Invalidate anything derived from any of the cells of chunk (cx, cy)."""
+        self.chunk_cache.invalidate(cx, cy)
+        self.solidity.update_chunk(self.grid, cx, cy)
+
+    def get_tile(self, pos):
+        """
+        Get the grid tile at a grid position.
+        Args:
+            pos (tuple): Grid coordinates (x, y).
+        Returns:
+            dict: The tile data, or None if there is no tile.
+        """
+        tile_id = self.grid.get(pos[0], pos[1])
+        if tile_id == EMPTY:
+            return None
+        tile_type, variant = self.grid.lookup(tile_id)
+        return {"type": tile_type, "variant": variant, "pos": [pos[0], pos[1]]}
+
+    def set_tile(self, pos, tile_type, variant):
+        """
+        Place a grid tile, replacing any tile already at that position.
+        Args:
+            pos (tuple): Grid coordinates (x, y).
+            tile_type (str): The tile type.
+            variant (int): The tile variant.
+        """
+        self.grid.set(pos[0], pos[1], self.grid.intern(tile_type, variant))
+        self._tile_changed(pos[0], pos[1])
+
+    def remove_tile(self, pos):
+        """
+        Remove the grid tile at a grid position.
+        Args:
+            pos (tuple): Grid coordinates (x, y).
+        Returns:
+            bool: True if a tile was removed.
+        """
+        if self.grid.remove(pos[0], pos[1]) == EMPTY:
+            return False
+        self._tile_changed(pos[0], pos[1])
+        return True
+
+    def offgrid_rect(self, tile):
+        """
+        Get the world-space bounds of an off-grid tile.
+        Args:
+            tile (dict): The off-grid tile data.
+        Returns:
+            pygame.Rect: The area covered by the tile's image.
+        """
+        tile_image = self.game.assets[tile["type"]][tile["variant"]]
+        return pygame.Rect(tile["pos"][0], tile["pos"][1], tile_image.get_width(), tile_image.get_height())
+
+    def add_offgrid_tile(self, tile, order=None):
+        """
+        Add an off-grid tile.
+        Args:
+            tile (dict): The tile data, with "pos" in world pixels.
+            order (int): Drawing order among the off-grid tiles. Defaults to on top of every tile added so far.
+        """
+        self.offgrid_tiles.append(tile)
+        tile_rect = self.offgrid_rect(tile)
+        self.offgrid_index.insert(tile, tile_rect, order)
+        self.chunk_cache.invalidate_rect(tile_rect)
+
+    def remove_offgrid_tile(self, tile):
+        """
+        Remove an off-grid tile.
+        Args:
+            tile (dict): The tile data, as stored in offgrid_tiles.
+        """
+        self.offgrid_tiles.remove(tile)
+        self.chunk_cache.invalidate_rect(self.offgrid_index.rect_of(tile))
+        self.offgrid_index.remove(tile)
+
+    def remove_offgrid_tiles(self, tiles):
+        """
+        Remove several off-grid tiles at once, in a single pass over offgrid_tiles.
+        Args:
+            tiles (list): The tiles to remove, as stored in offgrid_tiles.
+        """
+        removed = set()
+        for tile in tiles:
+            removed.add(id(tile))
+            self.chunk_cache.invalidate_rect(self.offgrid_index.rect_of(tile))
+            self.offgrid_index.remove(tile)
+        self.offgrid_tiles = [tile for tile in self.offgrid_tiles if id(tile) not in removed]
+
+    def offgrid_in_rect(self, rect):
+        """
+        Get the off-grid tiles whose image overlaps a world-space rect.
+        Args:
+            rect (pygame.Rect): The area to query, in world pixels.
+        Returns:
+            list: The overlapping tiles, in drawing order.
+        """
+        return self.offgrid_index.query_rect(rect)
+
+    def offgrid_at(self, point):
+        """
+        Get the off-grid tiles whose image contains a world-space point.
+        Args:
+            point (tuple): The (x, y) position, in world pixels.
+        Returns:
+            list: The tiles under the point, in drawing order.
+        """
+        return self.offgrid_index.query_point(point)
 
     def extract(self, id_pairs, keep=False):
         """
@@ -62,68 +197,43 @@ class Tilemap:
             if (tile['type'], tile['variant']) in id_pairs:
                 matches.append(tile.copy())
                 if not keep:
-                    self.offgrid_tiles.remove(tile)
+                    self.remove_offgrid_tile(tile)
         
         # Iterate over the grid-based tilemap
-        for loc in self.tilemap:
-            tile = self.tilemap[loc]
-            if (tile['type'], tile['variant']) in id_pairs:
-                copied_tile = copy.deepcopy(tile)
+        for x, y, tile_id in self.grid.items():
+            tile_type, variant = self.grid.lookup(tile_id)
+            if (tile_type, variant) in id_pairs:
                 # Convert grid coordinates to pixel coords
-                copied_tile['pos'][0] *= self.tile_size
-                copied_tile['pos'][1] *= self.tile_size
-                matches.append(copied_tile)
+                matches.append({"type": tile_type, "variant": variant, "pos": [x * self.tile_size, y * self.tile_size]})
                 if not keep:
-                    del self.tilemap[loc]
+                    self.remove_tile((x, y))
 
         return matches
     
-    def render(self, surf, offset=(0, 0)):
+    def render(self, surf, offset=(0, 0), outline_surf=None):
         """
-        Draws (blits) all tiles onto a surface.
+        Draws (blits) all visible tiles onto a surface, one pre-rendered chunk at a time.
         Args:
             surf (pygame.Surface): The surface to draw the tiles on.
             offset (tuple): Coordinates to offset for center camera.
+            outline_surf (pygame.Surface): If given, the tiles' baked outlines are drawn onto it.
+        Returns:
+            int: Number of blits made.
         """
-        # Render off-grid tiles
-        for tile in self.offgrid_tiles:
-            self._draw_tile(surf, tile, offset, grid_aligned=False)
-
-        # Determine the portion of the tile grid that is visible on the screen
-        start_x = offset[0] // self.tile_size
-        end_x = (offset[0] + surf.get_width()) // self.tile_size + 1  # +1 to full render end tiles.
-        start_y = offset[1] // self.tile_size
-        end_y = (offset[1] + surf.get_height()) // self.tile_size + 1
+        return self.chunk_cache.render(surf, offset=offset, outline_surf=outline_surf)
 
-        # If a tile is located within the screen, render it
-        for x in range(start_x, end_x):
-            for y in range(start_y, end_y):
-                tile_coords = f"{x};{y}"
-                if tile_coords in self.tilemap:
-                    tile = self.tilemap[tile_coords]
-                    self._draw_tile(surf, tile, offset, grid_aligned=True)
-
-    def _draw_tile(self, surf, tile, offset, grid_aligned):
+    def collect(self, items, size, offset=(0, 0), outline_items=None):
         """
-        Blit a tile onto the surface with the given offset.
+        Queue every visible tile for a batched blit, one pre-rendered chunk at a time.
         Args:
-            surf (pygame.Surface): The surface to draw the tile on.
-            tile (dict): The tile data.
+            items (list): The list of (surface, position) pairs to append to, e.g. a RenderQueue layer.
+            size (tuple): Size (w, h) of the surface the tiles are drawn on.
             offset (tuple): Coordinates to offset for center camera.
-            grid_aligned (bool): Whether the tile is grid-aligned or off-grid.
+            outline_items (list): If given, the tiles' baked outlines are appended to it.
+        Returns:
+            int: Number of blits queued.
         """
-        tile_type = tile["type"]
-        tile_variant = tile["variant"]
-
-        if grid_aligned:
-            tile_pos_x = tile["pos"][0] * self.tile_size
-            tile_pos_y = tile["pos"][1] * self.tile_size
-        else:
-            tile_pos_x = tile["pos"][0]
-            tile_pos_y = tile["pos"][1]
-
-        tile_image = self.game.assets[tile_type][tile_variant]
-        surf.blit(tile_image, (tile_pos_x - offset[0], tile_pos_y - offset[1]))
+        return self.chunk_cache.collect(items, size, offset=offset, outline_items=outline_items)
 
     def border_tiles(self, pos):
         """
@@ -140,69 +250,174 @@ class Tilemap:
         # Check the tiles bordering the current position
         b_tiles = []
         for offset in BORDERING_TILE_OFFSETS:
-            border_tile = str(curr_x + offset[0]) + ";" + str(curr_y + offset[1])
-            if border_tile in self.tilemap:
-                b_tiles.append(self.tilemap[border_tile])
+            border_tile = self.get_tile((curr_x + offset[0], curr_y + offset[1]))
+            if border_tile is not None:
+                b_tiles.append(border_tile)
         return b_tiles
 
     def physics_create_rects(self, pos):
         """
         Create Rect objects for tiles with physics enabled around a given position.
+        Entities collide against the merged rects of the solidity grid (see PhysicsEntity.move_and_collide); this
+        is kept for tools and benchmarks that want the rects.
         Args:
             pos(tuple): The position (x, y) to check for neighboring tiles with physics.
         Returns:
             list: A list of pygame.Rect objects for collision detection.
         """
+        curr_x = int(pos[0] // self.tile_size)
+        curr_y = int(pos[1] // self.tile_size)
+
+        is_solid = self.solidity.is_solid
         rects = []
-        for tile in self.border_tiles(pos):
-            if tile["type"] in PHYSICS_TILES:
+        for offset in BORDERING_TILE_OFFSETS:
+            tile_x = curr_x + offset[0]
+            tile_y = curr_y + offset[1]
+            if is_solid(tile_x, tile_y):
                 rects.append(
-                    pygame.Rect(
-                        tile["pos"][0] * self.tile_size,
-                        tile["pos"][1] * self.tile_size,
-                        self.tile_size,
-                        self.tile_size,
-                    )
+                    pygame.Rect(tile_x * self.tile_size, tile_y * self.tile_size, self.tile_size, self.tile_size)
                 )
+        self.rects_tested += len(rects)
         return rects
 
+    def autotile_cell(self, pos):
+        """
+        Adjust a single tile to the variant matching its neighboring tiles.
+        Args:
+            pos (tuple): Grid coordinates (x, y).
+        Returns:
+            bool: True if the tile's variant changed.
+        """
+        grid = self.grid
+        x, y = pos
+        tile_id = grid.get(x, y)
+        if tile_id == EMPTY:
+            return False
+        tile_type, variant = grid.lookup(tile_id)
+        if tile_type not in AUTOTILE_TYPES:
+            return False
+
+        # Set a bit for each cardinal direction holding a tile of the same type
+        mask = 0
+        for shift, bit in AUTOTILE_BITS.items():
+            neighbor_id = grid.get(x + shift[0], y + shift[1])
+            if neighbor_id != EMPTY and grid.lookup(neighbor_id)[0] == tile_type:
+                mask |= bit
+
+        new_variant = int(AUTOTILE_VARIANTS[mask])
+        if new_variant < 0 or new_variant == variant:
+            return False
+        grid.set(x, y, grid.intern(tile_type, new_variant))
+        self._tile_changed(x, y)
+        return True
+
+    def autotile_around(self, pos):
+        """
+        Re-autotile an edited cell and its four neighbors, the only tiles whose variant an edit can change.
+        Args:
+            pos (tuple): Grid coordinates (x, y) of the edited cell.
+        """
+        x, y = pos
+        self.autotile_cell((x, y))
+        for shift in AUTOTILE_BITS:
+            self.autotile_cell((x + shift[0], y + shift[1]))
+
     def autotile(self):
         """
-        Automatically adjust tiles to its proper variant based on their neighboring tiles.
+        Automatically adjust every tile to its proper variant based on their neighboring tiles.
+
+        The map's chunks are copied into one dense array and the neighbor masks of all tiles are
+        computed at once. Maps spread too thinly for a dense copy are autotiled tile by tile.
         """
-        for loc in self.tilemap:
-            tile = self.tilemap[loc]
-            neighbors = set()
+        grid = self.grid
+        if not grid.chunks:
+            return
+        min_cx = min(cx for cx, cy in grid.chunks)
+        min_cy = min(cy for cx, cy in grid.chunks)
+        chunks_w = max(cx for cx, cy in grid.chunks) - min_cx + 1
+        chunks_h = max(cy for cx, cy in grid.chunks) - min_cy + 1
+        if chunks_w * chunks_h > max(AUTOTILE_DENSE_MIN_CHUNKS, len(grid.chunks) * AUTOTILE_MAX_SPARSITY):
+            for x, y, tile_id in list(grid.items()):
+                self.autotile_cell((x, y))
+            return
 
-            # Check neighboring tiles in the four cardinal directions
-            for shift in [(1, 0), (-1, 0), (0, -1), (0, 1)]:
-                check_loc = f"{tile['pos'][0] + shift[0]};{tile['pos'][1] + shift[1]}"
+        # Tile ids of the whole bounding box, with a one tile empty border so every tile has four neighbors
+        ids = np.zeros((chunks_h * CHUNK_SIZE + 2, chunks_w * CHUNK_SIZE + 2), dtype=np.uint16)
+        for (cx, cy), chunk in grid.chunks.items():
+            top = (cy - min_cy) * CHUNK_SIZE + 1
+            left = (cx - min_cx) * CHUNK_SIZE + 1
+            ids[top : top + CHUNK_SIZE, left : left + CHUNK_SIZE] = np.frombuffer(chunk, dtype=np.uint16).reshape(
+                CHUNK_SIZE, CHUNK_SIZE
+            )
 
-                # If a neighboring tile exists and is of the same type, add its direction to neighbors
-                if check_loc in self.tilemap:
-                    if self.tilemap[check_loc]["type"] == tile["type"]:
-                        neighbors.add(shift)
+        # Number the autotiled types from 1; empty cells and every other type are 0, which never matches
+        type_codes = {tile_type: code for code, tile_type in enumerate(sorted(AUTOTILE_TYPES), start=1)}
+        code_of_id = np.zeros(len(grid.tile_types), dtype=np.uint8)
+        for tile_id, key in enumerate(grid.tile_types):
+            if key is not None:
+                code_of_id[tile_id] = type_codes.get(key[0], 0)
+        codes = code_of_id[ids]
+        center = codes[1:-1, 1:-1]
+        mask = (
+            (codes[1:-1, 2:] == center) * AUTOTILE_BITS[(1, 0)]
+            | (codes[1:-1, :-2] == center) * AUTOTILE_BITS[(-1, 0)]
+            | (codes[:-2, 1:-1] == center) * AUTOTILE_BITS[(0, -1)]
+            | (codes[2:, 1:-1] == center) * AUTOTILE_BITS[(0, 1)]
+        )
+        variants = AUTOTILE_VARIANTS[mask]
+        target = (center > 0) & (variants >= 0)
 
-            # Convert neighbors to a sorted tuple to create a consistent key
-            neighbors = tuple(sorted(neighbors))
+        # Intern the (type, variant) pairs in use and look up their ids
+        types_by_code = {code: tile_type for tile_type, code in type_codes.items()}
+        keys = center[target].astype(np.int32) * 16 + variants[target]
+        id_of_key = np.zeros((len(type_codes) + 1) * 16, dtype=np.uint16)
+        for key in np.unique(keys).tolist():
+            id_of_key[key] = grid.intern(types_by_code[key // 16], key % 16)
+        new_ids = ids[1:-1, 1:-1].copy()
+        new_ids[target] = id_of_key[keys]
 
-            # If the tile type supports autotiling and the neighbors pattern is in the map,
-            # update the tile's variant to match the appropriate variant from the autotile map.
-            if tile["type"] in AUTOTILE_TYPES and neighbors in AUTOTILE_MAP:
-                tile["variant"] = AUTOTILE_MAP[neighbors]
+        # Write back the chunks that changed. Variants never empty or fill a cell, so counts stay valid
+        for (cx, cy), chunk in grid.chunks.items():
+            top = (cy - min_cy) * CHUNK_SIZE
+            left = (cx - min_cx) * CHUNK_SIZE
+            new_chunk = new_ids[top : top + CHUNK_SIZE, left : left + CHUNK_SIZE]
+            cells = np.frombuffer(chunk, dtype=np.uint16).reshape(CHUNK_SIZE, CHUNK_SIZE)
+            if not np.array_equal(cells, new_chunk):
+                cells[...] = new_chunk
+                self._chunk_changed(cx, cy)
 
     def save(self, path):
-        """Save a tilemap to a json file."""
-        file = open(path, "w")
-        json.dump({"tilemap": self.tilemap, "tile_size": self.tile_size, "offgrid": self.offgrid_tiles}, file)
-        file.close()
+        """
+        Save the tilemap, in the binary format if the path ends in ".pgmap" and as json otherwise.
+        Args:
+            path (str): Destination file.
+        """
+        write_map(path, self.grid, self.tile_size, self.offgrid_tiles)
 
     def load(self, path):
-        """Load a tilemap from a json file."""
-        file = open(path, "r")
-        map_data = json.load(file)
-        file.close()
-
-        self.tilemap = map_data["tilemap"]
-        self.tile_size = map_data["tile_size"]
-        self.offgrid_tiles = map_data["offgrid"]
+        """
+        Load a tilemap from a json or binary map file, or start streaming a world directory.
+        A streamed world starts out empty; its regions are loaded by streamer.update.
+        Args:
+            path (str): The map file or world directory.
+        """
+        self.close()
+        if is_world(path):
+            self.grid.clear()
+            self.offgrid_tiles = []
+            self.streamer = WorldStreamer(self, path)
+            self.tile_size = self.streamer.tile_size
+        else:
+            self.tile_size, self.offgrid_tiles = read_map(path, self.grid)
+        self.offgrid_index.clear()
+        for tile in self.offgrid_tiles:
+            self.offgrid_index.insert(tile, self.offgrid_rect(tile))
+        self.chunk_cache.clear()
+        self.solidity.tile_size = self.tile_size
+        self.solidity.rebuild(self.grid)
+
+    def close(self):
+        """Stop streaming, if a world is being streamed."""
+        if self.streamer is not None:
+            self.streamer.close()
+            self.streamer = None
@@ -0,0 +1,176 @@
+from array import array
+
+# Chunks are CHUNK_SIZE x CHUNK_SIZE tiles; a power of two so coords split with shifts/masks
+CHUNK_SHIFT = 4
+CHUNK_SIZE = 1 << CHUNK_SHIFT
+CHUNK_MASK = CHUNK_SIZE - 1
+CHUNK_AREA = CHUNK_SIZE * CHUNK_SIZE
+# Tile id stored in cells that hold no tile
+EMPTY = 0
+
+
+class TileStore:
+    def __init__(self):
+        """
+        Initialize an empty chunked tile store.
+
+        Grid tiles are kept in CHUNK_SIZE x CHUNK_SIZE chunks, each a flat array of
+        unsigned 16-bit tile ids (row-major). A tile id is an interned (type, variant)
+        pair, so a tile costs two bytes instead of a dict and a "x;y" string key.
+        """
+        self.chunks = {}  # (cx, cy) -> array("H") of tile ids
+        self.counts = {}  # (cx, cy) -> number of occupied cells in the chunk
+        self.tile_types = [None]  # tile id -> (type, variant); id 0 is reserved for EMPTY
+        self.tile_ids = {}  # (type, variant) -> tile id
+        self.size = 0
+
+    def __len__(self):
+        return self.size
+
+    def __contains__(self, pos):
+        return self.get(pos[0], pos[1]) != EMPTY
+
+    def intern(self, tile_type, variant):
+        """
+        Get the id for a (type, variant) pair, registering it if it is new.
+        Args:
+            tile_type (str): The tile type, e.g. "grass".
+            variant (int): The tile variant.
+        Returns:
+            int: The tile id.
+        """
+        key = (tile_type, variant)
+        tile_id = self.tile_ids.get(key)
+        if tile_id is None:
+            tile_id = len(self.tile_types)
+            self.tile_types.append(key)
+            self.tile_ids[key] = tile_id
+        return tile_id
+
+    def lookup(self, tile_id):
+        """
+        Get the (type, variant) pair for a tile id.
+        Args:
+            tile_id (int): The tile id.
+        Returns:
+            tuple: The (type, variant) pair.
+        """
+        return self.tile_types[tile_id]
+
+    def get(self, x, y):
+        """
+        Get the tile id stored at a grid position.
+        Args:
+            x (int): Grid x coordinate.
+            y (int): Grid y coordinate.
+        Returns:
+            int: The tile id, or EMPTY if there is no tile.
+        """
+        chunk = self.chunks.get((x >> CHUNK_SHIFT, y >> CHUNK_SHIFT))
+        if chunk is None:
+            return EMPTY
+        return chunk[((y & CHUNK_MASK) << CHUNK_SHIFT) | (x & CHUNK_MASK)]
+
+    def set(self, x, y, tile_id):
+        """
+        Store a tile id at a grid position, allocating its chunk if needed.
+        Args:
+            x (int): Grid x coordinate.
+            y (int): Grid y coordinate.
+            tile_id (int): The tile id to store. EMPTY removes the tile.
+        Returns:
+            int: The tile id that was previously stored there.
+        """
+        if tile_id == EMPTY:
+            return self.remove(x, y)
+        key = (x >> CHUNK_SHIFT, y >> CHUNK_SHIFT)
+        chunk = self.chunks.get(key)
+        if chunk is None:
+            chunk = array("H", bytes(2 * CHUNK_AREA))
+            self.chunks[key] = chunk
+            self.counts[key] = 0
+        idx = ((y & CHUNK_MASK) << CHUNK_SHIFT) | (x & CHUNK_MASK)
+        prev = chunk[idx]
+        chunk[idx] = tile_id
+        if prev == EMPTY:
+            self.counts[key] += 1
+            self.size += 1
+        return prev
+
+    def remove(self, x, y):
+        """
+        Remove the tile at a grid position. Chunks that become empty are freed.
+        Args:
+            x (int): Grid x coordinate.
+            y (int): Grid y coordinate.
+        Returns:
+            int: The tile id that was removed, or EMPTY if there was no tile.
+        """
+        key = (x >> CHUNK_SHIFT, y >> CHUNK_SHIFT)
+        chunk = self.chunks.get(key)
+        if chunk is None:
+            return EMPTY
+        idx = ((y & CHUNK_MASK) << CHUNK_SHIFT) | (x & CHUNK_MASK)
+        prev = chunk[idx]
+        if prev != EMPTY:
+            chunk[idx] = EMPTY
+            self.size -= 1
+            self.counts[key] -= 1
+            if not self.counts[key]:
+                del self.chunks[key]
+                del self.counts[key]
+        return prev
+
+    def set_chunk(self, cx, cy, cells):
+        """
+        Replace a whole chunk at once, e.g. when loading a map.
+        Args:
+            cx (int): Chunk x coordinate.
+            cy (int): Chunk y coordinate.
+            cells (array.array): CHUNK_AREA tile ids ("H" typecode), row-major. Stored as is, not copied.
+        """
+        key = (cx, cy)
+        self.size -= self.counts.get(key, 0)
+        count = CHUNK_AREA - cells.count(EMPTY)
+        if count:
+            self.chunks[key] = cells
+            self.counts[key] = count
+            self.size += count
+        else:
+            self.chunks.pop(key, None)
+            self.counts.pop(key, None)
+
+    def remove_chunk(self, cx, cy):
+        """
+        Remove every tile of a chunk, e.g. when a streamed region is evicted.
+        Args:
+            cx (int): Chunk x coordinate.
+            cy (int): Chunk y coordinate.
+        Returns:
+            bool: True if the chunk held any tiles.
+        """
+        key = (cx, cy)
+        if key not in self.chunks:
+            return False
+        self.size -= self.counts.pop(key)
+        del self.chunks[key]
+        return True
+
+    def items(self):
+        """
+        Iterate over every stored tile.
+        Yields:
+            tuple: (x, y, tile_id) for each occupied grid cell.
+        """
+        for (cx, cy), chunk in list(self.chunks.items()):
+            base_x = cx << CHUNK_SHIFT
+            base_y = cy << CHUNK_SHIFT
+            for idx, tile_id in enumerate(chunk):
+                if tile_id != EMPTY:
+                    yield base_x + (idx & CHUNK_MASK), base_y + (idx >> CHUNK_SHIFT), tile_id
+
+    def clear(self):
+        """Remove every tile. Interned ids are kept."""
+        self.chunks = {}
+        self.counts = {}
+        self.size = 0
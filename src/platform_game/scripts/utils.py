@@ -3,6 +3,9 @@ import os
 
 # Base path to the images directory
 BASE_IMG_PATH = "src/platform_game/data/images/"
+# Colour of the silhouette drawn around outlined objects, and the directions it is shifted in
+OUTLINE_COLOR = (0, 0, 0, 180)
+OUTLINE_OFFSETS = [(-1, 0), (1, 0), (0, -1), (0, 1)]
 
 
 def load_image(path: str) -> pygame.Surface:
@@ -47,16 +50,68 @@ def load_images(path: str) -> list:
     return images
 
 
+def percentile(values: list, pct: float) -> float:
+    """
+    Computes a percentile of a list of numbers, interpolating between the closest ranks.
+    Args:
+        values (list): The numbers. Doesn't need to be sorted.
+        pct (float): The percentile to compute, from 0 to 100.
+    Returns:
+        float: The percentile, or 0.0 if values is empty.
+    """
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = (len(ordered) - 1) * pct / 100
+    low = int(rank)
+    high = min(low + 1, len(ordered) - 1)
+    return ordered[low] + (ordered[high] - ordered[low]) * (rank - low)
+
+
+def flip_images(images: list) -> list:
+    """
+    Creates horizontally mirrored copies of a list of images.
+    Args:
+        images (list): A list of Pygame Surface objects.
+    Returns:
+        list: The mirrored Surface objects, in the same order.
+    """
+    return [pygame.transform.flip(img, True, False) for img in images]
+
+
+def outline_image(img: pygame.Surface) -> pygame.Surface:
+    """
+    Bakes the black outline drawn around an image.
+    The result is the image's silhouette blitted at each of OUTLINE_OFFSETS, so drawing it
+    1px up and to the left of the image matches outlining the image on screen with a mask.
+    Args:
+        img (pygame.Surface): The image to outline. Transparent pixels are left out of the silhouette.
+    Returns:
+        pygame.Surface: A per-pixel alpha surface, 2px wider and taller than img.
+    """
+    silhouette = pygame.mask.from_surface(img).to_surface(setcolor=OUTLINE_COLOR, unsetcolor=(0, 0, 0, 0))
+    outline = pygame.Surface((img.get_width() + 2, img.get_height() + 2), pygame.SRCALPHA)
+    for offset in OUTLINE_OFFSETS:
+        outline.blit(silhouette, (1 + offset[0], 1 + offset[1]))
+    return outline
+
+
 class Animation:
-    def __init__(self, images, img_dur=5, loop=True):
+    def __init__(self, images, img_dur=5, loop=True, flipped_images=None, outlines=None):
         """
         Initialize an animation.
         Args:
             images (list): A list of Pygame Surface objects representing the frames of the animation.
             img_dur (int): The duration each frame is displayed, in terms of update calls (default is 5).
             loop (bool): Whether the animation should loop (default is True).
+            flipped_images (list): Mirrored copies of images. Built once here if not given, then
+                shared with every copy of the animation.
+            outlines (dict): Cache of baked frame outlines, keyed by (frame index, flip). Shared
+                with every copy of the animation.
         """
         self.images = images
+        self.flipped_images = flipped_images if flipped_images is not None else flip_images(images)
+        self.outlines = outlines if outlines is not None else {}
         self.img_dur = img_dur
         self.loop = loop
         self.done = False
@@ -68,7 +123,7 @@ class Animation:
         Returns:
             Animation: A new instance of the Animation class with the same properties.
         """
-        return Animation(self.images, self.img_dur, self.loop)
+        return Animation(self.images, self.img_dur, self.loop, self.flipped_images, self.outlines)
 
     def update(self):
         """
@@ -85,11 +140,29 @@ class Animation:
                 self.frame = total_frames - 1 
                 self.done = True
 
-    def img(self):
+    def img(self, flip=False):
         """
         Get the current frame image.
+        Args:
+            flip (bool): Whether to return the horizontally mirrored frame (default is False).
         Returns:
             pygame.Surface: The current frame image.
         """
         curr_img_idx = int(self.frame / self.img_dur)
+        if flip:
+            return self.flipped_images[curr_img_idx]
         return self.images[curr_img_idx]
+
+    def outline(self, flip=False):
+        """
+        Get the baked outline of the current frame. Each outline is only baked the first time it is needed.
+        Args:
+            flip (bool): Whether to outline the horizontally mirrored frame (default is False).
+        Returns:
+            pygame.Surface: The outline, to be drawn 1px up and to the left of the frame.
+        """
+        key = (int(self.frame / self.img_dur), flip)
+        outline = self.outlines.get(key)
+        if outline is None:
+            outline = self.outlines[key] = outline_image(self.img(flip))
+        return outline